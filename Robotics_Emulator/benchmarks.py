@@ -0,0 +1,1098 @@
+# -*- coding: utf-8 -*-
+"""
+This file collects timing benchmarks for the performance-sensitive parts of
+the emulator. Each benchmark prints a small table and can be run on its own,
+or all of them can be run by executing this file directly.
+
+"""
+
+import math
+import timeit
+import tracemalloc
+from fractions import Fraction
+
+import numpy as np
+
+from angle_detection_test import gen_doa_waveform
+from ecc import (error_correction_utils as ecc_utils, convolutional_code,
+                 hamming_code, ldpc_code, reed_solomon_code, RepetitionCode,
+                 BlockInterleaver, ConvolutionalInterleaver)
+from gcc_phat import gcc_phat_doa
+from phase_shift_checker import fourier_phase_shift_checker
+from plane_wave import PlaneWaveSource, square_array
+from signal_angle_detect import signal_angle_detect, signal_angle_detect_batch
+from sliding_dft import SlidingDFT
+from steered_doa import _steering_tables, channel_array, steered_doa
+from symbol_slicer import differential_decode, phase_slicer
+from testFrequencyDemodulation import decodeFrequencyModulation
+from transmit import transmit, _wave_segments
+from wave_channel import single_channel
+from wave_ops import combine_wave, delay_wave
+from wave_gen import wave_gen
+
+
+def _best_time(function, repeat=3):
+    """Return the best wall-clock time (in seconds) of several calls."""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def _wave_gen_concatenate(wave_segments, num_pts=1000):
+    """Reference copy of the original concatenation-based wave_gen."""
+    waveform = np.zeros(1)
+    times = np.zeros(1)
+    phase = 0
+
+    for time, frequency, amplitude, phase_shift in wave_segments:
+        wave_times = np.linspace(
+            times[len(times)-1], times[len(times)-1] + time, num_pts
+        )
+        times = np.concatenate((times, wave_times))
+        phase = (phase + phase_shift) % 360
+        wave = amplitude * np.sin(
+            2 * np.pi * (frequency * wave_times + phase / 360)
+        )
+        waveform = np.concatenate((waveform, wave))
+
+    return (times, waveform)
+
+
+def bench_wave_gen(segment_counts=(10, 100, 1000, 10000, 100000),
+                   num_pts=100, max_reference_segments=10000):
+    """
+    Time wave_gen against the original implementation for growing packets.
+
+    Each packet is a random PSK-style sequence of 1 ms segments at 30kHz.
+
+    Parameters
+    ----------
+    segment_counts : iterable of int
+        Numbers of wave segments to benchmark.
+
+    num_pts : positive int
+        Number of points per wave segment. The default is 100.
+
+    max_reference_segments : int
+        The original implementation is quadratic, so it is only timed up to
+        this many segments. The default is 10000.
+
+    """
+    print(f'wave_gen scaling ({num_pts} points per segment)')
+    print(f'{"segments":>10} {"wave_gen (s)":>14} {"original (s)":>14}'
+          f' {"speedup":>9}')
+
+    rng = np.random.default_rng(0)
+    for num_segments in segment_counts:
+        wave_segments = [
+            (0.001, 30000, 1, shift)
+            for shift in rng.choice([0, 180], size=num_segments)
+        ]
+
+        new = _best_time(lambda: wave_gen(wave_segments, num_pts=num_pts))
+
+        if num_segments <= max_reference_segments:
+            old = _best_time(
+                lambda: _wave_gen_concatenate(wave_segments, num_pts=num_pts),
+                repeat=1
+            )
+            print(f'{num_segments:>10} {new:>14.5f} {old:>14.5f}'
+                  f' {old / new:>8.1f}x')
+        else:
+            print(f'{num_segments:>10} {new:>14.5f} {"-":>14} {"-":>9}')
+
+
+def bench_oscillator(num_samples=10**7, fs=1e6, frequency=30000,
+                     time_offset=3.0, num_checked=1000):
+    """
+    Compare the 'sin' and 'nco' oscillator backends for speed and accuracy.
+
+    Speed is measured for a fixed-rate PSK waveform of num_samples samples.
+    Accuracy is measured on num_checked samples of a tone starting
+    time_offset seconds into the waveform, against a reference computed in
+    exact rational arithmetic.
+
+    """
+    print(f'oscillator backends ({num_samples} samples at {fs:g} Hz)')
+
+    # Speed on a random PSK waveform with 1 ms bits.
+    rng = np.random.default_rng(0)
+    num_bits = int(num_samples / fs * 1000)
+    wave_segments = [
+        (0.001, frequency, 1, shift)
+        for shift in rng.choice([0, 180], size=num_bits)
+    ]
+    print(f'{"backend":>8} {"fs mode (s)":>12} {"num_pts mode (s)":>17}'
+          f' {"max error":>10}')
+
+    # Accuracy: a silent segment pushes the test segment out to large t.
+    late_segments = [
+        (time_offset, 0, 0, 0), (num_checked / fs, frequency, 1, 0)
+    ]
+    offset = round(time_offset * fs)
+    reference = np.array([
+        math.sin(2 * math.pi * float(
+            (Fraction(frequency) * (offset + n) / Fraction(fs)) % 1
+        ))
+        for n in range(num_checked)
+    ])
+
+    for oscillator in ('sin', 'nco'):
+        fixed_rate = _best_time(lambda: wave_gen(
+            wave_segments, fs=fs, oscillator=oscillator
+        ))
+        per_segment = _best_time(lambda: wave_gen(
+            wave_segments, num_pts=int(fs / 1000), oscillator=oscillator
+        ))
+
+        late = wave_gen(late_segments, fs=fs, oscillator=oscillator)
+        error = np.max(np.abs(
+            late.samples[offset:offset + num_checked] - reference
+        ))
+
+        print(f'{oscillator:>8} {fixed_rate:>12.4f} {per_segment:>17.4f}'
+              f' {error:>10.1e}')
+
+
+def bench_transmit(num_bits=100000, bit_rate=1000, frequency=30000,
+                   num_pts=10, fs=1e5):
+    """
+    Time transmit on a long random PSK message.
+
+    The symbol-table modulator is compared with building the wave segments
+    bit by bit, both with num_pts points per bit and at the fixed rate fs
+    (where each symbol's waveform is only computed once).
+
+    """
+    print(f'transmit ({num_bits} PSK bits at {bit_rate} bits/s)')
+    print(f'{"mode":>18} {"transmit (s)":>13} {"per bit (s)":>12}'
+          f' {"speedup":>9}')
+
+    rng = np.random.default_rng(0)
+    message = ''.join(rng.choice(['0', '1'], size=num_bits))
+    arguments = dict(modulation_type='PSK', frequency=frequency)
+
+    def per_bit(**kwargs):
+        wave_segments = list(_wave_segments(
+            message, 1 / bit_rate, 'PSK', FSK_freqs=(0, 0), PSK_phase=180,
+            QPSK_phases=(0, 90, 180, 270), frequency=frequency, amplitude=1
+        ))
+        return wave_gen(wave_segments, **kwargs)
+
+    for mode, kwargs in ((f'num_pts={num_pts}', dict(num_pts=num_pts)),
+                         (f'fs={fs:g}', dict(fs=fs))):
+        new = _best_time(lambda: transmit(
+            message, bit_rate, **arguments, **kwargs
+        ))
+        old = _best_time(lambda: per_bit(**kwargs))
+        print(f'{mode:>18} {new:>13.4f} {old:>12.4f} {old / new:>8.1f}x')
+
+
+def _single_channel_comprehension(input_times, input_waveform,
+                                  transmitter_pos_init, receiver_pos_init,
+                                  transmitter_velocity, receiver_velocity,
+                                  wave_speed):
+    """Reference copy of the original per-sample single_channel."""
+    relative_velocity = transmitter_velocity - receiver_velocity
+    relative_pos_init = transmitter_pos_init - receiver_pos_init
+    relative_positions = np.array([
+        relative_pos_init + time * relative_velocity for time in input_times
+    ])
+    travel_distances = np.linalg.norm(relative_positions, axis=1)
+    wave_velocities = np.array([
+        -wave_speed * relative_position / np.linalg.norm(relative_position)
+        for relative_position in relative_positions
+    ])
+    relative_wave_speeds = \
+        np.linalg.norm(wave_velocities - receiver_velocity, axis=1)
+    output_times = input_times + travel_distances / relative_wave_speeds
+    output_waveform = input_waveform / travel_distances
+    return (output_times, output_waveform)
+
+
+def bench_single_channel(sample_counts=(10**3, 10**4, 10**5, 10**6, 10**7),
+                         max_reference_samples=10**6):
+    """
+    Time single_channel against the original per-sample implementation.
+
+    The broadcast kernel is timed in float64 (with and without a reusable
+    out= buffer) and in float32.
+
+    Parameters
+    ----------
+    sample_counts : iterable of int
+        Numbers of samples to propagate.
+
+    max_reference_samples : int
+        The original implementation is only timed up to this many samples.
+        The default is 10**6.
+
+    """
+    geometry = (np.array([0, 0]), np.array([1480 / 5, 0]),
+                np.array([-10, 0]), np.array([0, 0]), 1480)
+
+    print('single_channel scaling')
+    print(f'{"samples":>10} {"float64 (s)":>12} {"out= (s)":>10}'
+          f' {"float32 (s)":>12} {"original (s)":>13} {"speedup":>9}')
+
+    for num_samples in sample_counts:
+        times = np.arange(num_samples) / 1e6
+        waveform = np.sin(2 * np.pi * 30000 * times)
+        out = (np.empty(num_samples), np.empty(num_samples))
+
+        new = _best_time(lambda: single_channel(times, waveform, *geometry))
+        reused = _best_time(
+            lambda: single_channel(times, waveform, *geometry, out=out)
+        )
+        single = _best_time(lambda: single_channel(
+            times, waveform, *geometry, dtype=np.float32
+        ))
+
+        if num_samples <= max_reference_samples:
+            old = _best_time(
+                lambda: _single_channel_comprehension(
+                    times, waveform, *geometry
+                ),
+                repeat=1
+            )
+            print(f'{num_samples:>10} {new:>12.5f} {reused:>10.5f}'
+                  f' {single:>12.5f} {old:>13.5f} {old / new:>8.1f}x')
+        else:
+            print(f'{num_samples:>10} {new:>12.5f} {reused:>10.5f}'
+                  f' {single:>12.5f} {"-":>13} {"-":>9}')
+
+
+def bench_receiver_array(receiver_counts=(5, 16, 64), num_samples=10**5):
+    """
+    Time propagating to a whole receiver array in one single_channel call.
+
+    This is compared with calling single_channel once per receiver, as
+    channel used to.
+
+    """
+    print(f'receiver arrays ({num_samples} samples)')
+    print(f'{"receivers":>10} {"one pass (s)":>13} {"per receiver (s)":>17}'
+          f' {"speedup":>9}')
+
+    times = np.arange(num_samples) / 1e6
+    waveform = np.sin(2 * np.pi * 30000 * times)
+    rng = np.random.default_rng(0)
+    transmitter = (np.array([0, 0]), np.array([-10, 0]), np.array([0, 0]))
+
+    for num_receivers in receiver_counts:
+        receivers = np.array([1480 / 5, 0]) \
+            + rng.uniform(-0.1, 0.1, size=(num_receivers, 2))
+
+        def per_receiver():
+            return [
+                single_channel(times, waveform, transmitter[0], receiver,
+                               transmitter[1], transmitter[2], 1480)
+                for receiver in receivers
+            ]
+
+        new = _best_time(lambda: single_channel(
+            times, waveform, transmitter[0], receivers, transmitter[1],
+            transmitter[2], 1480
+        ))
+        old = _best_time(per_receiver)
+        print(f'{num_receivers:>10} {new:>13.5f} {old:>17.5f}'
+              f' {old / new:>8.1f}x')
+
+
+def _combine_wave_merge(packet1, packet2):
+    """Reference copy of the original point-by-point combine_wave merge."""
+    times1, waves1 = packet1
+    times2, waves2 = packet2
+    firstt, firstw = (times1, waves1) if times1[0] < times2[0] \
+        else (times2, waves2)
+    lastt, lastw = (times2, waves2) if times1[0] < times2[0] \
+        else (times1, waves1)
+    firsti = 0
+    lasti = 0
+    final_times = []
+    final_waves = []
+    while firsti != len(firstt) and firstt[firsti] < lastt[lasti]:
+        final_times.append(firstt[firsti])
+        final_waves.append(firstw[firsti])
+        firsti += 1
+    while True:
+        if firsti == len(firstt):
+            final_times.extend(lastt[lasti:])
+            final_waves.extend(lastw[lasti:])
+            break
+        elif lasti == len(lastt):
+            final_times.extend(firstt[firsti:])
+            final_waves.extend(firstw[firsti:])
+            break
+        elif lastt[lasti] < firstt[firsti]:
+            final_times.append(lastt[lasti])
+            final_waves.append(
+                lastw[lasti] + (firstw[firsti] - firstw[firsti - 1])
+                / (firstt[firsti] - firstt[firsti - 1])
+                * (lastt[lasti] - firstt[firsti - 1]) + firstw[firsti - 1]
+            )
+            lasti += 1
+        elif lastt[lasti] > firstt[firsti]:
+            final_times.append(firstt[firsti])
+            final_waves.append(
+                firstw[firsti] + (lastw[lasti] - lastw[lasti - 1])
+                / (lastt[lasti] - lastt[lasti - 1])
+                * (firstt[firsti] - lastt[lasti - 1]) + lastw[lasti - 1]
+            )
+            firsti += 1
+        else:
+            final_times.append(firstt[firsti])
+            final_waves.append(firstw[firsti] + lastw[lasti])
+            firsti += 1
+            lasti += 1
+    return (np.array(final_times), np.array(final_waves))
+
+
+def bench_combine_wave(point_counts=(10**4, 10**5, 10**6, 10**7),
+                       num_waves=8, max_reference_points=10**6,
+                       max_multiway_points=10**6):
+    """
+    Time combine_wave on delayed copies of a wave of growing length.
+
+    The two-wave case is compared with the original merge loop, and a
+    num_waves-way combination (e.g. multipath arrivals) is timed as well.
+
+    """
+    print('combine_wave scaling (points per wave)')
+    print(f'{"points":>10} {"2 waves (s)":>12} {"original (s)":>13}'
+          f' {"speedup":>9} {f"{num_waves} waves (s)":>12}')
+
+    for num_points in point_counts:
+        packet = wave_gen([(0.001, 30000, 1, 0)], num_pts=num_points)
+        delayed = delay_wave(packet, 1.3e-5)
+
+        two = _best_time(lambda: combine_wave(packet, delayed))
+        row = f'{num_points:>10} {two:>12.4f}'
+
+        if num_points <= max_reference_points:
+            old = _best_time(
+                lambda: _combine_wave_merge(packet, delayed), repeat=1
+            )
+            row += f' {old:>13.4f} {old / two:>8.1f}x'
+        else:
+            row += f' {"-":>13} {"-":>9}'
+
+        if num_points <= max_multiway_points:
+            arrivals = [delay_wave(packet, k * 1.3e-5)
+                        for k in range(num_waves)]
+            many = _best_time(lambda: combine_wave(*arrivals))
+            row += f' {many:>12.4f}'
+        else:
+            row += f' {"-":>12}'
+
+        print(row)
+
+
+def _fourier_phase_shift_checker_loop(times, waveform, delT, freq):
+    """Reference copy of the original bit-by-bit fourier_phase_shift_checker."""
+    times = times - times[0]
+    omega = 2 * np.pi * freq
+    phases = []
+    currentTime = delT / 2
+    delTPrime = 2 * delT / 8
+    index = times[times < currentTime - delTPrime].size
+    while times[times > currentTime + delTPrime].size > 0:
+        measureTimes = times[times >= currentTime - delTPrime]
+        measureTimes = measureTimes[
+            measureTimes < currentTime - delTPrime + delT
+        ]
+        indexJump = measureTimes.size
+        measureTimes = measureTimes[measureTimes < currentTime + delTPrime]
+        measureWave = np.take(waveform,
+                              range(index, index + measureTimes.size))
+        kI = np.sum(measureWave * np.cos(omega * measureTimes))
+        kQ = np.sum(measureWave * np.sin(omega * measureTimes))
+        phases.append(np.arctan2(kQ, kI))
+        index += indexJump
+        currentTime += delT
+    return -np.diff(phases) * 180 / np.pi
+
+
+def bench_phase_checker(bit_counts=(10, 100, 1000), bit_rate=1000,
+                        frequency=30000, num_channels=5):
+    """
+    Time demodulating PSK messages with fourier_phase_shift_checker.
+
+    The block-DFT version (all bits in one reduction) is compared with the
+    original loop over bits, for one wave and for a (channels, samples)
+    array demodulated in one call.
+
+    """
+    print('PSK demodulation')
+    print(f'{"bits":>8} {"block (s)":>10} {"loop (s)":>10} {"speedup":>9}'
+          f' {"channels (s)":>13} {"per channel (s)":>16}')
+
+    rng = np.random.default_rng(0)
+    delT = 1 / bit_rate
+
+    for num_bits in bit_counts:
+        bits = ''.join(rng.choice(['0', '1'], num_bits))
+        times, waveform = transmit(bits, bit_rate, modulation_type='PSK',
+                                   frequency=frequency)
+        waveforms = waveform + rng.normal(
+            scale=0.1, size=(num_channels, len(waveform))
+        )
+
+        new = _best_time(lambda: fourier_phase_shift_checker(
+            times, waveform, delT, frequency
+        ))
+        old = _best_time(lambda: _fourier_phase_shift_checker_loop(
+            times, waveform, delT, frequency
+        ))
+        many = _best_time(lambda: fourier_phase_shift_checker(
+            times, waveforms, delT, frequency
+        ))
+        each = _best_time(lambda: [
+            _fourier_phase_shift_checker_loop(times, row, delT, frequency)
+            for row in waveforms
+        ])
+        print(f'{num_bits:>8} {new:>10.5f} {old:>10.5f} {old / new:>8.1f}x'
+              f' {many:>13.5f} {each:>16.5f}')
+
+
+def _decode_frequency_loop(time, voltage, freq, delT):
+    """Reference copy of the original per-bit, per-tone FSK decoder."""
+    currentTime = delT / 2
+    delTPrime = delT / 4
+    time = time - time[0]
+    index = time[time < currentTime - delTPrime].size
+    omega = 2 * np.pi * freq
+    frequencyList = []
+    while time[time > currentTime + delTPrime].size > 0:
+        measureTime = time[time >= currentTime - delTPrime]
+        measureTime = measureTime[
+            measureTime < currentTime - delTPrime + delT
+        ]
+        indexJump = measureTime.size
+        measureTime = measureTime[measureTime < currentTime + delTPrime]
+        measureVoltage = np.take(voltage,
+                                 range(index, index + measureTime.size))
+        amplitude = np.zeros(omega.size)
+        for i in range(omega.size):
+            kI = np.sum(measureVoltage * np.cos(omega[i] * measureTime))
+            kQ = np.sum(measureVoltage * np.sin(omega[i] * measureTime))
+            amplitude[i] = kI**2 + kQ**2
+        frequencyList.append(freq[np.argmax(amplitude)])
+        currentTime += delT
+        index += indexJump
+    return frequencyList
+
+
+def bench_fsk_detector(tone_counts=(2, 16, 64), num_symbols=500,
+                       symbol_rate=500, fs=1e6):
+    """
+    Time M-ary FSK detection with decodeFrequencyModulation.
+
+    The matrix detector (every bit against every tone in one product) is
+    compared with the original loop over bits and tones, on noisy symbols
+    with random phases.
+
+    """
+    print(f'FSK detection ({num_symbols} symbols)')
+    print(f'{"tones":>8} {"matrix (s)":>11} {"loop (s)":>10} {"speedup":>9}'
+          f' {"symbol errors":>14}')
+
+    rng = np.random.default_rng(0)
+    delT = 1 / symbol_rate
+
+    for num_tones in tone_counts:
+        freq = 20000 + 500 * np.arange(num_tones, dtype=float)
+        symbols = rng.integers(0, num_tones, num_symbols)
+        times, waveform = wave_gen(
+            [(delT, freq[k], 1, rng.uniform(0, 360)) for k in symbols],
+            fs=fs
+        )
+        waveform = waveform + rng.normal(size=len(waveform))
+
+        new = _best_time(lambda: decodeFrequencyModulation(
+            times, waveform, freq, delT
+        ))
+        old = _best_time(lambda: _decode_frequency_loop(
+            times, waveform, freq, delT
+        ), repeat=1)
+        detected = decodeFrequencyModulation(times, waveform, freq, delT)
+        errors = np.count_nonzero(detected != freq[symbols[:len(detected)]])
+        print(f'{num_tones:>8} {new:>11.5f} {old:>10.5f} {old / new:>8.1f}x'
+              f' {errors:>14}')
+
+
+def _sliding_dft_loop(tracker, samples):
+    """Feed samples one at a time, as the firmware's process() does."""
+    window = tracker.window_length
+    mag_sq = np.empty(samples.shape)
+    for k in range(samples.shape[1]):
+        index = tracker.index
+        old = tracker.buffer[:, index]
+        diff = samples[:, k] - old
+        tracker.norm_accum += samples[:, k]**2 - old**2
+        tracker.sin_accum += diff * tracker.sin_table[index]
+        tracker.cos_accum += diff * tracker.cos_table[index]
+        tracker.buffer[:, index] = samples[:, k]
+        tracker.index = (index + 1) % window
+        mag_sq[:, k] = tracker.mag_sq
+    return mag_sq
+
+
+def bench_sliding_dft(num_samples=10**6, block_size=10**4, num_channels=4,
+                      frequency=30000, num_loop_samples=10**4):
+    """
+    Time tracking a tone over a long recording with SlidingDFT.
+
+    Block processing is compared with feeding the samples one at a time
+    (the firmware's O(1) update, run from Python), in samples per second
+    per channel.
+
+    """
+    print(f'sliding DFT ({num_channels} channels)')
+    print(f'{"method":>14} {"samples/s":>12}')
+
+    rng = np.random.default_rng(0)
+    samples = rng.normal(size=(num_channels, num_samples))
+
+    def blocks():
+        tracker = SlidingDFT(frequency, num_channels=num_channels,
+                             reinit_interval=10**5)
+        for start in range(0, num_samples, block_size):
+            tracker.process(samples[:, start:start + block_size])
+
+    block = _best_time(blocks)
+    loop = _best_time(lambda: _sliding_dft_loop(
+        SlidingDFT(frequency, num_channels=num_channels),
+        samples[:, :num_loop_samples]
+    ))
+    print(f'{"blocks":>14} {num_samples / block:>12.3g}')
+    print(f'{"per sample":>14} {num_loop_samples / loop:>12.3g}')
+
+
+def _phase_to_bit_loop(phase_diffs):
+    """Reference copy of the original if-chain QPSK slicer."""
+    bits = []
+    for diff in phase_diffs:
+        diff = diff % 360
+        if diff < 45:
+            bits.append(0)
+        elif diff < 135:
+            bits.append(1)
+        elif diff < 225:
+            bits.append(2)
+        elif diff < 315:
+            bits.append(3)
+        else:
+            bits.append(0)
+    return np.array(bits)
+
+
+def bench_symbol_slicer(num_trials=1000, num_symbols=1000):
+    """
+    Time slicing and differentially decoding a batch of QPSK messages.
+
+    phase_slicer and differential_decode on the whole (trials, symbols)
+    array are compared with the original per-symbol loops, run per trial.
+
+    """
+    print(f'QPSK slicing ({num_trials} x {num_symbols} symbols)')
+    print(f'{"vectorized (s)":>15} {"loop (s)":>10} {"speedup":>9}')
+
+    rng = np.random.default_rng(0)
+    phase_diffs = rng.uniform(-720, 720, size=(num_trials, num_symbols))
+
+    def loop():
+        symbols = [_phase_to_bit_loop(row) for row in phase_diffs]
+        return [[(row[i + 1] - row[i]) % 4 for i in range(len(row) - 1)]
+                for row in symbols]
+
+    new = _best_time(lambda: differential_decode(
+        phase_slicer(phase_diffs, (0, 90, 180, 270)), 4
+    ))
+    old = _best_time(loop, repeat=1)
+    print(f'{new:>15.5f} {old:>10.5f} {old / new:>8.1f}x')
+
+
+def bench_doa(ping_counts=(100, 1000, 10000), fs=111000, frequency=30000,
+              spacing=0.02, ping_length=0.003):
+    """
+    Time finding the direction of origin of many pings.
+
+    signal_angle_detect_batch on a (pings, 4, samples) array is compared
+    with calling signal_angle_detect once per ping.
+
+    """
+    print('direction of origin')
+    print(f'{"pings":>8} {"batch (s)":>10} {"per ping (s)":>13}'
+          f' {"speedup":>9}')
+
+    rng = np.random.default_rng(0)
+    times = np.arange(int(ping_length * fs)) / fs
+    phones = np.array([[0, spacing], [spacing, spacing], [spacing, 0],
+                       [0, 0]])
+
+    for num_pings in ping_counts:
+        directions = rng.normal(size=(num_pings, 3))
+        directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+        delays = directions[:, :2] @ phones.T / 1480
+        waves = np.sin(2 * np.pi * frequency
+                       * (times - delays[..., np.newaxis]))
+
+        new = _best_time(lambda: signal_angle_detect_batch(
+            1480, frequency, spacing, times, waves
+        ))
+        old = _best_time(lambda: [
+            signal_angle_detect(1480, frequency, spacing, [times] * 4,
+                                list(ping))
+            for ping in waves
+        ], repeat=1)
+        print(f'{num_pings:>8} {new:>10.5f} {old:>13.5f} {old / new:>8.1f}x')
+
+
+def _peak_memory(function):
+    """Return the peak memory (in bytes) allocated by numpy during a call."""
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench_plane_wave(num_trials=2000, block_size=100, freq=25000,
+                     spacing=0.01778):
+    """
+    Time and measure a DOA sweep with sampled and lazy plane waves.
+
+    gen_doa_waveform (which samples the whole ping at every hydrophone) is
+    compared with PlaneWaveSource, which only evaluates the 1 ms windows
+    that are read, a block of directions at a time.
+
+    """
+    print(f'DOA sweep ({num_trials} trials)')
+    print(f'{"source":>8} {"time (s)":>10} {"peak memory (MB)":>17}')
+
+    rng = np.random.default_rng(0)
+    directions = rng.normal(size=(num_trials, 3))
+    directions[:, 2] = np.abs(directions[:, 2])
+
+    def sampled():
+        for doa in directions:
+            times, waves = gen_doa_waveform(doa, freq, 0.002, spacing, 0.5)
+            signal_angle_detect(1480, freq, spacing, times, waves)
+
+    def lazy():
+        for start in range(0, num_trials, block_size):
+            source = PlaneWaveSource(directions[start:start + block_size],
+                                     freq, square_array(spacing),
+                                     start_time=0.5, duration=0.002)
+            signal_angle_detect_batch(1480, freq, spacing, source.window(
+                0.5 + 2 * spacing / 1480, 0.001, fs=3e6
+            ), None)
+
+    for name, function in (('sampled', sampled), ('lazy', lazy)):
+        print(f'{name:>8} {_best_time(function):>10.4f}'
+              f' {_peak_memory(function) / 2**20:>17.2f}')
+
+
+def bench_gcc_phat(ping_counts=(10, 100, 1000), fs=111000, duration=0.004,
+                   spacing=0.05):
+    """
+    Time wideband GCC-PHAT bearings on batches of chirp pings.
+
+    gcc_phat_doa on a (pings, 4, samples) array is compared with calling it
+    once per ping. The last column is how many times faster than real time
+    the batch runs (seconds of pings per second of processing).
+
+    """
+    print(f'GCC-PHAT bearings ({duration * 1000:g} ms pings at {fs:g} Hz)')
+    print(f'{"pings":>8} {"batch (s)":>10} {"per ping (s)":>13}'
+          f' {"speedup":>9} {"x real time":>12}')
+
+    rng = np.random.default_rng(0)
+    times = np.arange(int(duration * fs)) / fs
+    phones = square_array(spacing)
+
+    for num_pings in ping_counts:
+        directions = rng.normal(size=(num_pings, 3))
+        directions[:, 2] = np.abs(directions[:, 2])
+        directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+        elapsed = times - (directions[:, :2] @ phones.T
+                           / 1480)[..., np.newaxis]
+        signals = np.sin(2 * np.pi * (20000 * elapsed + 20000
+                                      / (2 * duration) * elapsed**2)) \
+            + rng.normal(scale=0.1, size=elapsed.shape)
+
+        new = _best_time(lambda: gcc_phat_doa(signals, fs, phones,
+                                              band=(20000, 40000)))
+        old = _best_time(lambda: [
+            gcc_phat_doa(ping, fs, phones, band=(20000, 40000))
+            for ping in signals
+        ], repeat=1)
+        print(f'{num_pings:>8} {new:>10.5f} {old:>13.5f} {old / new:>8.1f}x'
+              f' {num_pings * duration / new:>12.0f}')
+
+
+def bench_steered_doa(ping_counts=(10, 100, 1000), fs=111000,
+                      duration=0.004, frequency=30000, spacing=0.0254):
+    """
+    Time SRP and MUSIC grid searches over batches of pings.
+
+    The batch (one matrix product against the cached steering table) is
+    compared with calling steered_doa once per ping. The time to build the
+    steering table, which is only paid once per geometry, is shown first.
+
+    """
+    positions = channel_array(spacing)
+    _steering_tables.cache_clear()
+    build = _best_time(lambda: steered_doa(
+        np.zeros((len(positions), 64)), fs, [frequency],
+        positions=positions
+    ), repeat=1)
+    print(f'steered DOA (steering table built in {build:.4f} s)')
+    print(f'{"method":>6} {"pings":>8} {"batch (s)":>10} {"per ping (s)":>13}'
+          f' {"speedup":>9}')
+
+    rng = np.random.default_rng(0)
+    times = np.arange(int(duration * fs)) / fs
+
+    for num_pings in ping_counts:
+        directions = rng.normal(size=(num_pings, 3))
+        directions[:, 2] = np.abs(directions[:, 2])
+        directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+        elapsed = times - (directions[:, :2] @ positions.T
+                           / 1480)[..., np.newaxis]
+        signals = np.sin(2 * np.pi * frequency * elapsed) \
+            + rng.normal(scale=0.1, size=elapsed.shape)
+
+        for method in ('srp', 'music'):
+            new = _best_time(lambda: steered_doa(
+                signals, fs, [frequency], positions=positions, method=method
+            ))
+            old = _best_time(lambda: [
+                steered_doa(ping, fs, [frequency], positions=positions,
+                            method=method)
+                for ping in signals
+            ], repeat=1)
+            print(f'{method:>6} {num_pings:>8} {new:>10.5f} {old:>13.5f}'
+                  f' {old / new:>8.1f}x')
+
+
+def _hamming_round_trip_loop(message, n=3):
+    """Reference copy of the original per-codeword Hamming encode/decode."""
+    num_data_bits = 2**n - n - 1
+    generator_matrix = ecc_utils.hamming_generator_matrix(n)
+    parity_check_matrix = ecc_utils.hamming_parity_check_matrix(n)
+
+    code = ''
+    for i in range(0, len(message), num_data_bits):
+        codeword = ecc_utils.multiply_binary_finite_field_matrices(
+            np.array([list(message[i:i+num_data_bits])]).astype(np.intc),
+            generator_matrix
+        )
+        code += ''.join([str(bit) for bit in np.nditer(codeword)])
+
+    decoded = ''
+    for i in range(0, len(code), 2**n - 1):
+        codeword = np.array([[int(bit) for bit in code[i:i+2**n-1]]]).T
+        syndrome_vector = ecc_utils.multiply_binary_finite_field_matrices(
+            parity_check_matrix, codeword
+        )
+        data = codeword[:num_data_bits, 0]
+        if np.any(syndrome_vector):
+            error_location = np.flatnonzero(
+                np.all(parity_check_matrix == syndrome_vector, axis=0)
+            )[0]
+            if error_location < num_data_bits:
+                data[error_location] ^= 1
+        decoded += ''.join(str(bit) for bit in data)
+    return decoded
+
+
+def bench_hamming(trial_counts=(100, 1000, 10000), num_bits=40):
+    """
+    Time Hamming (7,4) encoding and decoding of many messages.
+
+    The cached HammingCode working on a (trials, bits) array is compared
+    with the original per-codeword string loops, run per message.
+
+    """
+    print(f'Hamming (7,4) round trip ({num_bits}-bit messages)')
+    print(f'{"messages":>9} {"vectorized (s)":>15} {"loop (s)":>10}'
+          f' {"speedup":>9}')
+
+    rng = np.random.default_rng(0)
+    hamming = hamming_code(3)
+
+    for num_trials in trial_counts:
+        messages = rng.integers(0, 2, size=(num_trials, num_bits),
+                                dtype=np.uint8)
+        strings = [''.join(map(str, message)) for message in messages]
+
+        new = _best_time(lambda: hamming.decode(hamming.encode(messages)))
+        old = _best_time(lambda: [_hamming_round_trip_loop(message)
+                                  for message in strings], repeat=1)
+        print(f'{num_trials:>9} {new:>15.5f} {old:>10.5f}'
+              f' {old / new:>8.1f}x')
+
+
+def _gf2_multiply_loop(left, right):
+    """Reference copy of the original triple-loop GF(2) matrix product."""
+    product = np.empty((left.shape[0], right.shape[1]), dtype=int)
+    for i in range(left.shape[0]):
+        for j in range(right.shape[1]):
+            product[i][j] = left[i][0] * right[0][j]
+            for entry in range(1, left.shape[1]):
+                product[i][j] ^= left[i][entry] * right[entry][j]
+    return product
+
+
+def bench_gf2_multiply(sizes=(64, 128, 256)):
+    """
+    Time GF(2) products of square binary matrices.
+
+    The bit-packed multiply_binary_finite_field_matrices is compared with
+    the original loop over every row, column and entry.
+
+    """
+    print('GF(2) matrix product')
+    print(f'{"size":>6} {"packed (s)":>11} {"loop (s)":>10} {"speedup":>9}')
+
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        left = rng.integers(0, 2, size=(size, size))
+        right = rng.integers(0, 2, size=(size, size))
+
+        new = _best_time(lambda: ecc_utils
+                         .multiply_binary_finite_field_matrices(left, right))
+        old = _best_time(lambda: _gf2_multiply_loop(left, right), repeat=1)
+        print(f'{size:>6} {new:>11.5f} {old:>10.5f} {old / new:>8.0f}x')
+
+
+def _repetition_decoder_loop(code, num_repetitions):
+    """Reference copy of the original per-character repetition decoder."""
+    message = ''
+    for i in range(0, len(code), num_repetitions):
+        bit_sum = 0
+        for j in range(num_repetitions):
+            if code[i+j] == 'x':
+                bit_sum = 0.5 * num_repetitions
+                break
+            elif code[i+j] == '0' or code[i+j] == '1':
+                bit_sum += int(code[i+j])
+            else:
+                raise ValueError("Bit values must be '0', '1', or 'x'.")
+        average = bit_sum / num_repetitions
+        message += \
+            '1' if average > 0.5 else ('0' if average < 0.5 else 'x')
+    return message
+
+
+def bench_repetition(trial_counts=(10, 100, 1000), num_bits=1000,
+                     num_repetitions=3):
+    """
+    Time decoding many repetition-coded messages.
+
+    RepetitionCode's hard (majority) and soft (summed LLR) decoders on a
+    (trials, bits) array are compared with the original string decoder, run
+    per message.
+
+    """
+    print(f'repetition decoding ({num_bits} bits x {num_repetitions})')
+    print(f'{"messages":>9} {"hard (s)":>9} {"soft (s)":>9} {"loop (s)":>10}'
+          f' {"speedup":>9}')
+
+    rng = np.random.default_rng(0)
+    code = RepetitionCode(num_repetitions)
+
+    for num_trials in trial_counts:
+        received = code.encode(rng.integers(0, 2, size=(num_trials, num_bits),
+                                            dtype=np.uint8))
+        llrs = 2 * (1 - 2.0 * received) + rng.normal(size=received.shape)
+        strings = [''.join(map(str, row)) for row in received]
+
+        hard = _best_time(lambda: code.decode(received))
+        soft = _best_time(lambda: code.decode_soft(llrs))
+        old = _best_time(lambda: [
+            _repetition_decoder_loop(string, num_repetitions)
+            for string in strings
+        ], repeat=1)
+        print(f'{num_trials:>9} {hard:>9.5f} {soft:>9.5f} {old:>10.5f}'
+              f' {old / hard:>8.0f}x')
+
+
+def bench_viterbi(row_counts=(1, 10, 100, 1000), num_bits=1000,
+                  eb_n0_db=3):
+    """
+    Measure the throughput of the Viterbi decoder, in decoded bits per
+    second.
+
+    Batches of noisy BPSK codewords from the standard constraint length 7
+    codes are decoded from soft and hard input. Larger batches share the
+    per-step overhead of the add-compare-select loop between more rows.
+
+    """
+    print(f'Viterbi decoding ({num_bits}-bit messages, K = 7)')
+    print(f'{"rate":>5} {"rows":>6} {"soft (bit/s)":>13} {"hard (bit/s)":>13}')
+
+    rng = np.random.default_rng(0)
+    for rate_inverse in (2, 3):
+        code = convolutional_code(rate_inverse)
+        noise = np.sqrt(rate_inverse / (2 * 10**(eb_n0_db / 10)))
+
+        for num_rows in row_counts:
+            messages = rng.integers(0, 2, size=(num_rows, num_bits),
+                                    dtype=np.uint8)
+            symbols = 1 - 2.0 * code.encode(messages)
+            received = symbols + rng.normal(scale=noise, size=symbols.shape)
+            hard_bits = (received < 0).astype(np.uint8)
+
+            soft = _best_time(lambda: code.decode_soft(received))
+            hard = _best_time(lambda: code.decode(hard_bits))
+            print(f'{"1/" + str(rate_inverse):>5} {num_rows:>6}'
+                  f' {messages.size / soft:>13.3g}'
+                  f' {messages.size / hard:>13.3g}')
+
+
+def bench_reed_solomon(packet_counts=(10, 100, 1000), packet_bytes=4096,
+                       num_parity=32, errors_per_codeword=8):
+    """
+    Measure the throughput of the Reed-Solomon codec on batches of packets.
+
+    Every codeword of every packet gets errors_per_codeword wrong bytes, so
+    every codeword goes through the whole decoder.
+
+    """
+    print(f'Reed-Solomon (255, {255 - num_parity}), {packet_bytes}-byte'
+          f' packets, {errors_per_codeword} errors per codeword')
+    print(f'{"packets":>8} {"encode (MB/s)":>14} {"decode (MB/s)":>14}')
+
+    rng = np.random.default_rng(0)
+    rs = reed_solomon_code(num_parity)
+
+    for num_packets in packet_counts:
+        packets = rng.integers(0, 256, size=(num_packets, packet_bytes),
+                               dtype=np.uint8)
+        codes = rs.encode(packets)
+
+        # Spread the errors over every codeword.
+        starts = np.arange(0, codes.shape[1], 255)
+        lengths = np.minimum(255, codes.shape[1] - starts)
+        offsets = (rng.random((num_packets, len(starts),
+                               errors_per_codeword)) * lengths[:, np.newaxis])
+        positions = (starts[:, np.newaxis] + offsets.astype(int)).reshape(
+            num_packets, -1
+        )
+        received = codes.copy()
+        np.put_along_axis(received, positions, rng.integers(
+            1, 256, size=positions.shape, dtype=np.uint8
+        ) ^ np.take_along_axis(received, positions, -1), -1)
+
+        encode = _best_time(lambda: rs.encode(packets))
+        decode = _best_time(lambda: rs.decode(received))
+        print(f'{num_packets:>8} {packets.nbytes / encode / 1e6:>14.2f}'
+              f' {packets.nbytes / decode / 1e6:>14.2f}')
+
+
+def bench_ldpc(codeword_counts=(10, 100, 1000), num_bits=1008, ebn0_db=2):
+    """
+    Measure the throughput of the LDPC decoder on batches of noisy codewords.
+
+    The batched decoder is compared with decoding each codeword on its own,
+    which is what the batch replaces.
+
+    """
+    code = ldpc_code(num_bits)
+    print(f'LDPC ({code.num_bits}, {code.num_data_bits}) min-sum, Eb/N0'
+          f' {ebn0_db}dB')
+    print(f'{"codewords":>10} {"batch (Mbit/s)":>15} {"one at a time":>14}')
+
+    rng = np.random.default_rng(0)
+    sigma = np.sqrt(1 / (2 * code.rate * 10**(ebn0_db / 10)))
+
+    for num_codewords in codeword_counts:
+        messages = rng.integers(0, 2, size=(num_codewords,
+                                            code.num_data_bits))
+        signal = 1 - 2 * code.encode(messages).astype(float)
+        llrs = 2 * (signal + rng.normal(scale=sigma, size=signal.shape)) \
+            / sigma**2
+
+        batch = _best_time(lambda: code.decode_soft(llrs))
+        single = _best_time(lambda: [code.decode_soft(row) for row in llrs])
+        print(f'{num_codewords:>10} {messages.size / batch / 1e6:>15.3f}'
+              f' {messages.size / single / 1e6:>14.3f}')
+
+
+def _block_interleave_loop(bits, num_rows, num_columns):
+    """Reference block interleaver: fill each grid and read it per bit."""
+    interleaved = []
+    grid_size = num_rows * num_columns
+    for start in range(0, len(bits), grid_size):
+        grid = bits[start:start + grid_size]
+        for column in range(num_columns):
+            for row in range(num_rows):
+                if row * num_columns + column < len(grid):
+                    interleaved.append(grid[row * num_columns + column])
+    return interleaved
+
+
+def bench_interleaver(message_counts=(1, 10, 100), num_bits=100800,
+                      num_rows=16, num_columns=63):
+    """
+    Time interleaving and deinterleaving batches of bits and soft values.
+
+    Each pass is one gather (or scatter) through cached index arrays. The
+    block interleaver is compared with filling and reading each grid per
+    bit, run per message.
+
+    """
+    print(f'interleaving ({num_bits}-bit messages, {num_rows} x'
+          f' {num_columns} block, {num_rows}-branch convolutional)')
+    print(f'{"messages":>9} {"block (s)":>10} {"deint (s)":>10}'
+          f' {"conv (s)":>9} {"deint (s)":>10} {"loop (s)":>9}'
+          f' {"speedup":>8}')
+
+    rng = np.random.default_rng(0)
+    block = BlockInterleaver(num_rows, num_columns)
+    convolutional = ConvolutionalInterleaver(num_rows)
+
+    for num_messages in message_counts:
+        bits = rng.integers(0, 2, size=(num_messages, num_bits),
+                            dtype=np.uint8)
+        llrs = rng.normal(size=(num_messages, num_bits))
+        received = convolutional.interleave(llrs)
+        lists = bits.tolist()
+
+        interleave = _best_time(lambda: block.interleave(bits))
+        deinterleave = _best_time(lambda: block.deinterleave(llrs))
+        conv = _best_time(lambda: convolutional.interleave(bits))
+        conv_de = _best_time(lambda: convolutional.deinterleave(received))
+        old = _best_time(lambda: [
+            _block_interleave_loop(row, num_rows, num_columns)
+            for row in lists
+        ], repeat=1)
+        print(f'{num_messages:>9} {interleave:>10.5f} {deinterleave:>10.5f}'
+              f' {conv:>9.5f} {conv_de:>10.5f} {old:>9.5f}'
+              f' {old / interleave:>7.0f}x')
+
+
+# Code testing region.
+if __name__ == '__main__':
+    bench_wave_gen()
+    bench_oscillator()
+    bench_transmit()
+    bench_single_channel()
+    bench_receiver_array()
+    bench_combine_wave()
+    bench_phase_checker()
+    bench_fsk_detector()
+    bench_sliding_dft()
+    bench_symbol_slicer()
+    bench_doa()
+    bench_plane_wave()
+    bench_gcc_phat()
+    bench_steered_doa()
+    bench_hamming()
+    bench_gf2_multiply()
+    bench_repetition()
+    bench_viterbi()
+    bench_reed_solomon()
+    bench_ldpc()
+    bench_interleaver()
@@ -8,3 +8,7 @@ Created on Sun Jun 28 16:28:55 2020
 
 from .error_correction_utils import *
 from .error_correction import *
+from .convolutional import *
+from .reed_solomon import *
+from .ldpc import *
+from .interleaver import *
@@ -14,6 +14,8 @@ https://www.youtube.com/playlist?list=PLJHszsWbB6hqkOyFCQOAlQtfzC1G9sf2_
 
 """
 
+from functools import lru_cache
+
 import numpy as np
 
 import ecc.error_correction_utils as utils
@@ -39,11 +41,11 @@ def repetition_encoder(message, num_repetitions):
     if num_repetitions > len(message):
         raise ValueError('Error: the number of repetitions cannot be greater'
                          ' than the length of the input.')
-    for bit in message:
-        if bit not in ['0', '1', 'x']:
-            raise ValueError("Bit values must be '0', '1', or 'x'.")
+    bits, erased = utils.string_to_bits(message, allow_erasures=True)
 
-    return "".join([num_repetitions * bit for bit in message])
+    # The erasures are repeated along with the bits.
+    code = RepetitionCode(num_repetitions)
+    return utils.bits_to_string(code.encode(bits), code.encode(erased))
 
 
 def repetition_decoder(code, num_repetitions):
@@ -73,34 +75,135 @@ def repetition_decoder(code, num_repetitions):
         raise ValueError('The length of the input is not an integer multiple'
                          ' of the number of repetitions.')
 
-    message = ''
+    bits, erased = utils.string_to_bits(code, allow_erasures=True)
+    return utils.bits_to_string(
+        *RepetitionCode(num_repetitions).decode(bits, erased)
+    )
+
 
-    # Loop through each chunk of repeated bits (codeword).
-    for i in range(0, len(code), num_repetitions):
-        bit_sum = 0
+class RepetitionCode:
+    """
+    A repetition code on arrays of bits.
 
-        # Sum the bits in the chunk.
-        for j in range(num_repetitions):
-            # If a bit has an unknown value (represented by 'x'), set
-            # the average to 0.5 to signify an unknown chunk and exit loop.
-            if code[i+j] == 'x':
-                bit_sum = 0.5 * num_repetitions     # Sets average to 0.5
-                break
-            # If the input is a 0 or a 1, add the value to the sum.
-            elif code[i+j] == '0' or code[i+j] == '1':
-                bit_sum += int(code[i+j])
-            # If the input value is an invalid character, raise an error.
-            else:
-                raise ValueError("Bit values must be '0', '1', or 'x'.")
+    Each bit is sent num_repetitions times. The repeats of each bit are
+    gathered into a (..., num_bits, num_repetitions) array, so a whole
+    message (or a batch of messages) is encoded or decoded at once, either
+    by majority vote on hard bits or by adding up soft log-likelihood
+    ratios.
 
-        # Calculate the average bit value in the chunk.
-        average = bit_sum / num_repetitions
+    Parameters
+    ----------
+    num_repetitions : positive int
+        Number of times to repeat each bit.
 
-        # Set the value of the chunk.
-        message += \
-            '1' if average > 0.5 else ('0' if average < 0.5 else 'x')
+    """
 
-    return message
+    def __init__(self, num_repetitions):
+        if num_repetitions < 1:
+            raise ValueError('The number of repetitions must be positive.')
+        self.num_repetitions = num_repetitions
+
+    def encode(self, message):
+        """
+        Encode a message, or a batch of messages.
+
+        Parameters
+        ----------
+        message : array_like
+            Bits to encode along the last axis. Any leading axes (e.g. one
+            row per message) are kept.
+
+        Returns
+        -------
+        code : numpy array
+            Each bit of message repeated num_repetitions times in a row.
+
+        """
+        message = np.asarray(message)
+        if message.ndim == 0:
+            raise ValueError('The message must have bits along its last'
+                             ' axis.')
+        return np.repeat(message, self.num_repetitions, axis=-1)
+
+    def decode(self, code, erasures=None):
+        """
+        Decode a code, or a batch of codes, by majority vote.
+
+        A bit is unknown if any of its repeats is erased, or if there are as
+        many 0s as 1s among them (which can only happen when num_repetitions
+        is even).
+
+        Parameters
+        ----------
+        code : array_like of 0s and 1s
+            Bits to decode along the last axis, whose length must be a
+            multiple of num_repetitions. Any leading axes (e.g. one row per
+            message) are kept.
+
+        erasures : array_like of bool, optional
+            True for every bit of code whose value is unknown (an 'x' in
+            repetition_decoder), the same shape as code. The values of these
+            bits are ignored. The default is None, which means no bits are
+            erased.
+
+        Returns
+        -------
+        message : numpy array of uint8
+            The decoded bits (0 where unknown).
+
+        unknown : numpy array of bool
+            True for every decoded bit whose value could not be determined.
+
+        """
+        repeats = self._repeats(code)
+        if np.any((repeats != 0) & (repeats != 1)):
+            raise ValueError('Bit values must be 0 or 1.')
+
+        # Count the 1s (a product with a vector of ones is much faster than
+        # summing along a short last axis) and compare with half the repeats.
+        votes = 2 * (repeats @ np.ones(self.num_repetitions)) \
+            - self.num_repetitions
+        unknown = votes == 0
+        if erasures is not None:
+            unknown |= np.any(self._repeats(erasures), axis=-1)
+
+        return ((votes > 0) & ~unknown).astype(np.uint8), unknown
+
+    def decode_soft(self, llrs):
+        """
+        Decode soft values, or a batch of them, by adding up their LLRs.
+
+        Parameters
+        ----------
+        llrs : array_like of float
+            Log-likelihood ratio log(P(0) / P(1)) of every received bit
+            along the last axis, whose length must be a multiple of
+            num_repetitions (an erased bit has an LLR of 0). Any leading axes
+            are kept.
+
+        Returns
+        -------
+        message : numpy array of uint8
+            The decoded bits (1 where the combined LLR is negative).
+
+        combined : numpy array of float
+            Combined LLR of each decoded bit, the sum of the LLRs of its
+            repeats.
+
+        """
+        combined = self._repeats(np.asarray(llrs, dtype=float)) \
+            @ np.ones(self.num_repetitions)
+        return (combined < 0).astype(np.uint8), combined
+
+    def _repeats(self, bits):
+        """Reshape bits to (..., num_bits, num_repetitions)."""
+        bits = np.asarray(bits)
+        if bits.ndim == 0 or bits.shape[-1] % self.num_repetitions != 0:
+            raise ValueError('The length of the input is not an integer'
+                             ' multiple of the number of repetitions.')
+        return bits.reshape(bits.shape[:-1] + (
+            bits.shape[-1] // self.num_repetitions, self.num_repetitions
+        ))
 
 
 def hamming_encoder(message, n=3):
@@ -124,29 +227,9 @@ def hamming_encoder(message, n=3):
         A binary vector of 0s and 1s representing the encoded message.
 
     """
-    # Number of bits containing information from the message per codeword
-    # (the other bits are parity bits used for error-detection/correction).
-    num_data_bits = 2**n - n - 1
-
-    if len(message) % num_data_bits != 0:
-        raise ValueError('Input length is not divisible by the number of data'
-                         ' bits per codeword.')
-
-    code = ''
-    generator_matrix = utils.hamming_generator_matrix(n)
-
-    # Loop through each chunk of data bits by index.
-    for i in range(0, len(message), num_data_bits):
-        # Compute the next codeword by multiplying the data chunk
-        # by the generator matrix.
-        codeword = utils.multiply_binary_finite_field_matrices(
-             np.array([list(message[i:i+num_data_bits])]).astype(np.intc),
-             generator_matrix
-        )
-        # Convert codeword from a column vector to a string and append.
-        code += ''.join([str(bit) for bit in np.nditer(codeword)])
-
-    return code
+    return utils.bits_to_string(
+        hamming_code(n).encode(utils.string_to_bits(message))
+    )
 
 
 def hamming_decoder(code, n=3):
@@ -175,97 +258,145 @@ def hamming_decoder(code, n=3):
         A binary vector of 0s and 1s representing the decoded message.
 
     """
-    # The number of data bits and parity bits in each codeword.
-    codeword_bits = 2**n - 1
-
-    # The number of data bits per codeword.
-    num_data_bits = codeword_bits - n
-
-    if len(code) % codeword_bits != 0:
-        raise ValueError('Input length is not divisible by the number of'
-                         ' bits per codeword.')
-
-    message = ''
-
-    # Compute the parity check matrix for the assumed encoding.
-    parity_check_matrix = utils.hamming_parity_check_matrix(n)
-
-    # Loop through each codeword by index.
-    for i in range(0, len(code), codeword_bits):
-        # Convert codeword from a string to a column vector of integer bits.
-        # I hope there is a better way to do this, because this is gross.
-        codeword = np.array([[int(bit) for bit in code[i:i+codeword_bits]]]).T
-
-        # Compute the product of the parity check matrix and the codeword,
-        # called the syndome vector, to determine which error occurred, if any.
-        syndrome_vector = utils.multiply_binary_finite_field_matrices(
-            parity_check_matrix, codeword
-        )
-
-        # The new message bits before correction of any errors. The last n
-        # bits in the codeword are parity bits, which are ignored.
-        data = code[i:i+num_data_bits]
-
-        # If the syndrome vector is nonzero, there is an error.
-        if np.any(syndrome_vector):
-            # The error is located at the index of the column of the parity
-            # check matrix equal to the syndrome vector.
-            error_location = int(np.where(
-                np.all(parity_check_matrix == syndrome_vector, axis=0)
-            )[0])
-            # Convert the data bits of the codeword to a integer to make
-            # correcting the error easier.
-            data_val = int(sum(
-                [bit * 2**j for j, bit in enumerate(reversed(
-                    codeword[:num_data_bits]))]
-            ))
-
-            # If the error is in one of the data bits, correct it. Otherwise,
-            # the output is unaffected.
-            if error_location < num_data_bits:
-                # Flip the erroneous bit (using xor at the appropriate
-                # location).
-                corrected = str(bin(data_val ^ int(2**(n-error_location)))[2:])
-
-                # Finally, set the final value of the data by extending
-                # corrected to the appropriate length.
-                data = '0' * (num_data_bits - len(corrected)) + corrected
-
-        # Add the corrected (if applicable) new message bits to the message.
-        message += data
-
-    return message
+    return utils.bits_to_string(
+        hamming_code(n).decode(utils.string_to_bits(code))
+    )
+
+
+class HammingCode:
+    """
+    A systematic (2**n - 1, 2**n - n - 1) Hamming code on arrays of bits.
+
+    The generator and parity check matrices (from error_correction_utils)
+    are built once, along with a lookup table from each syndrome to the data
+    bits it flips, so a whole message (or a batch of messages) is encoded or
+    decoded with a couple of matrix products. Use hamming_code(n) to get a
+    shared, cached instance.
+
+    Parameters
+    ----------
+    n : int, optional
+        The number n corresponding to a (2**n - 1, 2**n - n - 1) Hamming code
+        (with 2**n - 1 bits per codeword, n parity bits per codeword, and thus
+        2**n - n - 1 data bits per codeword). The default is 3.
+
+    """
+
+    def __init__(self, n=3):
+        if n < 2:
+            raise ValueError('A Hamming code needs at least 2 parity bits.')
+
+        self.n = n
+        self.codeword_bits = 2**n - 1
+        self.num_data_bits = self.codeword_bits - n
+
+        self.generator_matrix = \
+            utils.hamming_generator_matrix(n).astype(np.uint8)
+        self.parity_check_matrix = \
+            utils.hamming_parity_check_matrix(n).astype(np.uint8)
+
+        # Each syndrome, read as an n-bit number, is the column of the parity
+        # check matrix where the error is. Flipping that bit corrects it,
+        # which only changes the message if it is one of the data bits.
+        self._syndrome_weights = 2**np.arange(n - 1, -1, -1)
+        self._corrections = np.zeros((2**n, self.num_data_bits),
+                                     dtype=np.uint8)
+        columns = self._syndrome_weights @ self.parity_check_matrix
+        data_columns = columns[:self.num_data_bits]
+        self._corrections[data_columns, np.arange(self.num_data_bits)] = 1
+
+        for table in (self.generator_matrix, self.parity_check_matrix,
+                      self._corrections):
+            table.setflags(write=False)
+
+    def encode(self, message):
+        """
+        Encode a message, or a batch of messages.
+
+        Parameters
+        ----------
+        message : array_like of 0s and 1s
+            Bits to encode along the last axis, whose length must be a
+            multiple of the number of data bits per codeword. Any leading
+            axes (e.g. one row per message) are kept.
+
+        Returns
+        -------
+        code : numpy array of uint8
+            The encoded bits, 2**n - 1 for every 2**n - n - 1 message bits.
+
+        """
+        words = utils.split_codewords(message, self.num_data_bits)
+        # Products of uint8 bits wrap around modulo 256, which leaves their
+        # parity (all that matters in GF(2)) unchanged.
+        code = (words @ self.generator_matrix) & 1
+        return code.reshape(code.shape[:-2]
+                            + (code.shape[-2] * self.codeword_bits,))
+
+    def decode(self, code):
+        """
+        Decode a code, or a batch of codes, correcting one error per codeword.
+
+        Parameters
+        ----------
+        code : array_like of 0s and 1s
+            Bits to decode along the last axis, whose length must be a
+            multiple of the number of bits per codeword. Any leading axes
+            (e.g. one row per message) are kept.
+
+        Returns
+        -------
+        message : numpy array of uint8
+            The decoded message bits.
+
+        """
+        words = utils.split_codewords(code, self.codeword_bits)
+        syndromes = (words @ self.parity_check_matrix.T) & 1
+        message = words[..., :self.num_data_bits] \
+            ^ self._corrections[syndromes @ self._syndrome_weights]
+        return message.reshape(message.shape[:-2]
+                               + (message.shape[-2] * self.num_data_bits,))
+
+
+@lru_cache(maxsize=None)
+def hamming_code(n=3):
+    """Return the shared HammingCode for the given n (built on first use)."""
+    return HammingCode(n)
 
 
 # Code testing region.
 if __name__ == '__main__':
     num_tests = 10000
 
-    # Test Hamming (7,4) encoder/decoder.
-    for test in range(num_tests):
-        message = ''
-
-        # Generate a random 40-bit message, which will yield 10 codewords for
-        # a Hamming (7,4) code.
-        for bit in range(40):
-            message += np.random.choice(['0', '1'])
-
-        # Encode the message.
-        code = hamming_encoder(message)
-
-        code_distorted = ''
-
-        # Create a distorted code by randomly flipping one bit in each word.
-        for i in range(0, len(code), 7):
-            index = np.random.randint(0, 6)
-            code_distorted += (
-                code[i:i+index]
-                + ('0' if code[i+index] == '1' else '1')
-                + code[i+index+1:i+7]
-            )
-
-        # Decode the code and the distorted code and check that both yield the
-        # original message.
-        assert hamming_decoder(code) == message \
-            and hamming_decoder(code_distorted) == message, \
-            'WRONG. YOUR CODE IS WRONG. SAD.'
+    # Test Hamming (7,4) encoder/decoder, on every test message at once.
+    hamming = hamming_code(3)
+
+    # Generate random 40-bit messages, each of which will yield 10 codewords
+    # for a Hamming (7,4) code.
+    messages = np.random.randint(0, 2, size=(num_tests, 40), dtype=np.uint8)
+
+    # Encode the messages.
+    codes = hamming.encode(messages)
+
+    # Create distorted codes by randomly flipping one bit in each word.
+    codes_distorted = codes.reshape(num_tests, 10, 7).copy()
+    index = np.random.randint(0, 7, size=(num_tests, 10))
+    np.put_along_axis(
+        codes_distorted, index[..., np.newaxis],
+        1 - np.take_along_axis(codes_distorted, index[..., np.newaxis], -1),
+        axis=-1
+    )
+    codes_distorted = codes_distorted.reshape(num_tests, 70)
+
+    # Decode the codes and the distorted codes and check that both yield the
+    # original messages.
+    assert np.array_equal(hamming.decode(codes), messages) \
+        and np.array_equal(hamming.decode(codes_distorted), messages), \
+        'WRONG. YOUR CODE IS WRONG. SAD.'
+
+    # The string interface gives the same results.
+    message = utils.bits_to_string(messages[0])
+    distorted = utils.bits_to_string(codes_distorted[0])
+    assert hamming_encoder(message) == utils.bits_to_string(codes[0]) \
+        and hamming_decoder(distorted) == message, \
+        'WRONG. YOUR CODE IS WRONG. SAD.'
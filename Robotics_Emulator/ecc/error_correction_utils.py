@@ -11,6 +11,10 @@ This file provides a set of utility function for the error correction file.
 
 import numpy as np
 
+# Number of 64-bit words in each block of intermediate row and column
+# products in multiply_binary_finite_field_matrices (32MB).
+PRODUCT_BLOCK_SIZE = 2**22
+
 
 def hamming_generator_matrix(n):
     """
@@ -116,6 +120,11 @@ def multiply_binary_finite_field_matrices(left, right):
     """
     Evaluate the product of two binary matrices using finite field operations.
 
+    Each row of left and each column of right is packed into 64-bit words,
+    so every entry of the product is the parity of the number of set bits in
+    the AND of a row and a column, computed 64 bits at a time and for every
+    pair of rows and columns at once.
+
     Parameters
     ----------
     left : 2D array_like
@@ -140,12 +149,145 @@ def multiply_binary_finite_field_matrices(left, right):
         raise ValueError('The number of columns in the left operand must'
                          ' equal the number of rows in the right operand.')
 
-    product = np.empty((left_arr.shape[0], right_arr.shape[1]), dtype=int)
-
-    for i in range(left_arr.shape[0]):
-        for j in range(right_arr.shape[1]):
-            product[i][j] = left_arr[i][0] * right_arr[0][j]
-            for entry in range(1, left_arr.shape[1]):
-                product[i][j] ^= left_arr[i][entry] * right_arr[entry][j]
+    # Pack the rows of left and the columns of right into 64-bit words.
+    left_words = pack_rows(left_arr != 0)
+    right_words = pack_rows(right_arr.T != 0)
+
+    num_rows = left_arr.shape[0]
+    num_cols = right_arr.shape[1]
+    product = np.empty((num_rows, num_cols), dtype=int)
+
+    # The parity of a sum of bit counts is the parity of the bit count of the
+    # XOR of the words, so the words of each row and column pair are XORed
+    # together before counting. Rows are done in blocks, to keep the
+    # (rows, columns, words) intermediate to a few megabytes.
+    num_words = left_words.shape[1]
+    block_rows = max(1, PRODUCT_BLOCK_SIZE // max(num_cols * num_words, 1))
+    for start in range(0, num_rows, block_rows):
+        block = left_words[start:start+block_rows, np.newaxis, :] \
+            & right_words[np.newaxis, :, :]
+        product[start:start+block_rows] = _parity(
+            np.bitwise_xor.reduce(block, axis=-1)
+        )
 
     return product
+
+
+def string_to_bits(bits, allow_erasures=False):
+    """
+    Convert a string of '0's and '1's to a uint8 array of bits.
+
+    Parameters
+    ----------
+    bits : str
+        A binary vector of 0s and 1s (and 'x's, if allow_erasures is True).
+    allow_erasures : bool, optional
+        Whether erased bits, written as 'x', are allowed. The default is
+        False.
+
+    Returns
+    -------
+    array : 1D numpy array of uint8
+        The bits. Erased bits are 0.
+    erased : 1D numpy array of bool
+        True at each 'x'. Only returned if allow_erasures is True.
+
+    """
+    array = np.frombuffer(bits.encode('latin-1'), dtype=np.uint8) - ord('0')
+    if not allow_erasures:
+        if np.any(array > 1):
+            raise ValueError("Bit values must be '0' or '1'.")
+        return array
+
+    erased = array == ord('x') - ord('0')
+    if np.any((array > 1) & ~erased):
+        raise ValueError("Bit values must be '0', '1', or 'x'.")
+    return np.where(erased, 0, array), erased
+
+
+def bits_to_string(bits, erased=None):
+    """
+    Convert an array of bits to a string of '0's and '1's.
+
+    Parameters
+    ----------
+    bits : array_like of 0s and 1s
+        The bits, flattened in order.
+    erased : array_like of bool, optional
+        Bits where this is True become 'x's. The default is None.
+
+    Returns
+    -------
+    str
+        A binary vector of 0s and 1s (and 'x's).
+
+    """
+    chars = np.asarray(bits, dtype=np.uint8).reshape(-1) + ord('0')
+    if erased is not None:
+        chars[np.asarray(erased).reshape(-1)] = ord('x')
+    return chars.tobytes().decode('latin-1')
+
+
+def split_codewords(bits, word_length):
+    """
+    Check an array of bits and split it into codewords.
+
+    Parameters
+    ----------
+    bits : array_like of 0s and 1s
+        Bits along the last axis, whose length must be a multiple of
+        word_length. Any leading axes are kept.
+    word_length : int
+        Number of bits per codeword.
+
+    Returns
+    -------
+    words : numpy array of uint8
+        The bits, of shape (..., num_words, word_length).
+
+    """
+    bits = np.asarray(bits)
+    if bits.ndim == 0 or bits.shape[-1] % word_length != 0:
+        raise ValueError('Input length is not divisible by the number of'
+                         f' bits per codeword ({word_length}).')
+    if np.any((bits != 0) & (bits != 1)):
+        raise ValueError('Bit values must be 0 or 1.')
+    return bits.astype(np.uint8, copy=False).reshape(
+        bits.shape[:-1] + (bits.shape[-1] // word_length, word_length)
+    )
+
+
+def pack_rows(bits):
+    """
+    Pack each row of a 2D boolean array into 64-bit words.
+
+    Parameters
+    ----------
+    bits : 2D array_like of bool
+        The bits, one row per packed row.
+
+    Returns
+    -------
+    words : 2D numpy array of uint64
+        Array of shape (rows, words), with bit j of each row in bit j % 64
+        of word j // 64 (the unused high bits of the last word are 0).
+
+    """
+    packed = np.packbits(bits, axis=1, bitorder='little')
+    num_words = -(-packed.shape[1] // 8)
+    padded = np.zeros((packed.shape[0], 8 * max(num_words, 1)),
+                      dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view(np.uint64)
+
+
+def _parity(words):
+    """Parity (0 or 1) of the number of set bits in each uint64 word."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words) & 1
+    # Older numpy has no popcount, so the word is folded in half with XOR
+    # until a single bit holds the parity of all of them.
+    words = words.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        words ^= words >> np.uint64(shift)
+    return words & np.uint64(1)
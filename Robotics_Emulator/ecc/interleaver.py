@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This file provides block and convolutional interleavers, which spread burst
+errors (from Doppler and multipath in the channel) over many codewords.
+
+The codes in ecc correct a few errors per codeword, but a fade wipes out a
+run of neighbouring bits, all of which land in the same one or two
+codewords. An interleaver reorders the code bits before modulation so that
+neighbouring bits on the channel come from codewords far apart, and the
+matching deinterleaver puts the received values back in order before
+decoding, leaving each codeword with only a few isolated errors.
+
+Both interleavers are fixed permutations of the bits (padded with filler
+bits, for the convolutional interleaver). The permutation index arrays are
+computed once for each length and cached (for the INDEX_CACHE_SIZE most
+recently used lengths), so each pass is a single fancy indexing operation
+along the last axis. They work on any array, so batches of messages and
+soft values (e.g. LLRs from the demodulator) are reordered the same way as
+bits. Deinterleaving is up to the receiver: transmit only interleaves.
+
+For a useful intro to interleaving, see here:
+https://en.wikipedia.org/wiki/Burst_error-correcting_code#Interleaved_codes
+
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+# Number of index arrays kept for the most recently used lengths, so that a
+# sweep over many packet lengths doesn't hold on to every one of them.
+INDEX_CACHE_SIZE = 64
+
+
+class BlockInterleaver:
+    """
+    A block interleaver: bits are written into a grid row by row and read
+    out column by column.
+
+    Any run of up to num_rows neighbouring bits on the channel then comes
+    from different rows, num_columns apart in the original order. With one
+    codeword per row (num_columns a multiple of the codeword length), a
+    burst of num_rows errors leaves at most one error in each codeword. A
+    last partial grid is read out the same way, skipping its empty cells.
+
+    Parameters
+    ----------
+    num_rows : int
+        Number of rows in each grid (the longest burst spread out).
+
+    num_columns : int
+        Number of columns in each grid.
+
+    """
+
+    def __init__(self, num_rows, num_columns):
+        if num_rows < 1 or num_columns < 1:
+            raise ValueError('The numbers of rows and columns must be'
+                             ' positive.')
+        self.num_rows = num_rows
+        self.num_columns = num_columns
+
+    def interleave(self, values):
+        """
+        Interleave bits, or a batch of them.
+
+        Parameters
+        ----------
+        values : array_like
+            Bits (or any other values) to interleave along the last axis. Any
+            leading axes are kept.
+
+        Returns
+        -------
+        interleaved : numpy array
+            The values in the order they are sent, of the same shape.
+
+        """
+        values = np.asarray(values)
+        return values[..., _block_order(self.num_rows, self.num_columns,
+                                        _length(values))[0]]
+
+    def deinterleave(self, values):
+        """
+        Undo interleave, on bits or soft values, or a batch of them.
+
+        Parameters
+        ----------
+        values : array_like
+            Received values along the last axis. Any leading axes are kept.
+
+        Returns
+        -------
+        deinterleaved : numpy array
+            The values in their original order, of the same shape.
+
+        """
+        values = np.asarray(values)
+        return values[..., _block_order(self.num_rows, self.num_columns,
+                                        _length(values))[1]]
+
+
+class ConvolutionalInterleaver:
+    """
+    A convolutional (Forney) interleaver.
+
+    Bits are dealt in turn to num_branches branches, where branch k delays
+    them by k * delay * num_branches positions, and the deinterleaver delays
+    branch k by the rest of (num_branches - 1) * delay * num_branches. Any
+    run of up to num_branches neighbouring bits on the channel then comes
+    from bits delay * num_branches - 1 apart in the original order. This
+    spreads bursts as well as a block interleaver with num_branches rows and
+    delay * num_branches columns, for about half the end-to-end delay.
+
+    The interleaved output is longer than its input by latency filler bits
+    (0s, or zero LLRs for soft values), which the deinterleaver drops.
+
+    Parameters
+    ----------
+    num_branches : int
+        Number of branches (the longest burst spread out).
+
+    delay : int, optional
+        Delay of each successive branch, in rounds of num_branches bits.
+        The default is 1.
+
+    """
+
+    def __init__(self, num_branches, delay=1):
+        if num_branches < 1 or delay < 0:
+            raise ValueError('The number of branches must be positive and'
+                             ' the delay non-negative.')
+        self.num_branches = num_branches
+        self.delay = delay
+        self.latency = (num_branches - 1) * delay * num_branches
+
+    def interleave(self, values):
+        """
+        Interleave bits, or a batch of them.
+
+        Parameters
+        ----------
+        values : array_like
+            Bits (or any other values) to interleave along the last axis. Any
+            leading axes are kept.
+
+        Returns
+        -------
+        interleaved : numpy array
+            The values in the order they are sent, with latency more along
+            the last axis (the gaps hold zeros).
+
+        """
+        values = np.asarray(values)
+        interleaved = np.zeros(values.shape[:-1] + (_length(values)
+                                                    + self.latency,),
+                               dtype=values.dtype)
+        interleaved[..., _forney_positions(
+            self.num_branches, self.delay, values.shape[-1]
+        )] = values
+        return interleaved
+
+    def deinterleave(self, values):
+        """
+        Undo interleave, on bits or soft values, or a batch of them.
+
+        Parameters
+        ----------
+        values : array_like
+            Received values along the last axis, at least latency of them.
+            Any leading axes are kept.
+
+        Returns
+        -------
+        deinterleaved : numpy array
+            The values in their original order, with latency fewer along the
+            last axis.
+
+        """
+        values = np.asarray(values)
+        if _length(values) < self.latency:
+            raise ValueError('Input is shorter than the interleaver latency'
+                             f' ({self.latency}).')
+        return values[..., _forney_positions(
+            self.num_branches, self.delay, values.shape[-1] - self.latency
+        )]
+
+
+def _length(values):
+    """Length of the last axis of values, which must have one."""
+    if values.ndim == 0:
+        raise ValueError('Input must have at least one axis.')
+    return values.shape[-1]
+
+
+@lru_cache(maxsize=INDEX_CACHE_SIZE)
+def _block_order(num_rows, num_columns, length):
+    """
+    Index arrays of a block interleaver for this length.
+
+    Returns the original position of each interleaved bit, and the
+    interleaved position of each original bit.
+    """
+    grid_size = num_rows * num_columns
+    positions = np.arange(length)
+    grid, cell = np.divmod(positions, grid_size)
+    row, column = np.divmod(cell, num_columns)
+    # Sort by grid, then column, then row: the cells are read column by
+    # column, and any empty cells of a last partial grid are skipped.
+    order = np.argsort(grid * grid_size + column * num_rows + row,
+                       kind='stable')
+    inverse = np.empty_like(order)
+    inverse[order] = positions
+    for table in (order, inverse):
+        table.setflags(write=False)
+    return order, inverse
+
+
+@lru_cache(maxsize=INDEX_CACHE_SIZE)
+def _forney_positions(num_branches, delay, length):
+    """
+    Interleaved position of each original bit of a convolutional
+    interleaver for this length.
+
+    Bit t is on branch t % num_branches, so it is sent
+    (t % num_branches) * delay * num_branches positions late. After the
+    deinterleaver's delay every bit is latency late, which is the same
+    index array read the other way.
+    """
+    positions = np.arange(length)
+    positions += positions % num_branches * (delay * num_branches)
+    positions.setflags(write=False)
+    return positions
+
+
+# Code testing region.
+if __name__ == '__main__':
+    from ecc.error_correction import hamming_code
+
+    # Bursts of 16 wrong bits, about one every 500 bits, through a Hamming
+    # (7, 4) code that can correct 1 error per codeword.
+    rng = np.random.default_rng(0)
+    hamming = hamming_code(3)
+    message = rng.integers(0, 2, size=(100, 4 * 1000), dtype=np.uint8)
+    code = hamming.encode(message)
+
+    def burst_channel(sent):
+        """Flip a run of 16 bits at random places along each row."""
+        received = sent.copy()
+        length = received.shape[-1]
+        starts = rng.integers(0, length - 16, size=(len(received),
+                                                    length // 500))
+        runs = (starts[..., np.newaxis] + np.arange(16)).reshape(
+            len(received), -1
+        )
+        np.put_along_axis(received, runs, 1 - np.take_along_axis(
+            received, runs, -1
+        ), -1)
+        return received
+
+    interleavers = {
+        'none': None,
+        'block 16 x 7': BlockInterleaver(16, 7),
+        'convolutional 16 x 1': ConvolutionalInterleaver(16, 1),
+    }
+    for name, interleaver in interleavers.items():
+        if interleaver is None:
+            received = burst_channel(code)
+        else:
+            received = interleaver.deinterleave(burst_channel(
+                interleaver.interleave(code)
+            ))
+            # Soft values go through the same permutation.
+            llrs = 1.0 - 2 * code
+            assert np.array_equal(interleaver.deinterleave(
+                interleaver.interleave(llrs)
+            ), llrs), 'WRONG. YOUR CODE IS WRONG. SAD.'
+        decoded = hamming.decode(received)
+        print(f'{name}: BER {np.mean(decoded != message):.2e}')
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This file provides low-density parity-check (LDPC) codes, with a batched
+belief-propagation decoder (min-sum or sum-product).
+
+An LDPC code is defined by a sparse parity check matrix H: a codeword c is
+valid when every parity check (row of H) sees an even number of 1s, i.e.
+Hc = 0. Gallager's regular construction gives every bit the same number of
+checks (the column weight) and every check the same number of bits (the row
+weight), which is stored compactly as a (row weight, num_checks) array of
+the bit indices in each check. Irregular matrices are padded with a dummy
+bit that is always known to be 0.
+
+Encoding is systematic: row reducing H over GF(2) splits the bits into
+message bits and parity bits, where each parity bit is a fixed sum of
+message bits. The columns are reordered so that each codeword is the message
+followed by its parity.
+
+The decoder passes log-likelihood ratios back and forth between bits and
+checks (the edges of the Tanner graph). Every message of every codeword in a
+batch is held in one (codewords, row weight, checks) array, so each half
+iteration is a handful of array operations, and the codewords whose hard
+decisions satisfy every check are taken out of the batch as they finish.
+
+For a useful intro to LDPC codes, see here:
+https://en.wikipedia.org/wiki/Low-density_parity-check_code
+
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from ecc.error_correction_utils import (
+    bits_to_string, multiply_binary_finite_field_matrices, pack_rows,
+    split_codewords, string_to_bits
+)
+
+# Number of edge messages in each block of codewords decoded together (about
+# 16MB per array of single precision messages).
+LDPC_BLOCK_SIZE = 2**22
+
+# Magnitude of the LLR given to the dummy bit that pads irregular checks
+# (certainly a 0, without risking inf - inf).
+_KNOWN_LLR = 1e30
+
+
+def ldpc_encoder(message, num_bits=1008):
+    """
+    Encode the given message using a rate 1/2 regular LDPC code.
+
+    Parameters
+    ----------
+    message : str
+        A binary vector of 0s and 1s to be encoded, whose length is a
+        multiple of the number of message bits per codeword.
+    num_bits : int, optional
+        Number of bits per codeword of the (3, 6) regular Gallager code from
+        ldpc_code. The default is 1008.
+
+    Returns
+    -------
+    code : str
+        A binary vector of 0s and 1s representing the encoded message.
+
+    """
+    return bits_to_string(ldpc_code(num_bits).encode(
+        string_to_bits(message)
+    ))
+
+
+def ldpc_decoder(code, num_bits=1008):
+    """
+    Decode the given message, assuming a rate 1/2 regular LDPC code.
+
+    Parameters
+    ----------
+    code : str
+        A binary vector of 0s and 1s to be decoded.
+    num_bits : int, optional
+        Number of bits per codeword. The default is 1008.
+
+    Returns
+    -------
+    message : str
+        A binary vector of 0s and 1s representing the decoded message.
+
+    """
+    return bits_to_string(ldpc_code(num_bits).decode(
+        string_to_bits(code)
+    )[0])
+
+
+def gallager_parity_check_matrix(num_bits, column_weight=3, row_weight=6,
+                                 seed=0):
+    """
+    Return the compact form of a regular Gallager parity check matrix.
+
+    The checks are split into column_weight bands, each of which covers every
+    bit exactly once: the first band takes the bits in order, row_weight at a
+    time, and the others take them in a random order.
+
+    Parameters
+    ----------
+    num_bits : int
+        Number of bits per codeword (columns of H), a multiple of
+        row_weight.
+    column_weight : int, optional
+        Number of checks on each bit. The default is 3.
+    row_weight : int, optional
+        Number of bits in each check. The default is 6.
+    seed : int, optional
+        Seed for the random orders of the bands. The default is 0.
+
+    Returns
+    -------
+    check_bits : 2D numpy array of int
+        Array of shape (row_weight, num_checks) holding the bits in each
+        check, with num_checks = num_bits * column_weight / row_weight.
+
+    """
+    if num_bits <= 0 or num_bits % row_weight != 0:
+        raise ValueError('The number of bits must be a positive multiple of'
+                         ' the row weight.')
+    if column_weight < 1 or row_weight < 2:
+        raise ValueError('The column weight must be at least 1 and the row'
+                         ' weight at least 2.')
+
+    rng = np.random.default_rng(seed)
+    bands = [np.arange(num_bits)] + [rng.permutation(num_bits)
+                                     for band in range(column_weight - 1)]
+    return np.concatenate([band.reshape(-1, row_weight) for band in bands]).T
+
+
+class LDPCCode:
+    """
+    A systematic LDPC code on arrays of bits.
+
+    Parameters
+    ----------
+    check_bits : array_like
+        Either the compact form of the parity check matrix (as from
+        gallager_parity_check_matrix), a (row_weight, num_checks) array of
+        the bits in each check, or a dense binary (num_checks, num_bits)
+        parity check matrix (with dense=True).
+
+    num_bits : int, optional
+        Number of bits per codeword. The default is None, which is one more
+        than the largest bit index in check_bits.
+
+    dense : bool, optional
+        If True, check_bits is a dense parity check matrix. The default is
+        False.
+
+    """
+
+    def __init__(self, check_bits, num_bits=None, dense=False):
+        if dense:
+            check_bits = _compact(np.asarray(check_bits))
+        check_bits = np.asarray(check_bits, dtype=np.int64)
+        if check_bits.ndim != 2 or check_bits.size == 0:
+            raise ValueError('The checks must be a non-empty (row_weight,'
+                             ' num_checks) array of bit indices.')
+        if num_bits is None:
+            num_bits = int(check_bits[check_bits >= 0].max()) + 1
+        if np.any(check_bits >= num_bits):
+            raise ValueError('Every bit index must be less than num_bits.')
+
+        # Negative indices pad irregular checks; they point at a dummy bit
+        # after the real ones.
+        check_bits = np.where(check_bits < 0, num_bits, check_bits)
+        parity_check = np.zeros((check_bits.shape[1], num_bits + 1),
+                                dtype=np.uint8)
+        np.bitwise_xor.at(parity_check, (np.arange(check_bits.shape[1]),
+                                         check_bits), 1)
+        parity_check = parity_check[:, :num_bits]
+
+        # Row reduce H over GF(2). The pivot columns become the parity bits,
+        # each a sum of the other (message) bits, so the columns are reordered
+        # to put the message bits first.
+        reduced, pivots = _row_reduce(parity_check)
+        message_columns = np.setdiff1d(np.arange(num_bits), pivots)
+        order = np.concatenate((message_columns, pivots))
+        position = np.empty(num_bits + 1, dtype=np.int64)
+        position[order] = np.arange(num_bits)
+        position[num_bits] = num_bits
+
+        self.num_bits = num_bits
+        self.num_data_bits = len(message_columns)
+        self.num_checks = check_bits.shape[1]
+        self.rate = self.num_data_bits / num_bits
+        self.check_bits = position[check_bits]
+        self._parity_generator = reduced[:, message_columns]
+
+        # Edges into each bit, as indices into the flattened (row_weight,
+        # num_checks) edge messages, padded with an index to a zero message.
+        edges = self.check_bits.reshape(-1)
+        real = np.flatnonzero(edges < num_bits)
+        counts = np.bincount(edges[real], minlength=num_bits)
+        bit_edges = np.full((max(counts.max(initial=0), 1), num_bits),
+                            edges.size, dtype=np.int64)
+        ordered = real[np.argsort(edges[real], kind='stable')]
+        slot = np.arange(len(ordered)) - np.repeat(np.cumsum(counts)
+                                                    - counts, counts)
+        bit_edges[slot, edges[ordered]] = ordered
+        self._bit_edges = bit_edges
+
+        for table in (self.check_bits, self._parity_generator,
+                      self._bit_edges):
+            table.setflags(write=False)
+
+    @property
+    def parity_check_matrix(self):
+        """Dense (num_checks, num_bits) parity check matrix, in code order."""
+        matrix = np.zeros((self.num_checks, self.num_bits + 1), dtype=int)
+        np.bitwise_xor.at(matrix, (np.arange(self.num_checks),
+                                   self.check_bits), 1)
+        return matrix[:, :self.num_bits]
+
+    def encode(self, message):
+        """
+        Encode a message, or a batch of messages.
+
+        Parameters
+        ----------
+        message : array_like of 0s and 1s
+            Bits to encode along the last axis, whose length must be a
+            multiple of num_data_bits. Any leading axes are kept.
+
+        Returns
+        -------
+        code : numpy array of uint8
+            Each num_data_bits message bits followed by their parity bits.
+
+        """
+        words = split_codewords(message, self.num_data_bits)
+        rows = words.reshape(-1, self.num_data_bits)
+        parity = multiply_binary_finite_field_matrices(
+            rows, self._parity_generator.T
+        ).astype(np.uint8)
+        code = np.concatenate((rows, parity), axis=-1)
+        return code.reshape(words.shape[:-2]
+                            + (words.shape[-2] * self.num_bits,))
+
+    def decode(self, code, max_iterations=50, method='min-sum',
+               crossover=0.05):
+        """
+        Decode a code, or a batch of codes, from hard bits.
+
+        Each bit is given the LLR of a binary symmetric channel,
+        +/-log((1 - crossover) / crossover). Min-sum only depends on the
+        signs, but sum-product needs a realistic magnitude: with LLRs of
+        +/-1 its check messages are too weak to correct even one error.
+
+        Parameters
+        ----------
+        code : array_like of 0s and 1s
+            Received bits along the last axis, whose length must be a
+            multiple of num_bits. Any leading axes are kept.
+
+        max_iterations, method : optional
+            See decode_soft.
+
+        crossover : float, optional
+            Probability that the channel flipped each bit, between 0 and 0.5.
+            The default is 0.05.
+
+        Returns
+        -------
+        message, failed : numpy arrays
+            See decode_soft.
+
+        """
+        code = np.asarray(code)
+        if np.any((code != 0) & (code != 1)):
+            raise ValueError('Bit values must be 0 or 1.')
+        if not 0 < crossover < 0.5:
+            raise ValueError('The crossover probability must be between 0'
+                             ' and 0.5.')
+        reliability = np.log((1 - crossover) / crossover)
+        return self.decode_soft((1 - 2 * code.astype(float)) * reliability,
+                                max_iterations, method)
+
+    def decode_soft(self, llrs, max_iterations=50, method='min-sum'):
+        """
+        Decode a code, or a batch of codes, from soft values.
+
+        Parameters
+        ----------
+        llrs : array_like of float
+            Log-likelihood ratio log(P(0) / P(1)) of every received bit along
+            the last axis, whose length must be a multiple of num_bits. An
+            erased bit has an LLR of 0. Any leading axes are kept.
+
+        max_iterations : int, optional
+            Largest number of iterations for each codeword. Each codeword
+            stops as soon as its hard decisions satisfy every check. The
+            default is 50.
+
+        method : str, optional {'min-sum', 'sum-product'}
+            'min-sum' approximates each check's message by the smallest of
+            its other inputs (scaled by 0.75), which only needs the LLRs up
+            to a scale factor. 'sum-product' is exact belief propagation.
+            The default is 'min-sum'.
+
+        Returns
+        -------
+        message : numpy array of uint8
+            The decoded message bits.
+
+        failed : numpy array of bool
+            True for each codeword that still failed a check after
+            max_iterations, of shape (..., num_codewords).
+
+        """
+        if method not in ('min-sum', 'sum-product'):
+            raise ValueError("The method must be 'min-sum' or"
+                             " 'sum-product'.")
+        llrs = np.asarray(llrs, dtype=float)
+        if llrs.ndim == 0 or llrs.shape[-1] % self.num_bits != 0:
+            raise ValueError('Input length is not divisible by the number of'
+                             f' bits per codeword ({self.num_bits}).')
+
+        shape = llrs.shape[:-1] + (llrs.shape[-1] // self.num_bits,)
+        rows = llrs.reshape(-1, self.num_bits)
+        bits = np.empty(rows.shape, dtype=np.uint8)
+        failed = np.empty(len(rows), dtype=bool)
+
+        block_rows = max(1, LDPC_BLOCK_SIZE // self.check_bits.size)
+        for start in range(0, len(rows), block_rows):
+            stop = start + block_rows
+            bits[start:stop], failed[start:stop] = self._belief_propagation(
+                rows[start:stop], max_iterations, method
+            )
+
+        message = bits[:, :self.num_data_bits].reshape(
+            shape[:-1] + (shape[-1] * self.num_data_bits,)
+        )
+        return message, failed.reshape(shape)
+
+    def _belief_propagation(self, llrs, max_iterations, method):
+        """Decode a (rows, num_bits) block; returns (bits, failed)."""
+        num_rows = len(llrs)
+        bits = np.empty((num_rows, self.num_bits), dtype=np.uint8)
+        failed = np.ones(num_rows, dtype=bool)
+
+        # The channel LLRs, with the dummy bit that pads irregular checks.
+        # Messages are single precision, which halves the memory traffic of
+        # every gather and is plenty for LLRs.
+        channel = np.empty((num_rows, self.num_bits + 1), dtype=np.float32)
+        channel[:, :-1] = llrs
+        channel[:, -1] = _KNOWN_LLR
+        # Rows of the batch still being decoded, and the check to bit
+        # messages of each edge (with a zero for the padding of bit_edges).
+        active = np.arange(num_rows)
+        to_bits = np.zeros((num_rows, self.check_bits.size + 1),
+                           dtype=np.float32)
+
+        for iteration in range(max_iterations + 1):
+            # Each bit's LLR given its channel value and every check.
+            totals = channel.copy()
+            totals[:, :-1] += np.sum(to_bits[:, self._bit_edges], axis=1)
+
+            # Take out the codewords that satisfy every check.
+            hard = totals < 0
+            done = ~np.any(np.logical_xor.reduce(hard[:, self.check_bits],
+                                                 axis=1), axis=-1)
+            failed[active[done]] = False
+            if iteration == max_iterations:
+                bits[active] = hard[:, :self.num_bits]
+                break
+            bits[active[done]] = hard[done, :self.num_bits]
+            if np.all(done):
+                break
+            if np.any(done):
+                keep = ~done
+                active, channel, totals, to_bits = (
+                    active[keep], channel[keep], totals[keep], to_bits[keep]
+                )
+
+            # Bit to check messages leave out what the check just sent.
+            edges = to_bits[:, :-1].reshape(-1, *self.check_bits.shape)
+            to_checks = totals[:, self.check_bits] - edges
+            to_bits[:, :-1] = _check_messages(to_checks, method).reshape(
+                len(active), -1
+            )
+
+        return bits, failed
+
+
+@lru_cache(maxsize=None)
+def ldpc_code(num_bits=1008, column_weight=3, row_weight=6, seed=0):
+    """Return the shared regular Gallager LDPC code with these parameters."""
+    return LDPCCode(gallager_parity_check_matrix(
+        num_bits, column_weight, row_weight, seed
+    ), num_bits)
+
+
+def _check_messages(to_checks, method):
+    """
+    Messages from each check to each of its bits, from a (rows, row_weight,
+    num_checks) array of the messages into the checks.
+    """
+    # Each outgoing sign is the product of the other incoming signs: the
+    # edge's own sign times the parity of them all (copysign is far cheaper
+    # than negating in place under a mask).
+    parity = np.logical_xor.reduce(np.signbit(to_checks), axis=1)
+    magnitudes = np.abs(to_checks)
+
+    if method == 'min-sum':
+        # Each edge gets the smallest of the other magnitudes: the smallest
+        # of them all, except for the edge that holds it, which gets the
+        # second smallest (equal to the smallest if it is tied).
+        smallest = magnitudes[:, 0].copy()
+        second = np.full_like(smallest, np.inf)
+        for edge in range(1, magnitudes.shape[1]):
+            magnitude = magnitudes[:, edge]
+            np.minimum(second, np.maximum(smallest, magnitude), out=second)
+            np.minimum(smallest, magnitude, out=smallest)
+        outgoing = np.where(magnitudes == smallest[:, np.newaxis],
+                            second[:, np.newaxis], smallest[:, np.newaxis])
+        scale = np.where(parity, -0.75, 0.75).astype(to_checks.dtype)
+    else:
+        # Sum-product: 2 atanh of the product of the other tanh(LLR / 2),
+        # with the product taken as a sum of logs.
+        limits = np.finfo(to_checks.dtype)
+        logs = np.log(np.maximum(np.tanh(magnitudes / 2), limits.tiny))
+        others = np.sum(logs, axis=1, keepdims=True) - logs
+        outgoing = 2 * np.arctanh(np.minimum(np.exp(others),
+                                             1 - limits.epsneg))
+        scale = np.where(parity, -1, 1).astype(to_checks.dtype)
+
+    np.copysign(outgoing, to_checks, out=outgoing)
+    outgoing *= scale[:, np.newaxis]
+    return outgoing
+
+
+def _row_reduce(matrix):
+    """
+    Row reduce a binary matrix over GF(2).
+
+    Returns the nonzero rows of the reduced row echelon form and the column
+    of each row's leading 1.
+    """
+    num_rows, num_cols = matrix.shape
+    words = pack_rows(matrix != 0).copy()
+    pivots = []
+    row = 0
+    for col in range(num_cols):
+        if row == num_rows:
+            break
+        word, shift = divmod(col, 64)
+        column = (words[:, word] >> np.uint64(shift)) & np.uint64(1)
+        candidates = np.flatnonzero(column[row:])
+        if len(candidates) == 0:
+            continue
+        pivot = row + candidates[0]
+        words[[row, pivot]] = words[[pivot, row]]
+        column[[row, pivot]] = column[[pivot, row]]
+
+        # Clear the column from every other row.
+        others = column.astype(bool)
+        others[row] = False
+        words[others] ^= words[row]
+        pivots.append(col)
+        row += 1
+
+    reduced = np.unpackbits(words[:row].view(np.uint8), axis=1,
+                            bitorder='little')[:, :num_cols]
+    return reduced, np.array(pivots, dtype=np.int64)
+
+
+def _compact(matrix):
+    """Compact (row_weight, num_checks) form of a dense parity check matrix."""
+    if matrix.ndim != 2:
+        raise ValueError('The parity check matrix must be 2D.')
+    matrix = matrix != 0
+    weights = np.count_nonzero(matrix, axis=1)
+    check_bits = np.full((matrix.shape[0], max(weights.max(initial=0), 1)),
+                         -1, dtype=np.int64)
+    rows, cols = np.nonzero(matrix)
+    check_bits[rows, np.arange(len(rows)) - np.repeat(
+        np.cumsum(weights) - weights, weights
+    )] = cols
+    return check_bits.T
+
+
+# Code testing region.
+if __name__ == '__main__':
+    import time
+
+    # BER of the rate 1/2 code with BPSK over an additive white Gaussian
+    # noise channel, for about a million message bits per point.
+    rng = np.random.default_rng(0)
+    code = ldpc_code()
+    num_codewords = 10**6 // code.num_data_bits + 1
+    print(f'({code.num_bits}, {code.num_data_bits}) LDPC code,'
+          f' {num_codewords} codewords per point')
+
+    for eb_n0_db in (1, 1.5, 2):
+        messages = rng.integers(0, 2, size=(num_codewords,
+                                            code.num_data_bits),
+                                dtype=np.uint8)
+        symbols = 1 - 2.0 * code.encode(messages)
+        variance = 1 / (2 * code.rate * 10**(eb_n0_db / 10))
+        received = symbols + rng.normal(scale=np.sqrt(variance),
+                                        size=symbols.shape)
+
+        start = time.perf_counter()
+        decoded, failed = code.decode_soft(2 * received / variance)
+        elapsed = time.perf_counter() - start
+        print(f'Eb/N0 {eb_n0_db}dB: BER {np.mean(decoded != messages):.2e},'
+              f' {np.mean(failed):.1%} of codewords failed, {elapsed:.2f}s')
+
+    # Both methods correct a single wrong bit from hard decisions.
+    flipped = code.encode(messages[:10])
+    flipped[np.arange(10), rng.integers(0, code.num_bits, size=10)] ^= 1
+    for method in ('sum-product', 'min-sum'):
+        decoded, failed = code.decode(flipped, method=method)
+        assert np.array_equal(decoded, messages[:10]) and not np.any(failed), \
+            'WRONG. YOUR CODE IS WRONG. SAD.'
+
+    # The string interface gives the same results.
+    message = bits_to_string(messages[0])
+    assert ldpc_decoder(ldpc_encoder(message)) == message, \
+        'WRONG. YOUR CODE IS WRONG. SAD.'
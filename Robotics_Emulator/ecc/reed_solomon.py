@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This file provides a Reed-Solomon code over GF(256), for correcting the burst
+errors that multipath fades cause (a burst of up to 8 wrong bits only spoils
+one or two byte-sized symbols).
+
+A Reed-Solomon codeword is block_length bytes, of which the last num_parity
+are parity, and any num_parity / 2 wrong bytes in it can be corrected. The
+decoder follows the textbook steps: the syndromes say whether the codeword
+has errors, Berlekamp-Massey finds the error locator polynomial from them,
+a Chien search finds its roots (the error positions), and Forney's formula
+gives the error values.
+
+Multiplying two bytes in GF(256) is a lookup in a 256 x 256 product table,
+built once from log and antilog tables (using the primitive polynomial
+x^8 + x^4 + x^3 + x^2 + 1, i.e. 0x11d). Evaluating a polynomial at every
+power of the primitive element is then a lookup of every (coefficient,
+power) product followed by an XOR across the coefficients, so each step of
+the decoder works on every codeword at once, with the powers it needs
+precomputed for the code.
+
+A message that doesn't fill a whole number of codewords ends with a
+shortened codeword: the missing message bytes are taken as leading zeros,
+which are never sent.
+
+For a useful intro to Reed-Solomon codes, see here:
+https://en.wikiversity.org/wiki/Reed%E2%80%93Solomon_codes_for_coders
+
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from ecc.error_correction_utils import bits_to_string, string_to_bits
+
+# Primitive polynomial defining GF(256) (x^8 + x^4 + x^3 + x^2 + 1).
+GF256_PRIMITIVE_POLYNOMIAL = 0x11d
+
+# Number of 64-bit words in each block of looked-up products of codewords
+# processed together (16MB).
+RS_BLOCK_SIZE = 2**21
+
+
+def _gf256_tables():
+    """Antilog, log, product and inverse tables of GF(256)."""
+    exp = np.zeros(2 * 255, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int64)
+    value = 1
+    for power in range(255):
+        exp[power] = value
+        log[value] = power
+        value <<= 1
+        if value & 0x100:
+            value ^= GF256_PRIMITIVE_POLYNOMIAL
+    # Repeat the antilogs, so a sum of two logs never needs reducing.
+    exp[255:] = exp[:255]
+
+    product = exp[log[:, np.newaxis] + log[np.newaxis, :]]
+    product[0, :] = 0
+    product[:, 0] = 0
+    inverse = np.zeros(256, dtype=np.uint8)
+    inverse[1:] = exp[255 - log[1:]]
+
+    for table in (exp, log, product, inverse):
+        table.setflags(write=False)
+    return exp, log, product, inverse
+
+
+_GF_EXP, _GF_LOG, _GF_MUL, _GF_INV = _gf256_tables()
+
+
+def reed_solomon_encoder(message, num_parity=32):
+    """
+    Encode the given message using a (255, 255 - num_parity) Reed-Solomon code.
+
+    Parameters
+    ----------
+    message : str
+        A binary vector of 0s and 1s to be encoded, whose length is a
+        multiple of 8 (each 8 bits are one byte, most significant bit first).
+    num_parity : int, optional
+        Number of parity bytes per codeword. Up to num_parity / 2 wrong bytes
+        per codeword can be corrected. The default is 32.
+
+    Returns
+    -------
+    code : str
+        A binary vector of 0s and 1s representing the encoded message.
+
+    """
+    return bits_to_string(reed_solomon_code(num_parity).encode_bits(
+        string_to_bits(message)
+    ))
+
+
+def reed_solomon_decoder(code, num_parity=32):
+    """
+    Decode the given message, assuming a (255, 255 - num_parity) Reed-Solomon
+    code.
+
+    Codewords with more wrong bytes than can be corrected are left as they
+    were received.
+
+    Parameters
+    ----------
+    code : str
+        A binary vector of 0s and 1s to be decoded.
+    num_parity : int, optional
+        Number of parity bytes per codeword. The default is 32.
+
+    Returns
+    -------
+    message : str
+        A binary vector of 0s and 1s representing the decoded message.
+
+    """
+    return bits_to_string(reed_solomon_code(num_parity).decode_bits(
+        string_to_bits(code)
+    )[0])
+
+
+class ReedSolomonCode:
+    """
+    A systematic Reed-Solomon code over GF(256), on arrays of bytes.
+
+    The generator polynomial has roots 1, a, ..., a**(num_parity - 1), where
+    a = 2 is the primitive element.
+
+    Parameters
+    ----------
+    num_parity : int, optional
+        Number of parity bytes per codeword (even, to correct num_parity / 2
+        wrong bytes). The default is 32.
+
+    block_length : int, optional
+        Number of bytes in a full codeword, at most 255. The default is 255.
+
+    """
+
+    def __init__(self, num_parity=32, block_length=255):
+        if not 0 < num_parity < block_length <= 255:
+            raise ValueError('The number of parity bytes must be positive and'
+                             ' less than the block length, which must be at'
+                             ' most 255.')
+
+        self.num_parity = num_parity
+        self.block_length = block_length
+        self.num_data_bytes = block_length - num_parity
+        self.max_errors = num_parity // 2
+
+        # Generator polynomial, highest degree first.
+        generator = np.ones(1, dtype=np.uint8)
+        for root in _GF_EXP[:num_parity]:
+            generator = np.append(generator, 0) ^ np.append(
+                0, _GF_MUL[generator, root]
+            )
+
+        # The parity of message byte i alone is the remainder of
+        # x**(num_parity + num_data_bytes - 1 - i) divided by the generator,
+        # so the parity of a message is the sum of these rows times its
+        # bytes. Each row is the one below times x, reduced.
+        remainders = np.zeros((self.num_data_bytes, num_parity),
+                              dtype=np.uint8)
+        row = generator[1:].copy()
+        for i in range(self.num_data_bytes - 1, -1, -1):
+            remainders[i] = row
+            row = np.append(row[1:], 0) ^ _GF_MUL[row[0], generator[1:]]
+        self._parity_table = _product_table(remainders)
+
+        # Codeword position p holds the coefficient of x**e, e = n - 1 - p.
+        # Syndrome j evaluates the codeword at a**j, and the Chien search
+        # (and Forney's formula) evaluate polynomials at a**-e.
+        exponents = np.arange(block_length - 1, -1, -1)
+        self._syndrome_table = _product_table(_GF_EXP[
+            np.outer(exponents, np.arange(num_parity)) % 255
+        ])
+        self._chien_powers = _GF_EXP[
+            np.outer(-exponents, np.arange(num_parity)) % 255
+        ]
+        self._chien_table = _product_table(
+            self._chien_powers[:, :self.max_errors + 1].T
+        )
+        self._error_positions = _GF_EXP[exponents % 255]
+
+    def encode(self, message):
+        """
+        Encode a message of bytes, or a batch of messages.
+
+        Parameters
+        ----------
+        message : array_like of uint8
+            Bytes to encode along the last axis. Any leading axes (e.g. one
+            row per message) are kept.
+
+        Returns
+        -------
+        code : numpy array of uint8
+            One codeword for each num_data_bytes bytes of message (the
+            message bytes followed by num_parity parity bytes), with the last
+            one shortened if the message doesn't fill it.
+
+        """
+        message = self._symbols(message)
+        num_bytes = message.shape[-1]
+        blocks = self._split(message, self.num_data_bytes)
+
+        parity = _xor_products(blocks, self._parity_table)
+        code = np.concatenate((blocks, parity), axis=-1)
+        return self._join(code, num_bytes % self.num_data_bytes,
+                          self.num_data_bytes)
+
+    def decode(self, code):
+        """
+        Decode a code of bytes, or a batch of codes.
+
+        Parameters
+        ----------
+        code : array_like of uint8
+            Received bytes along the last axis (full codewords, then possibly
+            one shortened codeword of more than num_parity bytes). Any leading
+            axes are kept.
+
+        Returns
+        -------
+        message : numpy array of uint8
+            The corrected message bytes. Codewords that can't be corrected
+            are left as they were received.
+
+        failed : numpy array of bool
+            True for each codeword that had too many errors to correct, of
+            shape (..., num_codewords).
+
+        """
+        code = self._symbols(code)
+        num_bytes = code.shape[-1]
+        last = num_bytes % self.block_length
+        if 0 < last <= self.num_parity:
+            raise ValueError('The last codeword must have more than'
+                             f' {self.num_parity} bytes.')
+
+        blocks = self._split(code, self.block_length)
+        shape = blocks.shape[:-1]
+        blocks = blocks.reshape(-1, self.block_length)
+        failed = np.zeros(len(blocks), dtype=bool)
+
+        # Number of leading zeros that shorten each codeword.
+        padding = np.zeros(shape, dtype=np.int64)
+        if last:
+            padding[..., -1] = self.block_length - last
+        padding = padding.reshape(-1)
+
+        syndromes = _xor_products(blocks, self._syndrome_table)
+        errors = np.flatnonzero(np.any(syndromes, axis=-1))
+        if len(errors):
+            corrected, failed[errors] = self._correct(
+                blocks[errors], syndromes[errors], padding[errors]
+            )
+            blocks[errors] = corrected
+
+        blocks = blocks.reshape(shape + (self.block_length,))
+        failed = failed.reshape(shape)
+        message = self._join(blocks[..., :self.num_data_bytes],
+                             max(last - self.num_parity, 0),
+                             self.num_data_bytes)
+        return message, failed
+
+    def encode_bits(self, message):
+        """Encode an array of bits (8 per byte, most significant first)."""
+        return np.unpackbits(self.encode(_pack_bytes(message)), axis=-1)
+
+    def decode_bits(self, code):
+        """Decode an array of bits; returns (message bits, failed)."""
+        message, failed = self.decode(_pack_bytes(code))
+        return np.unpackbits(message, axis=-1), failed
+
+    def _correct(self, blocks, syndromes, padding):
+        """Correct the codewords with errors; returns (blocks, failed)."""
+        num_blocks = len(blocks)
+
+        # Berlekamp-Massey, for every codeword at once. locator holds the
+        # error locator polynomial (lowest degree first), previous the last
+        # one before its degree changed (already times x**m).
+        size = self.num_parity + 1
+        locator = np.zeros((num_blocks, size), dtype=np.uint8)
+        locator[:, 0] = 1
+        previous = locator.copy()
+        degree = np.zeros(num_blocks, dtype=np.int64)
+        scale = np.ones(num_blocks, dtype=np.uint8)
+        for r in range(self.num_parity):
+            discrepancy = np.bitwise_xor.reduce(
+                _GF_MUL[locator[:, :r+1], syndromes[:, r::-1]], axis=-1
+            )
+            previous = np.concatenate(
+                (np.zeros((num_blocks, 1), dtype=np.uint8), previous[:, :-1]),
+                axis=1
+            )
+            factor = _GF_MUL[discrepancy, _GF_INV[scale]]
+            updated = locator ^ _GF_MUL[factor[:, np.newaxis], previous]
+
+            grow = (discrepancy != 0) & (2 * degree <= r)
+            previous[grow] = locator[grow]
+            degree[grow] = r + 1 - degree[grow]
+            scale[grow] = discrepancy[grow]
+            locator = updated
+
+        # Chien search: the errors are where the locator has a root. Only the
+        # coefficients up to the largest correctable degree can be nonzero.
+        terms = self.max_errors + 1
+        failed = (degree > self.max_errors) \
+            | np.any(locator[:, terms:], axis=-1)
+        locator = locator[:, :terms]
+        roots = _xor_products(locator, self._chien_table) == 0
+        failed |= np.count_nonzero(roots, axis=-1) != degree
+        # An error can't be in the zeros that shorten a codeword.
+        failed |= np.any(roots & (np.arange(self.block_length)
+                                  < padding[:, np.newaxis]), axis=-1)
+
+        # Forney: the error value at x = a**e is
+        # x * omega(1 / x) / locator'(1 / x), where omega is the syndrome
+        # polynomial times the locator, up to x**(num_parity - 1).
+        omega = np.bitwise_xor.reduce(
+            _GF_MUL[locator[:, np.newaxis, :],
+                    _shifted(syndromes, terms)], axis=-1
+        )
+        derivative = np.zeros_like(locator)
+        derivative[:, :-1:2] = locator[:, 1::2]
+
+        block_index, position = np.nonzero(roots & ~failed[:, np.newaxis])
+        powers = self._chien_powers[position]
+        numerator = np.bitwise_xor.reduce(
+            _GF_MUL[omega[block_index], powers], axis=-1
+        )
+        denominator = np.bitwise_xor.reduce(
+            _GF_MUL[derivative[block_index], powers[:, :terms]], axis=-1
+        )
+        values = _GF_MUL[_GF_MUL[self._error_positions[position], numerator],
+                         _GF_INV[denominator]]
+
+        blocks = blocks.copy()
+        blocks[block_index, position] ^= values
+        return blocks, failed
+
+    def _split(self, symbols, length):
+        """
+        Split symbols into (..., num_blocks, length) blocks, with the last
+        one padded with leading zeros if it's short.
+        """
+        num_blocks = -(-symbols.shape[-1] // length)
+        padded = np.zeros(symbols.shape[:-1] + (num_blocks * length,),
+                          dtype=np.uint8)
+        padding = num_blocks * length - symbols.shape[-1]
+        if padding:
+            # The last block is shortened by leading zeros.
+            padded[..., :(num_blocks - 1) * length] = \
+                symbols[..., :(num_blocks - 1) * length]
+            padded[..., (num_blocks - 1) * length + padding:] = \
+                symbols[..., (num_blocks - 1) * length:]
+        else:
+            padded[...] = symbols
+        return padded.reshape(symbols.shape[:-1] + (num_blocks, length))
+
+    def _join(self, blocks, last, length):
+        """
+        Join (..., num_blocks, block) blocks back together, dropping the
+        padding from the last one (which held last of the original length
+        symbols, or all of them if last is 0).
+        """
+        if blocks.shape[-2] == 0:
+            return blocks.reshape(blocks.shape[:-2] + (0,))
+        padding = (length - last) % length
+        joined = blocks.reshape(blocks.shape[:-2]
+                                + (blocks.shape[-2] * blocks.shape[-1],))
+        if not padding:
+            return joined
+        start = (blocks.shape[-2] - 1) * blocks.shape[-1]
+        return np.concatenate(
+            (joined[..., :start], joined[..., start + padding:]), axis=-1
+        )
+
+    def _symbols(self, symbols):
+        """Check the bytes and return them as a uint8 array."""
+        symbols = np.asarray(symbols)
+        if symbols.ndim == 0:
+            raise ValueError('The input must have bytes along its last axis.')
+        if np.any((symbols < 0) | (symbols > 255)):
+            raise ValueError('Symbol values must be from 0 to 255.')
+        return symbols.astype(np.uint8, copy=False)
+
+
+@lru_cache(maxsize=None)
+def reed_solomon_code(num_parity=32, block_length=255):
+    """Return the shared ReedSolomonCode with the given parameters."""
+    return ReedSolomonCode(num_parity, block_length)
+
+
+def _product_table(matrix):
+    """
+    Products of every byte with each row of a (n, m) matrix of bytes.
+
+    Returns a (n, 256, words) array holding, at [i, c], the row c * matrix[i]
+    packed into 64-bit words, and m.
+    """
+    num_rows, num_cols = matrix.shape
+    table = np.zeros((num_rows, 256, -(-num_cols // 8) * 8), dtype=np.uint8)
+    table[..., :num_cols] = _GF_MUL[:, matrix].transpose(1, 0, 2)
+    table = table.view(np.uint64)
+    table.setflags(write=False)
+    return table, num_cols
+
+
+def _xor_products(left, table):
+    """
+    GF(256) matrix product of (..., n) bytes and a (n, m) matrix, given as
+    its _product_table.
+
+    The product rows for every byte are looked up a block of rows at a time
+    and XORed over n, 8 bytes at a time.
+    """
+    words, num_cols = table
+    rows = left.reshape(-1, left.shape[-1])
+    positions = np.arange(rows.shape[1])
+    product = np.empty((len(rows), words.shape[-1]), dtype=np.uint64)
+    block_rows = max(1, RS_BLOCK_SIZE // max(rows.shape[1] * words.shape[-1],
+                                             1))
+    for start in range(0, len(rows), block_rows):
+        product[start:start+block_rows] = np.bitwise_xor.reduce(
+            words[positions, rows[start:start+block_rows]], axis=1
+        )
+    return product.view(np.uint8)[:, :num_cols].reshape(
+        left.shape[:-1] + (num_cols,)
+    )
+
+
+def _shifted(syndromes, terms):
+    """
+    (rows, num_parity, terms) array of syndromes[k - i] (0 where k < i), so
+    that omega_k is the XOR over i of locator_i times it.
+    """
+    num_parity = syndromes.shape[1]
+    k = np.arange(num_parity)[:, np.newaxis] - np.arange(terms)
+    padded = np.concatenate(
+        (syndromes, np.zeros((len(syndromes), 1), dtype=np.uint8)), axis=1
+    )
+    return padded[:, np.where(k >= 0, k, num_parity)]
+
+
+def _pack_bytes(bits):
+    """Pack bits (along the last axis, a multiple of 8) into bytes."""
+    bits = np.asarray(bits)
+    if bits.ndim == 0 or bits.shape[-1] % 8 != 0:
+        raise ValueError('The number of bits must be a multiple of 8.')
+    if np.any((bits != 0) & (bits != 1)):
+        raise ValueError('Bit values must be 0 or 1.')
+    return np.packbits(bits.astype(np.uint8, copy=False), axis=-1)
+
+
+# Code testing region.
+if __name__ == '__main__':
+    import time
+
+    # Packets of 4kB, each hit by byte errors in bursts (fades), with one
+    # packet per row.
+    rng = np.random.default_rng(0)
+    num_packets = 100
+    packet_bytes = 4096
+    rs = reed_solomon_code(32)
+
+    packets = rng.integers(0, 256, size=(num_packets, packet_bytes),
+                           dtype=np.uint8)
+    start = time.perf_counter()
+    codes = rs.encode(packets)
+    encode_time = time.perf_counter() - start
+
+    # Up to 16 wrong bytes per codeword can be fixed. Each packet gets bursts
+    # of 12 bytes (96 bits), one per codeword.
+    received = codes.copy()
+    num_codewords = -(-packet_bytes // rs.num_data_bytes)
+    for codeword in range(num_codewords):
+        length = min(255, codes.shape[1] - 255 * codeword)
+        offset = 255 * codeword + rng.integers(0, length - 12,
+                                               size=num_packets)
+        burst = offset[:, np.newaxis] + np.arange(12)
+        np.put_along_axis(received, burst, rng.integers(
+            1, 256, size=burst.shape, dtype=np.uint8
+        ) ^ np.take_along_axis(received, burst, -1), -1)
+
+    start = time.perf_counter()
+    decoded, failed = rs.decode(received)
+    decode_time = time.perf_counter() - start
+
+    print(f'{num_packets} packets of {packet_bytes} bytes:'
+          f' encoded in {encode_time:.3f}s, decoded in {decode_time:.3f}s')
+    assert np.array_equal(decoded, packets) and not np.any(failed), \
+        'WRONG. YOUR CODE IS WRONG. SAD.'
+
+    # The string interface gives the same results.
+    message = bits_to_string(np.unpackbits(packets[0, :100]))
+    assert reed_solomon_decoder(reed_solomon_encoder(message)) == message, \
+        'WRONG. YOUR CODE IS WRONG. SAD.'
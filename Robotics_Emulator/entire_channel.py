@@ -11,9 +11,10 @@ them into one file.
 import numpy as np
 import matplotlib.pyplot as plt
 from wave_channel import channel
-from transmit import transmit
+from transmit import transmit, transmit_batch
 from phase_shift_checker import fourier_phase_shift_checker, phase_to_bit
 from testFrequencyDemodulation import decodeFrequencyModulation
+from symbol_slicer import differential_decode, frequency_slicer
 
 '''
 IMPORTANT NOTE: ALL UNITS ARE IN SI STANDARD UNITS. Thus, speed is in m/s,
@@ -22,17 +23,10 @@ frequency is in Hz, positions in m, etc.
 # Speed of sound in water
 SPEED_OF_SOUND = 1480
 
+#Works along the last axis, so a 2D array of bitstreams (one per row) can be
+#demodulated in one call
 def manual_demodulate(bitstream, quad=False):
-    if not quad:
-        correct_bitstream = []
-        for i in range(1, len(bitstream)):
-            correct_bitstream.append(0 if bitstream[i] == bitstream[i - 1] else 1)
-        return np.array(correct_bitstream)
-    else:
-        correct_bitstream = []
-        for i in range(1, len(bitstream)):
-            correct_bitstream.append((bitstream[i] - bitstream[i - 1]) % 4)
-        return np.array(correct_bitstream)
+    return differential_decode(bitstream, 4 if quad else 2)
             
 
 # Code testing region.
@@ -118,11 +112,54 @@ def psk_test():
     #Set the x axis (Time) limits if desired
     #fig.axes[0].set_xlim(0.2, 0.2001)
     
+def psk_batch_test(num_trials=100, num_bits=100):
+    #Same setup as psk_test, but every trial is sent through the channel and
+    #demodulated at once, one trial per row
+    transmitter_position_initial = np.array([0, 0])
+    receiver_position_initial = np.array([SPEED_OF_SOUND/10, 0])
+    receiver_orientation_initial = np.array([0, -1])
+    transmitter_velocity = np.array([1.5, 0])
+    receiver_velocity = np.array([-1.5, 0])
+    receiver_spacing = 0.02
+    
+    #Noise for transmission channel
+    noise_variance = 0.03
+    
+    #Generate one random bitstream per trial
+    bitstreams = np.random.randint(0, 2, size=(num_trials, num_bits),
+                                   dtype=np.uint8)
+    correct_bitstreams = manual_demodulate(bitstreams)
+    
+    #Make all the waveforms at once (one per row)
+    bit_rate = 1000
+    frequency = 30000
+    times, waveforms = transmit_batch(bitstreams, bit_rate,
+                                      modulation_type='PSK', PSK_phase=180,
+                                      frequency=frequency)
+    
+    #Send every waveform through the noise channel
+    output_times, output_waveforms = channel(times, waveforms,
+    transmitter_position_initial, receiver_position_initial,
+    receiver_orientation_initial, receiver_spacing, transmitter_velocity, 
+    receiver_velocity, noise_variance, SPEED_OF_SOUND)
+    
+    #Demodulate each output (0: center, 1: front left, 2: back left, 
+    #3: back right, 4: front right), all trials at once
+    time_int = 1/bit_rate
+    bit_error_rates = [None] * 5
+    for i in range(5):
+        received_bits = phase_to_bit(fourier_phase_shift_checker(
+            output_times[i], output_waveforms[i], time_int, frequency))
+        num_received = min(received_bits.shape[-1], correct_bitstreams.shape[-1])
+        errors = np.logical_xor(received_bits[:, :num_received],
+                                correct_bitstreams[:, :num_received])
+        bit_error_rates[i] = np.mean(errors)
+    
+    print("Bit error rates of output waveforms")
+    print(bit_error_rates)
+    
 def f2phase(f_list, f1, f2):
-    a = np.zeros(len(f_list))
-    for i in range(len(f_list)):
-        a[i] = 0 if np.abs(f_list[i] - f1) < np.abs(f_list[i] - f2) else 1
-    return a
+    return frequency_slicer(f_list, (f1, f2)).astype(float)
     
 def fsk_test():
     # Set initial sub positions and velocities
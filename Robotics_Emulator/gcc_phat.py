@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a wideband direction finder based on time differences of
+arrival (TDOA) between hydrophones, measured with the generalized
+cross-correlation with phase transform (GCC-PHAT).
+
+find_origin in signal_angle_detect.py works from the phase differences of a
+single tone, which are ambiguous once the hydrophones are more than half a
+wavelength apart, and which ignore every other frequency in a chirp or an
+FSK packet. GCC-PHAT instead cross-correlates each pair of hydrophones with
+every frequency weighted equally (the cross-spectrum is divided by its
+magnitude, leaving only its phase), which gives a sharp peak at the time
+difference of arrival for any wideband signal. The peak is refined to a
+fraction of a sample by fitting a parabola through it and its neighbours.
+
+A plane wave arriving from the unit direction u reaches the hydrophone at r
+after a delay u . r / c (the convention of plane_wave.py), so the time
+difference between hydrophones i and j is u . (r_i - r_j) / c. With every
+pair of hydrophones this is an overdetermined linear system for u, which is
+solved by least squares; the z component of a planar array is then found
+from |u| = 1.
+
+Everything is vectorized over pings. The FFT length, the hydrophone pairs
+and the least-squares solver depend only on the signal length and array
+geometry, so they are cached and reused from ping to ping (numpy's FFT has
+no plans to cache).
+
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from plane_wave import SPEED_OF_SOUND, square_array
+
+
+def gcc_phat(signals, fs, max_delay=None, band=None, floor=0.1):
+    """
+    Estimate the time difference of arrival between every pair of channels.
+
+    Parameters
+    ----------
+    signals : array_like
+        Signals received at each hydrophone, of shape
+        (..., n_phones, n_samples), all sampled at the same times.
+
+    fs : float
+        Sample rate in Hz.
+
+    max_delay : float, optional
+        Largest time difference to search for in s (e.g. the spacing divided
+        by the speed of sound). The default is None, which searches every
+        lag.
+
+    band : (float, float), optional
+        Lowest and highest frequency in Hz of the signal (e.g. the FSK tones
+        or the chirp sweep). Frequencies outside the band, which only hold
+        noise, are left out. The default is None, which uses every
+        frequency.
+
+    floor : float, optional
+        Smallest cross-spectrum magnitude divided by, as a fraction of the
+        largest. This stops near-empty frequencies (which only hold noise
+        and rounding error) being scaled up as much as the signal. The
+        default is 0.1.
+
+    Returns
+    -------
+    delays : numpy array
+        Time difference of arrival in s for each pair of hydrophones (i, j)
+        with i < j, in the order of np.triu_indices, of shape
+        (..., n_pairs). A positive delay means the signal reached i after j.
+
+    """
+    signals = np.asarray(signals, dtype=float)
+    num_samples = signals.shape[-1]
+    if signals.ndim < 2 or num_samples < 1:
+        raise ValueError('The signals must have shape (..., n_phones,'
+                         ' n_samples).')
+
+    first, second = _pairs(signals.shape[-2])
+
+    # Zero pad to at least twice the length, so that the circular
+    # correlation doesn't wrap around.
+    num_fft = _fft_size(2 * num_samples)
+    spectra = np.fft.rfft(signals, num_fft, axis=-1)
+    if band is not None:
+        spectra = spectra[..., _band_bins(num_fft, fs, tuple(band))]
+
+    # Phase transform: keep only the phase of each cross-spectrum.
+    cross = spectra[..., first, :] * np.conj(spectra[..., second, :])
+    magnitude = np.abs(cross)
+    cross /= np.maximum(magnitude, np.maximum(
+        floor * np.max(magnitude, axis=-1, keepdims=True), 1e-300
+    ))
+    if band is not None:
+        cross = _unband(cross, num_fft, fs, tuple(band))
+    correlation = np.fft.irfft(cross, num_fft, axis=-1)
+
+    # Lags from -max_lag to max_lag, in order.
+    max_lag = num_samples - 1
+    if max_delay is not None:
+        max_lag = min(max_lag, int(np.ceil(max_delay * fs)) + 1)
+    correlation = np.concatenate(
+        (correlation[..., num_fft - max_lag:], correlation[..., :max_lag + 1]),
+        axis=-1
+    )
+
+    return (_peak_position(correlation) - max_lag) / fs
+
+
+def gcc_phat_doa(signals, fs, positions=None, wave_speed=SPEED_OF_SOUND,
+                 max_delay=None, band=None, floor=0.1):
+    """
+    Find the direction of origin of pings from their time differences.
+
+    Parameters
+    ----------
+    signals : array_like
+        Signals received at each hydrophone, of shape
+        (..., n_phones, n_samples), all sampled at the same times.
+
+    fs : float
+        Sample rate in Hz.
+
+    positions : array_like, optional
+        Position of each hydrophone, of shape (n_phones, 2) for a planar
+        array or (n_phones, 3). The default is square_array().
+
+    wave_speed : float, optional
+        Speed of the wave in m/s. The default is SPEED_OF_SOUND.
+
+    max_delay : float, optional
+        Largest time difference to search for in s. The default is the
+        largest distance between two hydrophones divided by wave_speed.
+
+    band, floor : optional
+        Passed on to gcc_phat.
+
+    Returns
+    -------
+    doa : numpy array
+        Unit direction of origin (x, y, z) of each ping, of shape (..., 3).
+        For a planar array z is taken as non-negative.
+
+    """
+    if positions is None:
+        positions = square_array()
+    positions = np.asarray(positions, dtype=float)
+    if positions.ndim != 2 or positions.shape[1] not in (2, 3):
+        raise ValueError('The hydrophone positions must have shape'
+                         ' (n_phones, 2) or (n_phones, 3).')
+
+    solver, max_distance = _direction_solver(
+        tuple(map(tuple, positions)), wave_speed
+    )
+    if max_delay is None:
+        max_delay = max_distance / wave_speed
+
+    direction = gcc_phat(signals, fs, max_delay, band, floor) @ solver.T
+
+    if positions.shape[1] == 3:
+        return direction / np.maximum(
+            np.linalg.norm(direction, axis=-1, keepdims=True), 1e-300
+        )
+
+    # Planar array: the in-plane components can come out longer than 1 from
+    # noise, in which case they are scaled back and z is 0.
+    norm = np.linalg.norm(direction, axis=-1, keepdims=True)
+    direction = direction / np.maximum(norm, 1)
+    v_z = np.sqrt(np.maximum(1 - np.sum(direction**2, axis=-1), 0))
+    return np.concatenate((direction, v_z[..., np.newaxis]), axis=-1)
+
+
+def _peak_position(correlation):
+    """Fractional index of the peak along the last axis (parabolic fit)."""
+    peak = np.argmax(correlation, axis=-1)[..., np.newaxis]
+    if correlation.shape[-1] < 3:
+        return peak[..., 0].astype(float)
+
+    # Fit through the peak and its neighbours (shifted in from the ends).
+    centre = np.clip(peak, 1, correlation.shape[-1] - 2)
+    before, middle, after = (
+        np.take_along_axis(correlation, centre + k, axis=-1)[..., 0]
+        for k in (-1, 0, 1)
+    )
+    curvature = before - 2 * middle + after
+    offset = np.divide(0.5 * (before - after), curvature,
+                       out=np.zeros_like(curvature), where=curvature < 0)
+    return centre[..., 0] + np.clip(offset, -1, 1)
+
+
+@lru_cache(maxsize=None)
+def _fft_size(minimum):
+    """Smallest 5-smooth number (2**a * 3**b * 5**c) at least minimum."""
+    best = 2**int(np.ceil(np.log2(max(minimum, 1))))
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            size = power35
+            while size < minimum:
+                size *= 2
+            best = min(best, size)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+@lru_cache(maxsize=None)
+def _band_bins(num_fft, fs, band):
+    """Slice of the rfft bins from band[0] to band[1] Hz."""
+    resolution = fs / num_fft
+    return slice(max(int(np.ceil(band[0] / resolution)), 0),
+                 min(int(np.floor(band[1] / resolution)), num_fft // 2) + 1)
+
+
+def _unband(cross, num_fft, fs, band):
+    """Put in-band cross-spectra back among zeros at the other bins."""
+    full = np.zeros(cross.shape[:-1] + (num_fft // 2 + 1,), dtype=cross.dtype)
+    full[..., _band_bins(num_fft, fs, band)] = cross
+    return full
+
+
+@lru_cache(maxsize=None)
+def _pairs(num_phones):
+    """Indices (i, j) of every pair of hydrophones with i < j."""
+    if num_phones < 2:
+        raise ValueError('At least two hydrophones are needed.')
+    return np.triu_indices(num_phones, 1)
+
+
+@lru_cache(maxsize=None)
+def _direction_solver(positions, wave_speed):
+    """
+    Least-squares solver from pair delays to direction, for one geometry.
+
+    Returns the pseudo-inverse of the (n_pairs, n_dims) matrix of position
+    differences divided by wave_speed, and the largest distance between two
+    hydrophones.
+    """
+    positions = np.array(positions)
+    first, second = _pairs(len(positions))
+    baselines = positions[first] - positions[second]
+    if np.linalg.matrix_rank(baselines) < positions.shape[1]:
+        raise ValueError('The hydrophones must not all lie on a line (or a'
+                         ' plane, for 3D positions).')
+    return (np.linalg.pinv(baselines / wave_speed),
+            np.max(np.linalg.norm(baselines, axis=-1)))
+
+
+# Code testing region.
+if __name__ == '__main__':
+    # Linear chirps from 20kHz to 40kHz, on hydrophones 5cm apart (more than
+    # a wavelength at the top of the band), sampled at the ADC rate.
+    fs = 111000
+    spacing = 0.05
+    rng = np.random.default_rng(0)
+    num_pings = 1000
+    doa = rng.normal(size=(num_pings, 3))
+    doa[:, 2] = np.abs(doa[:, 2])
+    doa /= np.linalg.norm(doa, axis=-1, keepdims=True)
+
+    duration = 0.004
+    times = np.arange(int(duration * fs)) / fs
+    delays = doa[:, :2] @ square_array(spacing).T / SPEED_OF_SOUND
+    elapsed = times - delays[..., np.newaxis]
+    chirp = np.sin(2 * np.pi * (20000 * elapsed
+                                + 20000 / (2 * duration) * elapsed**2))
+    signals = np.where(elapsed >= 0, chirp, 0) \
+        + rng.normal(scale=0.1, size=elapsed.shape)
+
+    found = gcc_phat_doa(signals, fs, square_array(spacing),
+                         band=(20000, 40000))
+    errors = np.degrees(np.arccos(np.clip(np.sum(found * doa, axis=-1),
+                                          -1, 1)))
+    print(f'chirps: median error {np.median(errors):.2f} degrees')
+
@@ -36,6 +36,7 @@ Considerations:
 import numpy as np
 import matplotlib.pyplot as plt
 from wave_gen import wave_gen
+from wave_channel import single_channel
 
 
 # Speed of sound in water
@@ -118,39 +119,11 @@ def emulate(wave_speed, frequency, transmitter_pos_init, receiver_pos_init,
         num_pts=n_points
     )
 
-    # Velocity of the transmitter relative to the receiver.
-    relative_velocity = transmitter_velocity - receiver_velocity
-
-    # Initial position of the transmitter relative to the receiver.
-    relative_pos_init = transmitter_pos_init - receiver_pos_init
-
-    # Relative position of the transmitter every time it makes a ping.
-    relative_positions = np.array([
-        relative_pos_init + time * relative_velocity for time in times
-    ])
-
-    # Distance the wave travels for each sample.
-    travel_distances = np.linalg.norm(relative_positions, axis=1)
-
-    # The velocity of the ping obtained by the receiver in the 'rest' frame
-    # of the medium (water in our case) is given by the speed of the wave
-    # in the medium multiplied by the unit vector pointing from the transmitter
-    # to the receiver.
-    wave_velocities = np.array([
-        -wave_speed * relative_position / np.linalg.norm(relative_position)
-        for relative_position in relative_positions
-    ])
-
-    # The speed of the ping obtained in the receiver's rest frame.
-    relative_wave_speeds = \
-        np.linalg.norm(wave_velocities - receiver_velocity, axis=1)
-
-    # The time at which each point is received is given by the distance
-    # travelled divided by the wave speed relative to the receiver.
-    received_times = times + travel_distances / relative_wave_speeds
-
-    # Calculate the magnitude of the pings at the received sub.
-    output_waveform = input_waveform / travel_distances
+    # Propagate the waveform to the receiver (see wave_channel).
+    received_times, output_waveform = single_channel(
+        times, input_waveform, transmitter_pos_init, receiver_pos_init,
+        transmitter_velocity, receiver_velocity, wave_speed
+    )
 
     return ((times, input_waveform), (received_times, output_waveform))
 
@@ -128,8 +128,7 @@ def simulate(c, freq, sub_position_1, sub_position_2, sub_velocity_1, \
     sub1_init_pos = sub_position_1 - sub_position_2
 
     # Relative positions of sub 1 every time it makes a ping.
-    sub1_poses = np.array([sub1_init_pos + times[i]*sub1_rel_velo \
-                           for i in range(len(times))])
+    sub1_poses = sub1_init_pos + times[:, np.newaxis]*sub1_rel_velo
 
     # Calculate the distance the wave travels for each sample; axis=1 lets us
     # calculate the distance for each sample.
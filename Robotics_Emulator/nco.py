@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a numerically controlled oscillator (NCO) for the waveform
+generators, as an alternative to calling np.sin on absolute times.
+
+The oscillator keeps its phase in a 64-bit fixed-point accumulator (like the
+phase register of a DDS chip), so the phase of sample n is exact modulo one
+cycle no matter how large n gets. Samples are produced in blocks: the
+accumulator seeds the sine and cosine of the first sample of each block, and
+the rest of the block is obtained by rotating that seed through a small
+precomputed table (sin(a + b) = sin(a)cos(b) + cos(a)sin(b)). Re-seeding
+every block is the periodic renormalization that stops rounding error from
+building up, and it means only about two transcendentals are evaluated per
+block instead of one per sample.
+
+"""
+
+import numpy as np
+
+# Available oscillator backends for the waveform generators.
+OSCILLATORS = ('sin', 'nco')
+
+# Number of fixed-point phase steps in one cycle.
+_CYCLE = 2.0**64
+
+
+def check_oscillator(oscillator):
+    """Raise a ValueError if oscillator is not an available backend."""
+    if oscillator not in OSCILLATORS:
+        raise ValueError("Invalid oscillator. Available options are 'sin'"
+                         " and 'nco'.")
+
+
+def nco_sin(phase_offset, phase_step, lengths, start_index=0,
+            block_size=None):
+    """
+    Generate runs of sinusoid samples with a numerically controlled oscillator.
+
+    Run r has lengths[r] samples, the k-th of which is
+    sin(2 * pi * (phase_offset[r] + (start_index[r] + k) * phase_step[r])).
+    The runs are returned one after another in a single array.
+
+    Parameters
+    ----------
+    phase_offset : float or 1D array_like
+        Phase of each run at sample index zero, in cycles.
+
+    phase_step : float or 1D array_like
+        Phase advance per sample of each run, in cycles (i.e. the frequency
+        divided by the sample rate).
+
+    lengths : int or 1D array_like of int
+        Number of samples in each run.
+
+    start_index : int or 1D array_like of int, optional
+        Sample index of the first sample in each run. The default is 0.
+
+    block_size : positive int, optional
+        Number of samples generated from each seed. The default is about the
+        square root of the typical run length, which minimizes the number of
+        transcendentals evaluated.
+
+    Returns
+    -------
+    samples : 1D numpy array
+        The samples of every run, concatenated in order.
+
+    """
+    phase_offset, phase_step, lengths, start_index = np.broadcast_arrays(
+        np.atleast_1d(phase_offset), np.atleast_1d(phase_step),
+        np.atleast_1d(np.asarray(lengths, dtype=np.int64)),
+        np.atleast_1d(np.asarray(start_index, dtype=np.int64))
+    )
+    lengths = np.maximum(lengths, 0)
+
+    if block_size is None:
+        typical_length = np.mean(lengths) if len(lengths) else 1
+        block_size = max(8, int(np.ceil(np.sqrt(typical_length))))
+
+    # Split every run into blocks; each block is seeded separately.
+    blocks_per_run = -(-lengths // block_size)
+    block_run = np.repeat(np.arange(len(lengths)), blocks_per_run)
+    block_first = np.arange(len(block_run)) - np.repeat(
+        np.cumsum(blocks_per_run) - blocks_per_run, blocks_per_run
+    )
+    block_index = start_index[block_run] + block_first * block_size
+
+    # Seed phases from the fixed-point accumulator. Unsigned integer
+    # arithmetic wraps around modulo 2**64, i.e. modulo one cycle.
+    step_fixed = _to_fixed(phase_step)
+    seed_fixed = (_to_fixed(phase_offset)[block_run]
+                  + step_fixed[block_run]
+                  * block_index.astype(np.uint64))
+    seed_angle = _to_radians(seed_fixed)
+
+    # Rotation table for every distinct phase step in use.
+    unique_steps, step_table = np.unique(step_fixed, return_inverse=True)
+    table_angle = _to_radians(
+        unique_steps[:, np.newaxis]
+        * np.arange(block_size, dtype=np.uint64)
+    )
+    table_row = step_table.reshape(-1)[block_run]
+
+    # Rotate each seed through its table.
+    samples = np.sin(seed_angle)[:, np.newaxis] \
+        * np.cos(table_angle)[table_row]
+    samples += np.cos(seed_angle)[:, np.newaxis] \
+        * np.sin(table_angle)[table_row]
+
+    # Trim the unused tail of the last block of each run.
+    if np.all(lengths % block_size == 0):
+        return samples.reshape(-1)
+    valid = np.arange(block_size) < (
+        lengths[block_run] - block_first * block_size
+    )[:, np.newaxis]
+    return samples[valid]
+
+
+def segment_step(times):
+    """
+    Return the spacing of an evenly spaced array of times (0 if it has fewer
+    than two), for the phase step of nco_sin.
+    """
+    if len(times) < 2:
+        return 0
+    return (times[-1] - times[0]) / (len(times) - 1)
+
+
+def _to_fixed(cycles):
+    """Convert phases in cycles to 64-bit fixed point (modulo one cycle)."""
+    fixed = (np.asarray(cycles, dtype=float) % 1.0) * _CYCLE
+    # Phases a hair below a whole cycle can round up to exactly one cycle.
+    fixed[fixed >= _CYCLE] = 0
+    return fixed.astype(np.uint64)
+
+
+def _to_radians(fixed):
+    """Convert 64-bit fixed-point phases to angles in radians."""
+    return fixed.astype(float) * (2 * np.pi / _CYCLE)
@@ -10,6 +10,7 @@ This is a function to add noise to the waveforms.
 import numpy as np
 import matplotlib.pyplot as plt
 from main_test_1 import simulate
+from wave_signal import Signal
 
 '''
 IMPORTANT NOTE: ALL UNITS ARE IN SI STANDARD UNITS. Thus, speed is in m/s,
@@ -18,13 +19,30 @@ frequency is in Hz, positions in m, etc.
 # Speed of sound in water
 speed_of_sound = 1480
 
-#Function to add noise to an input waveform
+#Function to add noise to an input waveform. If times is a Signal, input_wave
+#is ignored and a noisy Signal is returned.
 def noise(times,input_wave,noise):
+    
+    if isinstance(times, Signal):
+        output_samples = times.samples + np.random.normal(
+            0, noise, size=times.samples.shape)
+        return Signal(output_samples, times.sample_rate, times.start_time)
 
     output_waveform = input_wave + np.random.normal(0,noise,size=len(input_wave))
     
     return (times,output_waveform)
 
+#Streaming version of noise. Adds noise to each block (a Signal or a 
+#(times, waveform) tuple) as it arrives, so memory use does not grow with the 
+#length of the transmission.
+def noise_blocks(input_blocks,noise_level):
+    
+    for block in input_blocks:
+        if isinstance(block, Signal):
+            yield noise(block,None,noise_level)
+        else:
+            yield noise(block[0],block[1],noise_level)
+
 # Code testing region.
 if __name__ == '__main__':
 
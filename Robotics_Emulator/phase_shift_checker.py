@@ -8,6 +8,8 @@ Created on Tue May 12 18:57:06 2020
 
 import numpy as np
 import wave_gen as wg
+from symbol_slicer import phase_slicer
+from wave_signal import unpack_wave
 
 
 
@@ -21,7 +23,8 @@ def phase_shift_checker(times, waveform, time_int, freq, error = .1, amp = 1):
     
     Parameters
     --------- 
-    times: 1D nympy array of times
+    times: 1D nympy array of times, or a Signal (in which case waveform is 
+        ignored)
     
     waveform: The waveform to be checked, as a 1D numpy array
     
@@ -49,8 +52,7 @@ def phase_shift_checker(times, waveform, time_int, freq, error = .1, amp = 1):
     # Finding the phase based on the peaks
     bits = []
     
-    waveform = np.array(waveform)
-    times = np.array(times)
+    times, waveform = unpack_wave(times, waveform)
     
     period = 1/freq
     # periods in a time interval
@@ -113,10 +115,15 @@ def fourier_phase_shift_checker(times, waveform, delT, freq):
 
     Parameters
     ----------
-    times : TYPE 1D numpy array
-        array of times of each measurement of the wave
-    waveform : TYPE 1D numpy array
-        array of values for each point in the wave
+    times : TYPE numpy array or Signal
+        array of times of each measurement of the wave. If a Signal is given,
+        waveform is ignored. A 2D array (e.g. the output times of channel,
+        one row per hydrophone) is also accepted, in which case each row
+        goes with the matching row of waveform
+    waveform : TYPE numpy array
+        array of values for each point in the wave. A 2D array (one wave per
+        row, either sharing the same times or each with its own row of
+        times) is also accepted
     delT : TYPE float
         time interval between each bit change
     freq : TYPE float
@@ -125,113 +132,147 @@ def fourier_phase_shift_checker(times, waveform, delT, freq):
     Returns
     -------
     phase_diffs - 1D numpy array of the phase shifts of each bit relative to
-    previous bit
+    previous bit (with one row per wave if waveform is 2D; if the waves
+    span different numbers of bits, they are all cut to the shortest)
 
     '''
     
-    waveform = np.array(waveform) # make it a np array in case it isn't already
-    times = np.array(times)
+    # make them np arrays in case they aren't already (or unpack a Signal)
+    times, waveform = unpack_wave(times, waveform)
     
     # adjust times array to start at t=0
-    times = times - times[0]
+    times = times - times[..., :1]
     
     # define omega
     omega = 2 * np.pi * freq
     
-    phases = [] # will hold the phase of the wave at each interval
-   
-    phase_diffs = [] # will hold the difference of the phase at one interval
-    # from the phase of the wave in the previous time interval
-    # it's DIFFERENT from phases (haha)
-    
-    # Each bit has a width of delT. The first bit runs from t = 0 to t = delT
-    # we set currentTime to the middle of the bit we are measuring
-    # thanks to our excellent foresight, we've adjusted everything to t = 0
-    currentTime = delT/2 # thus, this starts us at the middle of the first bit.
-    
     # Fourier phase detection requires measurement over an interval
     # delTPrime measures the "radius" outward from the center of that interval
     # The Fourier interval ranges from t = currentTime - delTPrime
-    # to t = currentTime + delTPrime
-    # so if delTPrime = delT/4, the first bit interval would run from 
-    # delT/4 to 3*delT/4, and the interval in the next bit would run from
-    # (delT + delT/4) to (delT + 3*delT/4) because the length of a bit is delT
-    # delTPrime must remain less than delT/2.
+    # to t = currentTime + delTPrime, where currentTime is the middle of
+    # each bit. delTPrime must remain less than delT/2.
     delTPrime = 2 * delT/8 
     
-    bit = 0 # keep track of which bit we're on
-    
-    # Trimming the arrays to keep only the relevant data to integrate over
-    # for our measurement interval is a real pain, so I use this index value
-    # to help mark off intervals.
-    # Here, I want to set the index value to indicate the index (in the times
-    # array) of the first element that WILL be included in the very first
-    # Fourier measurement interval (beginning @ t = 0). The value in brackets
-    # ("times < currentTime - delTPrime") is true for all elements that 
-    # PRECEDE the first element to be included in measurement. ".size" counts
-    # how many such elements are in the times array, and that number will be 
-    # the index of the next element - the first one that is IN the measurement
-    # interval. 
-    index = times[times < currentTime - delTPrime].size
-    
-    # The value in the bracket ("times > currentTime + delTPrime") is true 
-    # for any values lying above the upper bound of the current measurement 
-    # interval. Thus, if .size here is nonzero, more values exist beyond the 
-    # top of the current interval, and enough values exist to take a full 
-    # interval measurement. If .size is zero, not enough values exist for a 
-    # full Fourier interval to be taken, and the while loop ends.
-    while times[times > currentTime + delTPrime].size > 0:
-        # We trim off any time values below the lower bound of the measurement 
-        # interval - any lying more than delTPrime below currentTime
-        # (where currentTime is the middle of the bit)
-        measureTimes = times[times >= currentTime - delTPrime]
-        
-        # We then trim off any time values that are more than one bit-length
-        # ABOVE the lower bound of our Fourier interval. measureTimes now 
-        # spans from the beginning of this interval to what will become the 
-        # beginning of the next interval.
-        measureTimes = measureTimes[measureTimes < currentTime - delTPrime + delT]
-        
-        # Given the span of measureTimes, we take its size. Now, we can use
-        # indexJump to move the current index from the beginning of this
-        # interval to the beginning of the next interval once we're done here.
-        indexJump = measureTimes.size
-        
-        # Now, we trim the top off of measureTimes again - now it contains
-        # only the time values that are inside our measurement interval.
-        measureTimes = measureTimes[measureTimes < currentTime + delTPrime]
+    # Find every measurement interval at once, then gather the times and
+    # wave values of all of them into (bits, samples) arrays so that the
+    # Fourier inner products of every bit are computed together.
+    measureTimes, measureWave, valid = gather_bit_windows(
+        times, waveform, delT, delTPrime)
+    
+    # With the appropriately trimmed intervals, we now
+    # sum to find kI and kQ for Fourier inner product
+    kI = np.sum(np.where(valid, measureWave * np.cos(omega * measureTimes),
+                         0), axis=-1)
+    kQ = np.sum(np.where(valid, measureWave * np.sin(omega * measureTimes),
+                         0), axis=-1)
+    
+    phases = np.arctan2(kQ, kI)
+    
+    # We don't calculate a phase difference for the first bit
+    # It's the baseline
+    phase_diffs = phases[..., 1:] - phases[..., :-1]
+    
+    # Negative to counteract the integrals that make it negative (??)
+    return -phase_diffs * 180 / np.pi
+    
 
-        # "index" is the index in times/waveform where our measurement begins
-        # Using index (as a start point) and the size of measureTimes
-        # (which now holds only the measurement interval), 
-        # we can trim measureWave from waveform so that it holds the waveform
-        # values that correspond to each of the time values in measureTimes.
-        # measureTimes and measureWave should now be the same length.
-        measureWave = np.take(waveform, range(index, index + measureTimes.size))
-        
-        # With the appropriately trimmed intervals, we now
-        # sum to find kI and kQ for Fourier inner product
-        kI = np.sum(measureWave * np.cos(omega * measureTimes))
-        kQ = np.sum(measureWave * np.sin(omega * measureTimes))
-        
-        phases.append(np.arctan2(kQ, kI))
-        
-        # We don't calculate a phase difference for the first bit
-        # It's the baseline
-        if (bit > 0):
-            phase_diffs.append(phases[bit] - phases[bit - 1])
+def _bit_windows(times, delT, delTPrime):
+    '''
+    Locate the Fourier measurement interval of every bit in a wave.
 
-        # Move index up to the beginning of the next relevant period
-        index += indexJump
-        
-        # Move currentTime up to the middle of the next relevant period
-        currentTime += delT
-        
-        # Move on to the next bit
-        bit += 1
-        
-    # Negative to counteract the integrals that make it negative (??)
-    return -np.array(phase_diffs) * 180 / np.pi
+    Each bit has a width of delT, and is measured over the samples from
+    delTPrime before to delTPrime after its middle. Bits are measured for as
+    long as there are samples beyond the end of the interval.
+
+    Parameters
+    ----------
+    times : TYPE 1D numpy array
+        increasing times of each sample, starting at t = 0
+    delT : TYPE float
+        time interval between each bit change
+    delTPrime : TYPE float
+        half-width of the measurement interval
+
+    Returns
+    -------
+    timeStarts - 1D numpy array of the index in times of the first sample
+    in each interval
+    waveStarts - 1D numpy array of the index in the waveform of the first
+    sample in each interval. This is kept separately from timeStarts
+    because the original loop found it by counting samples one bit at a
+    time, and so can differ from it by a sample on rounding
+    sizes - 1D numpy array of the number of samples in each interval
+
+    '''
+    if len(times) == 0:
+        return (np.zeros(0, dtype=int),) * 3
+    
+    # The middle of each bit, accumulated one bit at a time (enough of them
+    # to run past the last sample)
+    max_bits = int(np.ceil(max(times[-1], 0) / delT)) + 2
+    currentTimes = np.cumsum(np.concatenate(([delT/2],
+                                             np.full(max_bits - 1, delT))))
+    currentTimes = currentTimes[:np.count_nonzero(
+        times[-1] > currentTimes + delTPrime)]
+    
+    # Index of the first sample in each interval, and in the next bit
+    lower = currentTimes - delTPrime
+    timeStarts = np.searchsorted(times, lower, 'left')
+    indexJumps = np.searchsorted(times, lower + delT, 'left') - timeStarts
+    
+    # Number of samples in the interval (which never runs into the next bit)
+    sizes = np.minimum(
+        np.searchsorted(times, currentTimes + delTPrime, 'left') - timeStarts,
+        indexJumps)
+    
+    waveStarts = timeStarts[:1] + np.concatenate(
+        ([0], np.cumsum(indexJumps[:-1], dtype=int)))[:len(timeStarts)]
+    
+    return timeStarts, waveStarts, sizes
+
+
+def gather_bit_windows(times, waveform, delT, delTPrime):
+    '''
+    Gather the samples in the measurement interval of every bit.
+
+    times and waveform have time along the last axis, and their leading
+    axes broadcast together (so 1D times can be shared by a 2D waveform).
+    The intervals are found by _bit_windows for each row of times, and cut
+    to the number of bits of the shortest row.
+
+    Returns
+    -------
+    measureTimes, measureWave - numpy arrays of shape
+    (leading axes) + (bits, samples) holding the times and wave values in
+    each interval, padded at the end to the longest interval
+    valid - boolean numpy array (broadcastable to the same shape) marking
+    the samples that are really in each interval
+
+    '''
+    leading = np.broadcast_shapes(times.shape[:-1], waveform.shape[:-1])
+    time_rows = times.reshape(-1, times.shape[-1])
+    windows = [_bit_windows(row, delT, delTPrime) for row in time_rows]
+    
+    num_bits = min(len(sizes) for _, _, sizes in windows)
+    timeStarts, waveStarts, sizes = (
+        np.stack([window[i][:num_bits] for window in windows])
+        .reshape(times.shape[:-1] + (num_bits,))
+        for i in range(3))
+    
+    num_samples = int(np.max(sizes, initial=0))
+    offsets = np.arange(num_samples)
+    valid = offsets < sizes[..., np.newaxis]
+    
+    def gather(values, starts):
+        index = np.minimum(starts[..., np.newaxis] + offsets,
+                           max(values.shape[-1] - 1, 0))
+        index = np.broadcast_to(index, leading + index.shape[-2:])
+        values = np.broadcast_to(values, leading + values.shape[-1:])
+        return np.take_along_axis(
+            values, index.reshape(leading + (-1,)), axis=-1
+        ).reshape(index.shape)
+    
+    return (gather(times, timeStarts), gather(waveform, waveStarts), valid)
     
 
 def phase_to_bit(phase_diffs, quad=False):
@@ -240,44 +281,20 @@ def phase_to_bit(phase_diffs, quad=False):
 
     Parameters
     ----------
-    phases : TYPE 1D numpy array
-        1D numpy array of phase shifts relative to previous bit
+    phases : TYPE numpy array
+        numpy array of phase shifts relative to previous bit, of any shape
+        (e.g. one row per message)
 
     Returns
-    bits : TYPE 1D numpy array of bits (1, 0)
+    bits : TYPE numpy array of bits (1, 0), the same shape as phase_diffs
     -------
     None.
 
     '''
     
-    bits = []
-    if not quad:
-        for diff in phase_diffs:
-            diff = diff % 360
-            if diff < 90:
-                bits.append(0)
-            elif diff < 270:
-                bits.append(1)
-            else:
-                bits.append(0)
-        
-        bits = np.array(bits)
-        
-        return bits
-    else:
-        for diff in phase_diffs:
-            diff = diff % 360
-            if diff < 45:
-                bits.append(0)
-            elif diff < 135:
-                bits.append(1)
-            elif diff < 225:
-                bits.append(2)
-            elif diff < 315:
-                bits.append(3)
-            else:
-                bits.append(0)
-        return np.array(bits)
+    # Shifts are rounded to the nearest of 0 and 180 degrees (or the nearest
+    # multiple of 90 degrees for quad)
+    return phase_slicer(phase_diffs, (0, 90, 180, 270) if quad else (0, 180))
 
 # testing
 if __name__ == '__main__':
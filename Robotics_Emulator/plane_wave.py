@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a lazy plane-wave source for testing direction of arrival
+(DOA) detectors.
+
+A far-away pinger reaches the hydrophone array as a plane wave: every
+hydrophone hears the same waveform, delayed by the time the wavefront takes
+to travel to it. For a wave arriving from the unit direction u, the
+hydrophone at position r hears the waveform at the reference point (the
+origin) delayed by
+
+    tau = u . r / c
+
+where c is the wave speed (the same convention as gen_doa_waveform in
+angle_detection_test.py). Rather than generating a long sampled waveform and
+shifting copies of it, PlaneWaveSource evaluates the ping analytically at
+whatever times a detector asks for, so only the requested windows are ever
+stored. A source can hold many directions at once, giving a
+(directions, hydrophones, samples) batch for signal_angle_detect_batch.
+
+"""
+
+import numpy as np
+
+from resample import ADC_SAMPLE_RATE
+from wave_signal import Signal
+
+# Known constants
+SPEED_OF_SOUND = 1480  # meters per second
+HYDROPHONE_SPACING = 0.01778  # meters (0.7in)
+
+
+def square_array(spacing=HYDROPHONE_SPACING):
+    """
+    Positions of four hydrophones on a square, numbered like quadrants.
+
+    Hydrophone 4 is at the origin, 3 is on the x axis, 1 on the y axis and 2
+    on the opposite corner (as in gen_doa_waveform).
+
+    Parameters
+    ----------
+    spacing : float, optional
+        Side length of the square in m. The default is HYDROPHONE_SPACING.
+
+    Returns
+    -------
+    positions : (4, 2) numpy array
+        x and y position of hydrophones 1 to 4, in order.
+
+    """
+    return np.array([[0, spacing], [spacing, spacing], [spacing, 0],
+                     [0, 0]], dtype=float)
+
+
+class PlaneWaveSource:
+    """
+    A sinusoidal ping arriving at a hydrophone array as a plane wave.
+
+    At the origin the ping is amplitude * sin(2 * pi * freq * (t - start_time)
+    + phase) for start_time <= t < start_time + duration, and zero outside.
+
+    Parameters
+    ----------
+    doa : array_like
+        Direction of arrival (x, y, z) of the ping, of shape (3,), or of
+        shape (..., 3) for many directions at once. The directions are
+        normalized, so their norms don't matter.
+
+    freq : float, optional
+        Frequency of the ping in Hz. The default is 30000.
+
+    positions : array_like, optional
+        Position of each hydrophone, of shape (n_phones, 2) or (n_phones, 3)
+        (missing z coordinates are taken as 0). The default is
+        square_array().
+
+    amplitude : float, optional
+        Amplitude of the ping. The default is 1.
+
+    phase : float, optional
+        Phase of the ping at start_time in degrees. The default is 0.
+
+    start_time : float, optional
+        Time at which the ping reaches the origin in s. The default is 0.
+
+    duration : float, optional
+        Length of the ping in s. The default is None, which never ends.
+
+    wave_speed : float, optional
+        Speed of the wave in m/s. The default is SPEED_OF_SOUND.
+
+    """
+
+    def __init__(self, doa, freq=30000, positions=None, amplitude=1, phase=0,
+                 start_time=0, duration=None, wave_speed=SPEED_OF_SOUND):
+        doa = np.asarray(doa, dtype=float)
+        if doa.shape[-1:] != (3,):
+            raise ValueError('The direction of arrival must have x, y and z'
+                             ' components along its last axis.')
+        norms = np.linalg.norm(doa, axis=-1, keepdims=True)
+        if np.any(norms == 0):
+            raise ValueError('The direction of arrival must be nonzero.')
+
+        if positions is None:
+            positions = square_array()
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim != 2 or positions.shape[1] not in (2, 3):
+            raise ValueError('The hydrophone positions must have shape'
+                             ' (n_phones, 2) or (n_phones, 3).')
+
+        self.doa = doa / norms
+        self.freq = freq
+        self.positions = positions
+        self.amplitude = amplitude
+        self.phase = phase
+        self.start_time = start_time
+        self.duration = duration
+        self.wave_speed = wave_speed
+
+    @property
+    def delays(self):
+        """Arrival delay at each hydrophone in s, of shape (..., n_phones)."""
+        return self.doa[..., :self.positions.shape[1]] @ self.positions.T \
+            / self.wave_speed
+
+    def evaluate(self, times):
+        """
+        Evaluate the ping at each hydrophone at the given times.
+
+        Parameters
+        ----------
+        times : array_like
+            Times to evaluate at in s, along the last axis. Either 1D (the
+            same times for every hydrophone) or broadcastable against
+            (..., n_phones, n_times).
+
+        Returns
+        -------
+        samples : numpy array
+            The signal at each hydrophone, of shape (..., n_phones, n_times),
+            where ... are the leading axes of doa.
+
+        """
+        times = np.asarray(times, dtype=float)
+
+        # Time since the ping reached each hydrophone.
+        elapsed = times - self.start_time - self.delays[..., np.newaxis]
+
+        samples = self.amplitude * np.sin(
+            2 * np.pi * self.freq * elapsed + np.radians(self.phase)
+        )
+        if self.duration is None:
+            return np.where(elapsed >= 0, samples, 0)
+        return np.where((elapsed >= 0) & (elapsed < self.duration), samples,
+                        0)
+
+    def window(self, start, duration, fs=ADC_SAMPLE_RATE):
+        """
+        Sample the ping at each hydrophone over a window of time.
+
+        Parameters
+        ----------
+        start : float
+            Time of the first sample in s.
+
+        duration : float
+            Length of the window in s.
+
+        fs : float, optional
+            Sample rate in Hz. The default is ADC_SAMPLE_RATE.
+
+        Returns
+        -------
+        Signal
+            The samples, of shape (..., n_phones, n_samples), starting at
+            start.
+
+        """
+        times = start + np.arange(int(round(duration * fs))) / fs
+        return Signal(self.evaluate(times), fs, start)
+
+
+# Code testing region.
+if __name__ == '__main__':
+    from signal_angle_detect import signal_angle_detect_batch
+
+    # Sweep directions over the upper hemisphere, a block at a time, reading
+    # 1ms from the start of each ping.
+    rng = np.random.default_rng(0)
+    freq = 25000
+    spacing = 0.01778
+    num_directions = 20000
+    block_size = 1000
+
+    worst = 0
+    for block in range(num_directions // block_size):
+        doa = rng.normal(size=(block_size, 3))
+        doa[:, 2] = np.abs(doa[:, 2])
+        source = PlaneWaveSource(doa, freq=freq,
+                                 positions=square_array(spacing),
+                                 start_time=0.5, duration=0.002)
+        received = source.window(0.5 + 2 * spacing / SPEED_OF_SOUND, 0.001,
+                                 fs=1e6)
+        found = signal_angle_detect_batch(SPEED_OF_SOUND, freq, spacing,
+                                          received, None)
+        worst = max(worst, np.max(np.linalg.norm(found - source.doa,
+                                                 axis=-1)))
+
+    print(f'{num_directions} directions, worst error {worst:.1e}')
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a receiver-side resampling stage, which maps the samples
+that arrive at each hydrophone onto the uniform clock of the ADC.
+
+The channel delivers every hydrophone's samples at its own, slightly
+irregular, arrival times (they drift with the Doppler shift). A real receiver
+only sees those signals through its ADC, which samples every channel at the
+same instants n / fs. Resampling onto that grid lets the demodulators work on
+plain (channels, samples) arrays.
+
+The arrival times of each channel are first turned into a fractional sample
+index for every ADC sample time. The waveform is then interpolated at those
+fractional indices with one of three fractional-delay filters:
+
+    'linear' : two-point linear interpolation.
+    'cubic'  : four-point (third order) Lagrange interpolation, evaluated in
+               Farrow form (a polynomial in the fractional delay).
+    'sinc'   : windowed-sinc interpolation with a Kaiser window, which also
+               low-pass filters the signal at the ADC Nyquist frequency when
+               the ADC is slower than the arriving samples (like the
+               anti-aliasing filter in front of a real ADC).
+
+"""
+
+import numpy as np
+
+from wave_signal import Signal
+
+# Sample rate of the hydrophone ADC in Hz (SAMPLING_FREQ_KHZ in the
+# firmware's data_processor.h).
+ADC_SAMPLE_RATE = 111000
+
+# Available interpolation methods.
+RESAMPLE_METHODS = ('linear', 'cubic', 'sinc')
+
+# Farrow coefficients of four-point Lagrange interpolation. Row k gives the
+# weights of samples i - 1, i, i + 1 and i + 2 on mu**k, where mu is the
+# fractional position between samples i and i + 1.
+_CUBIC_FARROW = np.array([
+    [0, 1, 0, 0],
+    [-1 / 3, -1 / 2, 1, -1 / 6],
+    [1 / 2, -1, 1 / 2, 0],
+    [-1 / 6, 1 / 2, -1 / 2, 1 / 6],
+])
+
+
+def resample(times, waveforms, fs=ADC_SAMPLE_RATE, method='cubic',
+             start_time=None, num_samples=None, sinc_half_width=8,
+             kaiser_beta=8.0):
+    """
+    Resample irregularly timed waveforms onto a common uniform time grid.
+
+    Parameters
+    ----------
+    times : numpy array or list of 1D arrays
+        Arrival time of each sample, increasing along the last axis (e.g.
+        the output times of channel, with one row per hydrophone).
+
+    waveforms : numpy array or list of 1D arrays
+        Sample values, with time along the last axis. The leading axes must
+        broadcast against those of times, so a (n_receivers, n_messages,
+        n_samples) batch pairs with times[:, np.newaxis].
+
+    fs : float, optional
+        Sample rate of the output grid in Hz. The grid is aligned to t = 0,
+        i.e. it holds the times n / fs. The default is ADC_SAMPLE_RATE.
+
+    method : {'linear', 'cubic', 'sinc'}, optional
+        Fractional-delay interpolation method (see the module docstring).
+        The default is 'cubic'.
+
+    start_time : float, optional
+        Time of the first output sample (rounded up onto the grid). The
+        default is the latest first arrival time over all channels (plus
+        the half-length of the filter), so that every channel has data for
+        every output sample.
+
+    num_samples : int, optional
+        Number of output samples. The default runs up to the earliest last
+        arrival time over all channels (less the half-length of the filter).
+
+    sinc_half_width : positive int, optional
+        Number of zero crossings of the sinc on either side of the output
+        sample (only used by the 'sinc' method). The default is 8.
+
+    kaiser_beta : float, optional
+        Shape parameter of the Kaiser window (only used by the 'sinc'
+        method). The default is 8.0.
+
+    Returns
+    -------
+    Signal
+        The resampled waveforms, with the leading axes of the broadcast
+        inputs and one sample per grid time along the last axis.
+
+    """
+    if method not in RESAMPLE_METHODS:
+        raise ValueError("Invalid resampling method. Available options are"
+                         " 'linear', 'cubic', and 'sinc'.")
+
+    times = np.asarray(times, dtype=float)
+    waveforms = np.asarray(waveforms)
+    if times.shape[-1] != waveforms.shape[-1] or times.shape[-1] < 2:
+        raise ValueError('The times and waveforms must have the same number'
+                         ' (at least two) of samples.')
+
+    # Filter taps relative to the sample just before each output time.
+    channel_times = times.reshape(-1, times.shape[-1])
+    input_period = np.mean(
+        channel_times[:, -1] - channel_times[:, 0]
+    ) / (times.shape[-1] - 1)
+    if method == 'linear':
+        offsets = np.arange(2)
+    elif method == 'cubic':
+        offsets = np.arange(-1, 3)
+    else:
+        # Cut off at the lower of the two Nyquist frequencies, measured in
+        # cycles per input sample.
+        cutoff = min(1.0, fs * input_period)
+        half_width = int(np.ceil(sinc_half_width / cutoff))
+        offsets = np.arange(1 - half_width, half_width + 1)
+
+    # Common output grid, covering the time span of every channel (less the
+    # length of the filter, so that it never runs off the data).
+    margin = (len(offsets) // 2 - 1) * input_period
+    if start_time is None:
+        start_time = np.max(channel_times[:, 0]) + margin
+    first_index = int(np.ceil(start_time * fs))
+    if num_samples is None:
+        last_index = int(np.floor(
+            (np.min(channel_times[:, -1]) - margin) * fs
+        ))
+        num_samples = max(last_index - first_index + 1, 0)
+    grid = (first_index + np.arange(num_samples)) / fs
+
+    # Fractional sample index of every grid time in every channel.
+    positions = np.stack([
+        np.interp(grid, arrival_times, np.arange(len(arrival_times)))
+        for arrival_times in channel_times
+    ]).reshape(times.shape[:-1] + (num_samples,))
+
+    # Split into the sample just before each grid time and the fraction of
+    # the way to the next one.
+    index = np.minimum(np.floor(positions), times.shape[-1] - 2).astype(int)
+    mu = positions - index
+
+    if method == 'linear':
+        weights = np.stack((1 - mu, mu), axis=-1)
+    elif method == 'cubic':
+        # Horner's rule on the Farrow polynomial of each weight.
+        weights = np.zeros(mu.shape + (4,))
+        for coefficients in _CUBIC_FARROW[::-1]:
+            weights *= mu[..., np.newaxis]
+            weights += coefficients
+    else:
+        distance = mu[..., np.newaxis] - offsets
+        window = np.i0(kaiser_beta * np.sqrt(np.clip(
+            1 - (distance / half_width)**2, 0, None
+        ))) / np.i0(kaiser_beta)
+        weights = cutoff * np.sinc(cutoff * distance) * window
+        # Normalize so that a constant signal passes through unchanged.
+        weights /= np.sum(weights, axis=-1, keepdims=True)
+
+    # Gather the neighbouring samples (repeating the end samples where the
+    # filter runs off either end) and apply the weights.
+    taps = np.clip(index[..., np.newaxis] + offsets, 0, times.shape[-1] - 1)
+    taps, weights, waveforms = _broadcast_channels(taps, weights, waveforms)
+    samples = np.einsum(
+        '...nk,...nk->...n',
+        np.take_along_axis(waveforms, taps.reshape(taps.shape[:-2] + (-1,)),
+                           axis=-1).reshape(taps.shape),
+        weights
+    )
+
+    return Signal(samples, fs, first_index / fs)
+
+
+def _broadcast_channels(taps, weights, waveforms):
+    """Broadcast the leading (channel) axes of the filter and waveforms."""
+    channels = np.broadcast_shapes(taps.shape[:-2], waveforms.shape[:-1])
+    taps = np.broadcast_to(taps, channels + taps.shape[-2:])
+    weights = np.broadcast_to(weights, channels + weights.shape[-2:])
+    waveforms = np.broadcast_to(waveforms, channels + waveforms.shape[-1:])
+    return taps, weights, waveforms
+
+
+# Code testing region.
+if __name__ == '__main__':
+    from wave_gen import wave_gen
+    from wave_channel import hydrophone_positions, single_channel
+
+    # A 30kHz tone sampled at 1MHz, received by a moving sub's hydrophones.
+    frequency = 30000
+    times, waveform = wave_gen([(0.01, frequency, 1, 0)], fs=1e6)
+    receivers = hydrophone_positions(np.array([148, 0]), np.array([0, -1]),
+                                     0.02)
+    geometry = (np.array([0, 0]), receivers, np.array([1.5, 0]),
+                np.array([-1.5, 0]), 1480)
+    output_times, output_waveforms = single_channel(times, waveform,
+                                                    *geometry)
+
+    # The exact received waveform on the ADC grid: find the transmit time of
+    # every ADC sample, and the attenuation at that time.
+    _, attenuation = single_channel(times, np.ones(len(times)), *geometry)
+
+    for method in RESAMPLE_METHODS:
+        received = resample(output_times, output_waveforms, method=method)
+        errors = []
+        for channel_times, channel_attenuation, samples in zip(
+                output_times, attenuation, received.samples):
+            sent_times = np.interp(received.times, channel_times, times)
+            exact = np.interp(received.times, channel_times,
+                              channel_attenuation) \
+                * np.sin(2 * np.pi * frequency * sent_times)
+            errors.append(np.max(np.abs(samples - exact)) / np.max(exact))
+        print(f'{method:>6}: {received.samples.shape} samples,'
+              f' relative error {max(errors):.1e}')
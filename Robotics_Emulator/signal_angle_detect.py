@@ -19,6 +19,7 @@ Returns a vector representing the direction of origin of hydrophone pings
 import math
 import numpy as np
 import matplotlib.pyplot as plt
+from wave_signal import Signal, unpack_wave
 
 # Known constants
 SPEED_OF_SOUND = 1480 # meters per second
@@ -48,46 +49,45 @@ def find_origin(c, freq, d, p):
         DESCRIPTION.
         Distance between adjacent hydrophones (side length of square)
         
-    p : TYPE 1D array of floats (each between 0 and 2pi)
+    p : TYPE array of floats (each between 0 and 2pi)
         DESCRIPTION.
         Phases of wave at each of the hydrophones
         0 is upper left
         1 is upper right
         2 is bottom right
         3 is bottom left
+        Phases of many pings can be given at once, as an array with the four
+        hydrophones along the last axis
 
     Returns
     -------
     Normalized 1D numpy array representing the direction of origin of the wave
+    (or an array of them, with x, y and z along the last axis)
 
     '''
     
+    p = np.asarray(p)
+    
     # find phase differences
     # diffs[0] and [1] are x phase diffs (between L and R h-phone) on top and bottom, respectively
     # diffs[2] and [3] are y phase diffs (between top and bottom h-phone) on the left and right, respectively
-    diffs = np.array([p[1]-p[0], p[2]-p[3], p[0]-p[3], p[1]-p[2]])
+    diffs = np.stack([p[..., 1]-p[..., 0], p[..., 2]-p[..., 3],
+                      p[..., 0]-p[..., 3], p[..., 1]-p[..., 2]], axis=-1)
     
     # trim phase differences to force between +/- pi
     diffs = diffs % (2 * np.pi) 
-    for x in range(4):
-        if diffs[x] > np.pi:
-            diffs[x] = diffs[x] - (2 * np.pi)
+    diffs = np.where(diffs > np.pi, diffs - (2 * np.pi), diffs)
             
     # v_x, v_y, and v_z are the x, y, and z components of the wave direction
     # these equations come from Physics
-    v_x = c * (diffs[0] + diffs[1])/(4 * np.pi * d * freq)
-    v_y = c * (diffs[2] + diffs[3])/(4 * np.pi * d * freq)
+    v_x = c * (diffs[..., 0] + diffs[..., 1])/(4 * np.pi * d * freq)
+    v_y = c * (diffs[..., 2] + diffs[..., 3])/(4 * np.pi * d * freq)
     # the squares of the components must sum to 1 (mohith said so)
-    v_z = 1 - pow(v_x, 2) - pow(v_y, 2) 
-    if v_z < 0:
-        # if for some reason the other two components square and add to 
-        # more than 1 (rounding), this just gives zero as the third component
-        v_z = 0
-    else:
-        v_z = np.sqrt(v_z)
-        
+    # if for some reason the other two components square and add to 
+    # more than 1 (rounding), this just gives zero as the third component
+    v_z = np.sqrt(np.maximum(1 - v_x**2 - v_y**2, 0))
     
-    return np.array([v_x, v_y, v_z])
+    return np.stack([v_x, v_y, v_z], axis=-1)
     
 def find_phase(freq, times, waves):
     '''
@@ -100,10 +100,10 @@ def find_phase(freq, times, waves):
         DESCRIPTION.
         Frequency we are transmitting waves at.
     
-    times : TYPE 1D numpy array
+    times : TYPE 1D numpy array or Signal
         DESCRIPTION.
         List of times corresponding to each point in the waveform. Assumed to
-        be ordered and in seconds.
+        be ordered and in seconds. If a Signal is given, waves is ignored.
         
     waves : TYPE 1D numpy array
         DESCRIPTION.
@@ -114,6 +114,8 @@ def find_phase(freq, times, waves):
     The phase difference of this particular wave
 
     '''
+    times, waves = unpack_wave(times, waves)
+    
     # define omega for later use
     omega = 2 * np.pi * freq
     
@@ -135,6 +137,65 @@ def find_phase(freq, times, waves):
 
     return phase
 
+def find_phases(freq, times, waves):
+    '''
+    Finds the phases of many signals at once, like find_phase
+
+    Parameters
+    ----------
+    freq : TYPE float (preferably integer)
+        DESCRIPTION.
+        Frequency we are transmitting waves at.
+    
+    times : TYPE numpy array or Signal
+        DESCRIPTION.
+        Times corresponding to each point in the waveforms, along the last 
+        axis. Either one list of times shared by every waveform, or an array
+        that broadcasts against waves (one row of times per waveform). 
+        Assumed to be ordered and in seconds. If a Signal is given, waves is
+        ignored.
+        
+    waves : TYPE numpy array
+        DESCRIPTION.
+        Amplitudes comprising the waveforms, with time along the last axis,
+        e.g. of shape (n_pings, 4, n_samples)
+
+    Returns
+    -------
+    Numpy array of the phase of each waveform (the shape of waves without
+    its last axis)
+
+    '''
+    times, waves = unpack_wave(times, waves)
+    
+    # define omega for later use
+    omega = 2 * np.pi * freq
+    
+    # Only the first ms of each signal is needed. Trim to the longest first
+    # ms, and mask off anything past the first ms of shorter ones
+    in_window = times < times[..., :1] + 0.001
+    num_used = np.max(np.sum(in_window, axis=-1))
+    in_window = in_window[..., :num_used]
+    times = times[..., :num_used]
+    waves = waves[..., :num_used]
+    
+    # sums to find kI and kQ for Fourier inner product
+    if times.ndim == 1:
+        # every waveform shares the same times, so this is a matrix product
+        kI = waves @ np.cos(omega * times)
+        kQ = waves @ np.sin(omega * times)
+    elif np.all(in_window):
+        kI = np.sum(waves * np.cos(omega * times), axis=-1)
+        kQ = np.sum(waves * np.sin(omega * times), axis=-1)
+    else:
+        kI = np.sum(np.where(in_window, waves * np.cos(omega * times), 0),
+                    axis=-1)
+        kQ = np.sum(np.where(in_window, waves * np.sin(omega * times), 0),
+                    axis=-1)
+    
+    # take that arctan using kQ and kI to find phase
+    return np.arctan2(kQ, kI)
+
 def signal_angle_detect(c, freq, d, times, waves):
     '''
     Combines find_phase and find_origin to 
@@ -154,16 +215,17 @@ def signal_angle_detect(c, freq, d, times, waves):
         DESCRIPTION.
         Distance between adjacent hydrophones (side length of square)
         
-    times : list of four 1D numpy arrays
+    times : list of four 1D numpy arrays (or Signals), or a Signal
         DESCRIPTION.
         List of four 1D numpy arrays representing the times of each 
-        measurement by each of the four hydrophones.
+        measurement by each of the four hydrophones. A single Signal with one
+        row of samples per hydrophone is also accepted.
     
     waves : list of four 1D numpy arrays
         DESCRIPTION.
         List of four 1D numpy arrays representing the amplitudes of each 
         measurement (corresponding to the times in times) by each of the four
-        hydrophones.
+        hydrophones. Ignored for any hydrophone whose times are a Signal.
 
     Returns
     -------
@@ -171,6 +233,13 @@ def signal_angle_detect(c, freq, d, times, waves):
     signal
 
     '''
+    # split a multi-hydrophone Signal into one Signal per hydrophone
+    if isinstance(times, Signal):
+        times = [Signal(row, times.sample_rate, times.start_time)
+                 for row in times.samples]
+    if waves is None:
+        waves = [None] * 4
+    
     # allocate space for four phases
     phases = np.zeros(4)
     
@@ -183,5 +252,46 @@ def signal_angle_detect(c, freq, d, times, waves):
     
     return doa
     
+def signal_angle_detect_batch(c, freq, d, times, waves):
+    '''
+    Finds the direction of origin of many pings at once, like 
+    signal_angle_detect
+
+    Parameters
+    ----------
+    c : TYPE float
+        DESCRIPTION.
+        Speed of the wave. This will be the speed of sound in water for most
+        applications.
+        
+    freq : TYPE float (preferably integer)
+        DESCRIPTION.
+        Frequency we are transmitting waves at.
+        
+    d : TYPE float (preferably integer)
+        DESCRIPTION.
+        Distance between adjacent hydrophones (side length of square)
+        
+    times : TYPE numpy array or Signal
+        DESCRIPTION.
+        Times of each measurement, along the last axis. Either one list of 
+        times shared by every ping and hydrophone, or an array of shape
+        (n_pings, 4, n_samples) (or anything that broadcasts against it). A
+        Signal holding all of the pings is also accepted.
+    
+    waves : TYPE numpy array
+        DESCRIPTION.
+        Array of shape (n_pings, 4, n_samples) holding the amplitudes 
+        measured by each of the four hydrophones for each ping. Ignored if 
+        times is a Signal.
+
+    Returns
+    -------
+    A (n_pings, 3) array of the x, y, and z components of the detected 
+    direction of each ping
+
+    '''
+    return find_origin(c, freq, d, find_phases(freq, times, waves))
+    
 #if __name__ == "__main__": 
     # Executed when invoked directly
\ No newline at end of file
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a streaming sliding-DFT tone tracker, which is a host
+model of the ping detector that runs on the hydrophone board
+(Hydrophone_add and friends in the firmware's data_processor.c).
+
+The firmware keeps, for each hydrophone, a circular buffer holding the last
+1 ms of samples, along with the inner products of that window with a sine
+and a cosine at the pinger frequency, and its sum of squares. Each new sample
+replaces the oldest one in the buffer, and the accumulators are updated by
+the difference, so every sample costs O(1) no matter how long the window is.
+The sine and cosine tables are indexed by the buffer slot, so they are only
+correct when the window holds a whole number of periods (i.e. the pinger
+frequency is a multiple of 1 kHz).
+
+SlidingDFT does the same for any number of channels, but is fed a block of
+samples at a time: the per-sample updates within a block are found with
+running sums (np.cumsum, which adds in the same order as the firmware), so
+the running magnitude, norm and phase after every sample come out at numpy
+speed. With dtype=np.float32 it follows the firmware's single precision
+arithmetic.
+
+Rounding error builds up in the accumulators as the window slides. The
+firmware clears everything after each ping; here the accumulators can also
+be recomputed from the buffer every reinit_interval samples, which removes
+the drift without losing the contents of the window.
+
+"""
+
+import numpy as np
+
+from resample import ADC_SAMPLE_RATE
+
+# pi as the firmware's FLOAT_PI (rounded to single precision).
+_FLOAT_PI = np.float32(np.pi)
+
+
+class SlidingDFT:
+    """
+    Running single-frequency DFT over a sliding window, on several channels.
+
+    Parameters
+    ----------
+    frequency : float
+        Frequency of the tone to track in Hz (SIGNAL_FREQ_HZ).
+
+    fs : float, optional
+        Sample rate in Hz. The default is ADC_SAMPLE_RATE.
+
+    num_channels : positive int, optional
+        Number of channels tracked side by side. The default is 4 (one per
+        hydrophone, like the firmware).
+
+    window_length : positive int, optional
+        Number of samples in the sliding window (WINDOW_LEN). The default is
+        1 ms worth of samples.
+
+    reinit_interval : positive int, optional
+        Number of samples between recomputing the accumulators from the
+        buffer, to stop rounding error from building up. The default is
+        None, which never recomputes them (like the firmware between pings).
+
+    dtype : numpy dtype, optional
+        Floating point type of the buffer, tables and accumulators. The
+        default is float; np.float32 matches the firmware.
+
+    """
+
+    def __init__(self, frequency, fs=ADC_SAMPLE_RATE, num_channels=4,
+                 window_length=None, reinit_interval=None, dtype=float):
+        if window_length is None:
+            window_length = int(round(fs / 1000))
+        if window_length < 1 or num_channels < 1:
+            raise ValueError('The window length and number of channels must'
+                             ' be positive.')
+        if reinit_interval is not None and reinit_interval < 1:
+            raise ValueError('The reinitialization interval must be'
+                             ' positive.')
+
+        self.frequency = frequency
+        self.fs = fs
+        self.num_channels = num_channels
+        self.window_length = window_length
+        self.reinit_interval = reinit_interval
+        self.dtype = np.dtype(dtype)
+
+        # Sine and cosine of the tone at each slot of the window (as in
+        # recomputeSinCosTable, which works out the angle in single precision
+        # before dividing by the sample rate).
+        slots = np.arange(window_length)
+        if self.dtype == np.float32:
+            angles = (np.float32(2) * slots.astype(np.float32) * _FLOAT_PI
+                      * np.float32(frequency)).astype(float) / fs
+        else:
+            angles = 2 * np.pi * frequency * slots / fs
+        self.sin_table = np.sin(angles).astype(self.dtype)
+        self.cos_table = np.cos(angles).astype(self.dtype)
+
+        self.reinitialize()
+
+    def reinitialize(self):
+        """Clear the window and accumulators (Hydrophone_reinitialize)."""
+        self.buffer = np.zeros((self.num_channels, self.window_length),
+                               dtype=self.dtype)
+        self.sin_accum = np.zeros(self.num_channels, dtype=self.dtype)
+        self.cos_accum = np.zeros(self.num_channels, dtype=self.dtype)
+        self.norm_accum = np.zeros(self.num_channels, dtype=self.dtype)
+        self.index = 0
+        self._since_reinit = 0
+
+    def recompute(self):
+        """Recompute the accumulators exactly from the current window."""
+        self.sin_accum = self.buffer @ self.sin_table
+        self.cos_accum = self.buffer @ self.cos_table
+        self.norm_accum = np.sum(self.buffer * self.buffer, axis=-1)
+        self._since_reinit = 0
+
+    @property
+    def mag_sq(self):
+        """Squared magnitude of the tone in the current window."""
+        return self.sin_accum**2 + self.cos_accum**2
+
+    @property
+    def norm_sq(self):
+        """Energy of the current window, on the same scale as mag_sq."""
+        return self.norm_accum * self.window_length / 2
+
+    @property
+    def phase(self):
+        """Phase of the tone in the current window, in radians."""
+        return np.arctan2(self.sin_accum, self.cos_accum)
+
+    def process(self, block):
+        """
+        Slide the window over a block of new samples.
+
+        Parameters
+        ----------
+        block : array_like
+            New samples, of shape (num_channels, n_samples).
+
+        Returns
+        -------
+        mag_sq : numpy array
+            Squared magnitude of the tone after each sample, of shape
+            (num_channels, n_samples).
+
+        norm_sq : numpy array
+            Energy of the window after each sample (on the scale of mag_sq).
+
+        phase : numpy array
+            Phase of the tone after each sample, in radians.
+
+        """
+        block = np.asarray(block, dtype=self.dtype)
+        if block.ndim != 2 or block.shape[0] != self.num_channels:
+            raise ValueError('The block must have shape (num_channels,'
+                             ' n_samples).')
+
+        num_samples = block.shape[1]
+        sin_accum = np.empty(block.shape, dtype=self.dtype)
+        cos_accum = np.empty(block.shape, dtype=self.dtype)
+        norm_accum = np.empty(block.shape, dtype=self.dtype)
+
+        # Split the block wherever the accumulators are due to be recomputed.
+        start = 0
+        while start < num_samples:
+            stop = num_samples
+            if self.reinit_interval is not None:
+                stop = min(stop, start + self.reinit_interval
+                           - self._since_reinit)
+            self._slide(block[:, start:stop], sin_accum[:, start:stop],
+                        cos_accum[:, start:stop], norm_accum[:, start:stop])
+            self._since_reinit += stop - start
+            if self._since_reinit == self.reinit_interval:
+                self.recompute()
+            start = stop
+
+        return (sin_accum**2 + cos_accum**2,
+                norm_accum * self.window_length / 2,
+                np.arctan2(sin_accum, cos_accum))
+
+    def _slide(self, block, sin_out, cos_out, norm_out):
+        """Add a block of samples, writing the accumulators after each."""
+        num_samples = block.shape[1]
+        window = self.window_length
+
+        # Window contents from the oldest sample onwards, followed by the
+        # block. The sample that the k-th new one pushes out of the window is
+        # history[:, k], and the k-th new sample lands in slot slots[k].
+        history = np.concatenate((
+            self.buffer[:, (self.index + np.arange(window)) % window], block
+        ), axis=1)
+        old = history[:, :num_samples]
+        slots = (self.index + np.arange(num_samples)) % window
+
+        diff = block - old
+        sin_out[...] = _running_sum(self.sin_accum,
+                                    diff * self.sin_table[slots])
+        cos_out[...] = _running_sum(self.cos_accum,
+                                    diff * self.cos_table[slots])
+        # The norm takes off the old square, then adds the new one.
+        norm_out[...] = _running_sum(self.norm_accum, np.stack(
+            (-(old * old), block * block), axis=-1
+        ).reshape(self.num_channels, -1))[:, 1::2]
+
+        if num_samples:
+            self.sin_accum = sin_out[:, -1].copy()
+            self.cos_accum = cos_out[:, -1].copy()
+            self.norm_accum = norm_out[:, -1].copy()
+
+        # The last window's worth of samples becomes the buffer.
+        self.index = (self.index + num_samples) % window
+        self.buffer[:, (self.index + np.arange(window)) % window] = \
+            history[:, num_samples:]
+
+
+def _running_sum(initial, terms):
+    """Sums of initial and each prefix of terms, added one at a time."""
+    return np.cumsum(np.concatenate((initial[:, np.newaxis], terms), axis=1),
+                     axis=1, dtype=terms.dtype)[:, 1:]
+
+
+# Code testing region.
+if __name__ == '__main__':
+    from wave_gen import wave_gen
+
+    # A 30kHz ping arriving 2ms into a 10ms recording on four hydrophones,
+    # with a different phase at each.
+    frequency = 30000
+    rng = np.random.default_rng(0)
+    recordings = np.stack([
+        wave_gen([(0.002, frequency, 0, 0), (0.008, frequency, 0.1, phase)],
+                 fs=ADC_SAMPLE_RATE).samples
+        for phase in (0, 20, 40, 60)
+    ]) + rng.normal(scale=0.01, size=(4, 1110))
+
+    tracker = SlidingDFT(frequency, reinit_interval=ADC_SAMPLE_RATE // 10)
+    outputs = [tracker.process(block)
+               for block in np.array_split(recordings, 10, axis=1)]
+    mag_sq, norm_sq, phase = (np.concatenate(output, axis=1)
+                              for output in zip(*outputs))
+
+    triggered = np.argmax(mag_sq[0] > 0.03**2 * 111**2 / 4)
+    print(f'triggered at {triggered / ADC_SAMPLE_RATE * 1000:.2f} ms')
+    print('phase differences (degrees):',
+          np.degrees(np.diff(phase[:, -1])).round(1))
+    print('tone fraction of energy:', (mag_sq[:, -1] / norm_sq[:, -1])
+          .round(3))
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides grid-search direction of arrival (DOA) estimators for the
+hydrophone array: steered response power (SRP) and MUSIC.
+
+Both work on the spatial covariance of the array at a set of frequencies.
+The received samples are split into snapshots, each snapshot is transformed
+at every frequency, and the covariance R(f) of the hydrophones is averaged
+over the snapshots. A plane wave from the unit direction u reaches the
+hydrophone at r after a delay tau = u . r / c (the convention of
+plane_wave.py), so at frequency f it appears across the array as the
+steering vector
+
+    a_m(u, f) = exp(-j 2 pi f tau_m)
+
+Each estimator scores every direction on a grid of azimuths and elevations,
+summed over frequency:
+
+    SRP:   P(u) = sum_f a^H R a         (the power of the array steered to u)
+    MUSIC: P(u) = 1 / sum_f a^H E E^H a (E spans the noise subspace of R)
+
+and the directions of the largest peaks are the sources. MUSIC can separate
+several simultaneous sources, which the phase-difference formula in
+find_origin cannot.
+
+The steering vectors depend only on the array geometry, the frequencies and
+the grid, so they are precomputed once and cached. Since a^H Q a (for either
+R or E E^H) is linear in Q, the tables store the products conj(a_m) a_n for
+every pair of hydrophones, and scoring every direction for every ping is one
+matrix product of the flattened Q of all pings with that table.
+
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from plane_wave import SPEED_OF_SOUND
+from wave_channel import hydrophone_positions
+
+# Available estimators.
+DOA_METHODS = ('srp', 'music')
+
+
+def channel_array(spacing):
+    """
+    Hydrophone positions of wave_channel.channel, relative to the centre.
+
+    Parameters
+    ----------
+    spacing : float
+        Distance between adjacent hydrophones in m.
+
+    Returns
+    -------
+    positions : (5, 2) numpy array
+        Positions of the centre, front left, back left, back right and front
+        right receivers, for a sub facing along the x axis.
+
+    """
+    return hydrophone_positions(np.zeros(2), np.array([1, 0]), spacing)
+
+
+def steering_vectors(positions, frequencies, resolution=2.0,
+                     wave_speed=SPEED_OF_SOUND):
+    """
+    Steering vectors of an array over a grid of directions.
+
+    The grid covers every azimuth (from the x axis towards the y axis) and
+    elevations from 0 (the x-y plane) to 90 degrees (the z axis). The tables
+    are cached, keyed by the geometry, frequencies, resolution and wave
+    speed.
+
+    Parameters
+    ----------
+    positions : array_like
+        Position of each hydrophone, of shape (n_phones, 2) or (n_phones, 3).
+
+    frequencies : 1D array_like
+        Frequencies in Hz.
+
+    resolution : float, optional
+        Grid spacing in degrees. The default is 2.
+
+    wave_speed : float, optional
+        Speed of the wave in m/s. The default is SPEED_OF_SOUND.
+
+    Returns
+    -------
+    directions : numpy array
+        Unit vector of each grid direction, of shape
+        (n_elevations, n_azimuths, 3).
+
+    steering : numpy array
+        Steering vector of each frequency and direction, of shape
+        (n_frequencies, n_elevations, n_azimuths, n_phones).
+
+    """
+    directions, steering, _ = _steering_tables(
+        *_grid_key(positions, frequencies, resolution, wave_speed)
+    )
+    return directions, steering
+
+
+def spatial_covariance(signals, fs, frequencies, num_snapshots=16):
+    """
+    Spatial covariance of the hydrophones at each frequency.
+
+    Parameters
+    ----------
+    signals : array_like
+        Signals received at each hydrophone, of shape
+        (..., n_phones, n_samples), all sampled at the same times.
+
+    fs : float
+        Sample rate in Hz.
+
+    frequencies : 1D array_like
+        Frequencies in Hz.
+
+    num_snapshots : positive int, optional
+        Number of equal snapshots the samples are split into (any left over
+        at the end are dropped). The default is 16.
+
+    Returns
+    -------
+    covariance : numpy array
+        Covariance of the hydrophones at each frequency, of shape
+        (..., n_frequencies, n_phones, n_phones).
+
+    """
+    signals = np.asarray(signals, dtype=float)
+    frequencies = np.asarray(frequencies, dtype=float)
+    snapshot_length = signals.shape[-1] // num_snapshots
+    if snapshot_length < 1:
+        raise ValueError('There must be at least one sample per snapshot.')
+
+    snapshots = signals[..., :num_snapshots * snapshot_length].reshape(
+        signals.shape[:-1] + (num_snapshots, snapshot_length)
+    )
+    # DFT of every snapshot at every frequency: (..., n_phones, snapshots,
+    # frequencies), then frequencies first.
+    basis = np.exp(-2j * np.pi * np.arange(snapshot_length)[:, np.newaxis]
+                   * frequencies / fs)
+    spectra = np.moveaxis(snapshots @ basis, -1, -3)
+
+    return spectra @ np.conj(np.swapaxes(spectra, -1, -2)) / num_snapshots
+
+
+def doa_spectrum(signals, fs, frequencies, positions=None, method='music',
+                 num_sources=1, num_snapshots=16, resolution=2.0,
+                 wave_speed=SPEED_OF_SOUND, spacing=0.0254):
+    """
+    Score every direction on the grid for each ping.
+
+    Parameters
+    ----------
+    signals : array_like
+        Signals received at each hydrophone, of shape
+        (..., n_phones, n_samples), all sampled at the same times.
+
+    fs : float
+        Sample rate in Hz.
+
+    frequencies : 1D array_like
+        Frequencies in Hz to use (e.g. the carrier, or the FSK tones).
+
+    positions : array_like, optional
+        Position of each hydrophone, of shape (n_phones, 2) or (n_phones, 3).
+        The default is channel_array(spacing).
+
+    method : {'srp', 'music'}, optional
+        Estimator (see the module docstring). The default is 'music'.
+
+    num_sources : positive int, optional
+        Number of sources, i.e. the dimension of the signal subspace (only
+        used by MUSIC). The default is 1.
+
+    num_snapshots : positive int, optional
+        Passed on to spatial_covariance. The default is 16.
+
+    resolution : float, optional
+        Grid spacing in degrees. The default is 2.
+
+    wave_speed : float, optional
+        Speed of the wave in m/s. The default is SPEED_OF_SOUND.
+
+    spacing : float, optional
+        Hydrophone spacing in m for the default positions. The default is
+        0.0254.
+
+    Returns
+    -------
+    spectrum : numpy array
+        Score of each grid direction, of shape
+        (..., n_elevations, n_azimuths).
+
+    directions : numpy array
+        Unit vector of each grid direction, of shape
+        (n_elevations, n_azimuths, 3).
+
+    """
+    if method not in DOA_METHODS:
+        raise ValueError("Invalid DOA method. Available options are 'srp'"
+                         " and 'music'.")
+    if positions is None:
+        positions = channel_array(spacing)
+
+    directions, _, pair_weights = _steering_tables(
+        *_grid_key(positions, frequencies, resolution, wave_speed)
+    )
+    covariance = spatial_covariance(signals, fs, frequencies, num_snapshots)
+    num_phones = covariance.shape[-1]
+
+    if method == 'srp':
+        subspace = covariance
+    else:
+        if not 0 < num_sources < num_phones:
+            raise ValueError('The number of sources must be at least one and'
+                             ' less than the number of hydrophones.')
+        # eigh sorts eigenvalues in increasing order, so the noise subspace
+        # is spanned by the first n_phones - num_sources eigenvectors.
+        _, eigenvectors = np.linalg.eigh(covariance)
+        noise = eigenvectors[..., :num_phones - num_sources]
+        subspace = noise @ np.conj(np.swapaxes(noise, -1, -2))
+
+    # a^H Q a = trace(Q) + 2 Re sum_{m < n} conj(a_m) Q_mn a_n, for every
+    # direction at once.
+    first, second = np.triu_indices(num_phones, 1)
+    # (The real part of the product is taken as one real matrix product.)
+    pairs = subspace[..., first, second]
+    lead = pairs.shape[:-2]
+    pairs = pairs.reshape(lead + (-1,))
+    power = np.concatenate((pairs.real, -pairs.imag), axis=-1) \
+        @ pair_weights
+    power += np.real(np.trace(subspace, axis1=-2, axis2=-1)).sum(
+        axis=-1)[..., np.newaxis]
+    power = power.reshape(lead + directions.shape[:2])
+
+    if method == 'srp':
+        return power, directions
+    return 1 / np.maximum(power, np.finfo(float).tiny), directions
+
+
+def steered_doa(signals, fs, frequencies, num_sources=1, **kwargs):
+    """
+    Find the directions of origin of one or more sources for each ping.
+
+    Parameters
+    ----------
+    signals, fs, frequencies, num_sources :
+        See doa_spectrum.
+
+    **kwargs :
+        Any other arguments of doa_spectrum (positions, method,
+        num_snapshots, resolution, wave_speed, spacing).
+
+    Returns
+    -------
+    doa : numpy array
+        Unit direction (x, y, z) of each source, strongest first, of shape
+        (..., num_sources, 3). Each is a separate local maximum of the
+        spectrum, unless there are fewer of them than sources, in which case
+        the highest other grid points make up the rest.
+
+    """
+    spectrum, directions = doa_spectrum(signals, fs, frequencies,
+                                        num_sources=num_sources, **kwargs)
+    flat = spectrum.reshape(spectrum.shape[:-2] + (-1,))
+    if num_sources == 1:
+        # The strongest source is simply the highest point on the grid.
+        strongest = np.argmax(flat, axis=-1)[..., np.newaxis]
+        return directions.reshape(-1, 3)[strongest]
+
+    # Local maxima on the grid (azimuth wraps around, elevation doesn't).
+    num_el, num_az = spectrum.shape[-2:]
+    padded = np.concatenate(
+        (spectrum[..., -1:], spectrum, spectrum[..., :1]), axis=-1
+    )
+    padded = np.pad(padded, [(0, 0)] * (spectrum.ndim - 2) + [(1, 1), (0, 0)],
+                    constant_values=-np.inf)
+    peaks = np.ones(spectrum.shape, dtype=bool)
+    for shift_el in range(3):
+        for shift_az in range(3):
+            if (shift_el, shift_az) != (1, 1):
+                peaks &= spectrum >= padded[..., shift_el:shift_el + num_el,
+                                            shift_az:shift_az + num_az]
+    # Every point of the top (90 degree) row is the zenith. Only one copy
+    # counts, and its neighbours are the whole ring below it.
+    peaks[..., -1, 1:] = False
+    if num_el > 1:
+        peaks[..., -1, 0] &= spectrum[..., -1, 0] >= np.max(
+            spectrum[..., -2, :], axis=-1
+        )
+    tiers = np.where(peaks, 1, 0)
+    tiers[..., -1, 1:] = -1
+
+    # The num_sources highest peaks, strongest first. If there are fewer
+    # peaks than sources, the highest other grid points (never another copy
+    # of the zenith) make up the rest.
+    order = np.lexsort((flat, tiers.reshape(flat.shape)), axis=-1)
+    strongest = order[..., :-num_sources - 1:-1]
+    return directions.reshape(-1, 3)[strongest]
+
+
+def _grid_key(positions, frequencies, resolution, wave_speed):
+    """Hashable cache key for _steering_tables."""
+    positions = np.asarray(positions, dtype=float)
+    if positions.ndim != 2 or positions.shape[1] not in (2, 3):
+        raise ValueError('The hydrophone positions must have shape'
+                         ' (n_phones, 2) or (n_phones, 3).')
+    return (tuple(map(tuple, positions)),
+            tuple(np.atleast_1d(np.asarray(frequencies, dtype=float))),
+            float(resolution), float(wave_speed))
+
+
+@lru_cache(maxsize=16)
+def _steering_tables(positions, frequencies, resolution, wave_speed):
+    """
+    Grid directions, steering vectors and pair products for one geometry.
+
+    The pair products 2 conj(a_m) a_n (m < n) are laid out as a
+    (2 * n_frequencies * n_pairs, n_directions) real matrix, with all of the
+    real parts before all of the imaginary parts, matching the flattened
+    upper triangles of the per-frequency covariances.
+    """
+    positions = np.array(positions)
+    frequencies = np.array(frequencies)
+
+    azimuths = np.radians(np.arange(0, 360, resolution))
+    elevations = np.radians(np.append(np.arange(0, 90, resolution), 90))
+    directions = np.stack(np.broadcast_arrays(
+        np.cos(elevations)[:, np.newaxis] * np.cos(azimuths),
+        np.cos(elevations)[:, np.newaxis] * np.sin(azimuths),
+        np.sin(elevations)[:, np.newaxis]
+    ), axis=-1)
+
+    delays = directions[..., :positions.shape[1]] @ positions.T / wave_speed
+    steering = np.exp(-2j * np.pi * frequencies[:, np.newaxis, np.newaxis,
+                                                np.newaxis] * delays)
+
+    first, second = np.triu_indices(len(positions), 1)
+    flat = steering.reshape(len(frequencies), -1, len(positions))
+    pair_weights = np.conj(flat[..., first]) * flat[..., second]
+    pair_weights = np.moveaxis(pair_weights, 1, -1).reshape(
+        -1, flat.shape[1]
+    )
+    # Real and imaginary parts stacked (times 2 for both halves of R).
+    pair_weights = 2 * np.concatenate((pair_weights.real, pair_weights.imag))
+
+    for table in (directions, steering, pair_weights):
+        table.flags.writeable = False
+    return directions, steering, pair_weights
+
+
+# Code testing region.
+if __name__ == '__main__':
+    # Independent sources heard by the channel's hydrophones (2.54cm apart)
+    # at 1MHz. Each sends tones from 25kHz to 35kHz whose phases jump at
+    # random every 0.5ms, so the sources aren't coherent.
+    fs = 1e6
+    rng = np.random.default_rng(0)
+    frequencies = np.arange(25000, 35001, 2000)
+    positions = channel_array(0.0254)
+    times = np.arange(8000) / fs
+
+    def incoherent_signals(truth):
+        """Noisy signals from a source in each direction of truth."""
+        signals = rng.normal(scale=0.05, size=(len(positions), len(times)))
+        for direction in truth:
+            elapsed = times - (positions @ direction[:2]
+                               / SPEED_OF_SOUND)[:, np.newaxis]
+            phases = rng.uniform(0, 2 * np.pi, size=(len(frequencies), 18))
+            for frequency, phase in zip(frequencies, phases):
+                signals += np.sin(2 * np.pi * frequency * elapsed
+                                  + phase[(elapsed // 0.0005).astype(int)
+                                          + 1])
+        return signals
+
+    truth = np.array([[1, 0, 0.2], [-0.3, 1, 0.5]])
+    truth /= np.linalg.norm(truth, axis=-1, keepdims=True)
+    signals = incoherent_signals(truth)
+    for method in DOA_METHODS:
+        found = steered_doa(signals, fs, frequencies, num_sources=2,
+                            method=method, positions=positions)
+        print(f'{method:>6}:', np.round(found, 2).tolist())
+    print(' truth:', np.round(truth, 2).tolist())
+
+    # A source at the zenith is one point of the grid, however many
+    # azimuths its row has, so it is found once and the other source is
+    # still found.
+    truth = np.array([[0, 0, 1], [1, 0, 0.2]])
+    truth /= np.linalg.norm(truth, axis=-1, keepdims=True)
+    found = steered_doa(incoherent_signals(truth), fs, frequencies,
+                        num_sources=2, method='music', positions=positions)
+    errors = np.degrees(np.arccos(np.clip(found @ truth.T, -1, 1)))
+    assert np.all(np.min(errors, axis=0) < 10) \
+        and np.sum(found[:, 2] > 0.999) == 1, \
+        'The zenith source was not found exactly once.'
+    for method in DOA_METHODS:
+        found = steered_doa(incoherent_signals(truth[:1]), fs, frequencies,
+                            num_sources=2, method=method,
+                            positions=positions)
+        assert not np.allclose(found[0], found[1]), \
+            'The zenith was reported twice.'
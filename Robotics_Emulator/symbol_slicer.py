@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides vectorized symbol decisions for the demodulators: slicing
+measured phase shifts or frequencies to the nearest point of an M-PSK or
+M-FSK constellation, and differential encoding and decoding of symbol
+streams.
+
+Every function works elementwise (or along the last axis), so a whole batch
+of received messages, e.g. a (trials, symbols) array from a BER run, is
+decided in one call.
+
+"""
+
+import numpy as np
+
+
+def phase_slicer(phases, constellation=(0, 180)):
+    """
+    Find the nearest constellation phase to each measured phase.
+
+    Phases are compared around the circle, so 350 degrees is nearest to 0.
+    A phase exactly halfway between two constellation points goes to the
+    later one (counting up from 0 degrees), so with the default
+    constellation 90 and 270 degrees are sliced to 180 and 0 respectively.
+
+    Parameters
+    ----------
+    phases : array_like
+        Measured phases (or phase shifts) in degrees, of any shape.
+
+    constellation : 1D array_like, optional
+        Phase of each symbol in degrees, e.g. QPSK_phases for QPSK. The
+        default is (0, 180), i.e. BPSK.
+
+    Returns
+    -------
+    symbols : numpy array of int
+        Index in constellation of the nearest phase, the same shape as
+        phases.
+
+    """
+    constellation = np.asarray(constellation, dtype=float) % 360
+    if constellation.ndim != 1 or len(constellation) == 0:
+        raise ValueError('The constellation must be a non-empty 1D list of'
+                         ' phases.')
+
+    order = np.argsort(constellation, kind='stable')
+    points = constellation[order]
+
+    # Decision boundaries halfway between neighbouring points, plus the one
+    # between the last and first points (which wraps around past 360).
+    boundaries = (points[:-1] + points[1:]) / 2
+    wrap = (points[-1] + points[0] + 360) / 2
+    if wrap < 360:
+        boundaries = np.append(boundaries, wrap)
+        lookup = np.concatenate((order, order[:1]))
+    else:
+        boundaries = np.insert(boundaries, 0, wrap - 360)
+        lookup = np.concatenate((order[-1:], order))
+
+    positions = np.asarray(phases, dtype=float) % 360
+    return lookup[np.searchsorted(boundaries, positions, side='right')]
+
+
+def frequency_slicer(frequencies, tones):
+    """
+    Find the nearest tone to each measured frequency.
+
+    A frequency exactly halfway between two tones goes to the later one in
+    tones.
+
+    Parameters
+    ----------
+    frequencies : array_like
+        Measured frequencies, of any shape.
+
+    tones : 1D array_like
+        Frequency of each symbol (in the same units as frequencies).
+
+    Returns
+    -------
+    symbols : numpy array of int
+        Index in tones of the nearest tone, the same shape as frequencies.
+
+    """
+    tones = np.asarray(tones, dtype=float)
+    if tones.ndim != 1 or len(tones) == 0:
+        raise ValueError('The tones must be a non-empty 1D list of'
+                         ' frequencies.')
+
+    distances = np.abs(np.asarray(frequencies, dtype=float)[..., np.newaxis]
+                       - tones[::-1])
+    # argmin picks the first of any ties, i.e. the last of the tones.
+    return len(tones) - 1 - np.argmin(distances, axis=-1)
+
+
+def differential_encode(symbols, M=2, initial=0):
+    """
+    Differentially encode a symbol stream along the last axis.
+
+    Each output symbol is the previous one advanced by the input symbol
+    (modulo M), starting from initial, so the output has one more symbol
+    than the input.
+
+    Parameters
+    ----------
+    symbols : array_like of int
+        Symbols (0 to M - 1) to encode, with symbols along the last axis.
+
+    M : positive int, optional
+        Number of symbols in the alphabet. The default is 2.
+
+    initial : int, optional
+        Reference symbol sent first. The default is 0.
+
+    Returns
+    -------
+    encoded : numpy array of int
+
+    """
+    symbols = np.asarray(symbols, dtype=int)
+    steps = np.concatenate((
+        np.full(symbols.shape[:-1] + (1,), initial, dtype=int), symbols
+    ), axis=-1)
+    return np.cumsum(steps, axis=-1) % M
+
+
+def differential_decode(symbols, M=2):
+    """
+    Differentially decode a symbol stream along the last axis.
+
+    Each output symbol is the change (modulo M) from one input symbol to the
+    next, so the output has one fewer symbol than the input. This undoes
+    differential_encode.
+
+    Parameters
+    ----------
+    symbols : array_like of int
+        Received symbols (0 to M - 1), with symbols along the last axis.
+
+    M : positive int, optional
+        Number of symbols in the alphabet. The default is 2.
+
+    Returns
+    -------
+    decoded : numpy array of int
+
+    """
+    return np.diff(np.asarray(symbols, dtype=int), axis=-1) % M
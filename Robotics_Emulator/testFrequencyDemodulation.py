@@ -4,73 +4,119 @@ import math
 import numpy as np
 import matplotlib.pyplot as plt
 import wave_gen as wg
+from phase_shift_checker import gather_bit_windows
+from wave_signal import unpack_wave
 
 #Constants
 SPEED_SOUND = 1480 # m / s 
 HYDRO_SPACING = 0.1 # m 
+BASIS_BLOCK_SIZE = 2**22 # number of basis values built at once by detectTones
 
 def decodeFrequencyModulation(time, voltage, freq, delT):
     """
 
     Parameters
     ----------
-    time : 1-D Numpy array 
+    time : Numpy array or Signal
         List of the times which correspond to the measured voltages with the
-        waveform. 
-    voltage : 1-D Numpy array
+        waveform. If a Signal is given, voltage is ignored. A 2-D array (one
+        row of times per row of voltage) is also accepted.
+    voltage : Numpy array
         List of the voltages of the waveform which correspond to the given times.
+        A 2-D array (one waveform per row, sharing the same times or each with
+        its own row of times) is also accepted.
     freq  :  1-D Numpy array
         List of possible frequencies which could correspond to the given data
-    bitPeriod : 
+    delT : float
+        Time interval between each bit change
 
     Returns
     -------
-    givenFrequency : float
-        Returns the frequency from freq[] which aligns most with the given 
-        time interval. 
+    givenFrequency : Numpy array
+        Returns the frequency from freq[] which aligns most with each bit 
+        interval. For a 2-D voltage, a 2-D array with one row of
+        frequencies per waveform is returned.
 
     """
-    currentTime = delT / 2
-    delTPrime = delT / 4
-    bit = 0 
-    
-    time = time - time[0]
+    return np.asarray(freq)[detectTones(time, voltage, freq, delT)]
+
+def detectTones(time, voltage, freq, delT):
+    """
+    Find which of the candidate tones is strongest in every bit interval.
+
+    Every bit interval is correlated against every tone in one matrix 
+    product. When the samples are uniformly spaced (so every interval has the
+    same relative sample times), the (samples x frequencies) correlator basis
+    is built once and shared by all intervals; otherwise each interval gets
+    its own basis.
+
+    Parameters
+    ----------
+    time : Numpy array or Signal
+        List of the times which correspond to the measured voltages with the
+        waveform. If a Signal is given, voltage is ignored. A 2-D array (one
+        row of times per row of voltage) is also accepted.
+    voltage : Numpy array
+        List of the voltages of the waveform which correspond to the given times.
+        A 2-D array (one waveform per row, sharing the same times or each with
+        its own row of times) is also accepted.
+    freq  :  1-D Numpy array
+        List of possible frequencies which could correspond to the given data
+    delT : float
+        Time interval between each bit change
+
+    Returns
+    -------
+    tones : Numpy array of int
+        Index in freq[] of the strongest tone in each bit interval, with bits
+        along the last axis (and one row per waveform for a 2-D voltage).
+
+    """
+    time, voltage = unpack_wave(time, voltage)
     
-    index = time[time < currentTime - delTPrime].size
+    time = time - time[..., :1]
     
     #Definition of Omega 
-    omega = 2 * np.pi * freq     #Numpy array of all omega values 
+    omega = 2 * np.pi * np.asarray(freq)     #Numpy array of all omega values 
     
-    frequencyList = []
+    #Gather the samples of every bit interval (from delT/4 before to delT/4 
+    #after the middle of each bit) into (bits, samples) arrays
+    measureTime, measureVoltage, valid = gather_bit_windows(
+        time, voltage, delT, delT / 4)
+    measureVoltage = np.where(valid, measureVoltage, 0)
     
-    while time[time > currentTime + delTPrime].size > 0:
-        measureTime = time[time >= currentTime - delTPrime]
-        
-        measureTime = measureTime[measureTime < currentTime - delTPrime + delT]
-        
-        indexJump = measureTime.size
-        
-        measureTime = measureTime[measureTime < currentTime + delTPrime]
-        
-        measureVoltage = np.take(voltage, range(index, index + measureTime.size))
-        
-        
-        amplitude = np.zeros(omega.size)
-
-        for i in range(omega.size):
-            kI = np.sum(measureVoltage * np.cos(omega[i] * measureTime))
-            kQ = np.sum(measureVoltage * np.sin(omega[i] * measureTime))
-            
-            amplitude[i] = kI**2 + kQ**2
-        
-        
-        frequencyList.append(freq[np.argmax(amplitude)])
-        
-        currentTime += delT
-        index += indexJump
-        bit += 1
+    #Only the magnitude of the inner product is needed, so each interval can
+    #be measured from its own first sample
+    offsets = measureTime - measureTime[..., :1]
+    
+    #With uniform sampling, every interval has the same sample offsets as the
+    #longest one (up to a microradian of phase at the highest frequency).
+    #A recording shorter than one bit has no intervals at all
+    sharedOffsets = np.max(np.where(valid, offsets, -np.inf), axis=-2,
+                           initial=-np.inf)
+    tolerance = 1e-6 / max(np.max(omega, initial=0), 1)
+    
+    if np.all(~valid | (np.abs(offsets - sharedOffsets[..., np.newaxis, :])
+                        <= tolerance)):
+        #One (samples x frequencies) basis for all bits
+        basis = np.exp(1j * sharedOffsets[..., np.newaxis] * omega)
+        correlation = measureVoltage @ basis
+    else:
+        #A basis per bit, built a block of bits at a time to bound memory
+        correlation = np.zeros(measureVoltage.shape[:-1] + omega.shape,
+                               dtype=complex)
+        blockSize = max(1, BASIS_BLOCK_SIZE // max(offsets[..., 0, :].size
+                                                   * omega.size, 1))
+        for start in range(0, offsets.shape[-2], blockSize):
+            block = slice(start, start + blockSize)
+            basis = np.exp(1j * offsets[..., block, :, np.newaxis] * omega)
+            correlation[..., block, :] = np.einsum(
+                '...bs,...bsf->...bf', measureVoltage[..., block, :], basis)
     
-    return frequencyList
+    #amplitude = kI**2 + kQ**2 for every bit and tone
+    amplitude = correlation.real**2 + correlation.imag**2
+    
+    return np.argmax(amplitude, axis=-1)
 
 if __name__ == "__main__": 
     waves = []
@@ -98,6 +144,15 @@ if __name__ == "__main__":
         #print(fourier_phase_shift_checker(times, waveform, .001, 20000))
         print(decodeFrequencyModulation(times, waveform, np.array([20000, 25000, 30000, 35000]), 0.001))
     
+    # a recording shorter than one bit has no bits to decode
+    times, waveform = wg.wave_gen([(0.0004, 20000, 1, 0)])
+    tones = detectTones(times, waveform, [20000, 25000], 0.001)
+    assert tones.shape == (0,) and tones.dtype.kind == 'i', \
+        'A short recording should give no tones'
+    tones = detectTones(times, np.stack([waveform, waveform]),
+                        [20000, 25000], 0.001)
+    assert tones.shape == (2, 0), 'A short batch should give no tones per row'
+    
     """# works on an amplitude that is not 1, as long as amp is constant
     # it could work even if amp isnt constant, but mostly due to the error 
     # margins I allow and I wouldn't push it
@@ -10,19 +10,22 @@ bitsteam into a modulated digital waveform.
 
 """
 
+import numpy as np
 from matplotlib import pyplot as plt
 
 # Error correcting codes.
 import ecc
 
 # Waveform generation.
-from wave_gen import wave_gen
+from wave_gen import (wave_gen, wave_gen_batch, wave_gen_blocks,
+                      accumulate_phase, check_nyquist, snap_edges)
+from wave_signal import Signal
 
 
 def transmit(bitstream, bit_rate, *, encoding=None, encoding_arg=0,
-             modulation_type, FSK_freqs=(0, 0), PSK_phase=180,
-             QPSK_phases=(0, 90, 180, 270), frequency=0, amplitude=1,
-             num_pts=1000):
+             interleaver=None, modulation_type, FSK_freqs=(0, 0),
+             PSK_phase=180, QPSK_phases=(0, 90, 180, 270), frequency=0,
+             amplitude=1, num_pts=1000, fs=None, oscillator='sin'):
     """
     Encode the given bitsteam into a modulated digital waveform.
     
@@ -34,23 +37,40 @@ def transmit(bitstream, bit_rate, *, encoding=None, encoding_arg=0,
     bitstream : 1D array_like of '0's and '1's
         Series of bits (as single-character strings) representing the message
         to be encoded and transmitted. If using qpsk, '2' and '3' are also 
-        allowed messages.
+        allowed messages. A 1D numpy array of integer symbols (e.g. uint8
+        0s and 1s) is also accepted.
 
     bit_rate : float
         The number of bits conveyed per second in the output waveform.
 
-    encoding : str, optional {None, 'repetition', 'hamming'}
+    encoding : str, optional {None, 'repetition', 'hamming', 'conv', 'rs',
+                              'ldpc'}
         The type of encoding to be used, if any. The options are 'repetition'
-        for a repetition code and 'hamming' for a Hamming code. The parameters
-        for these encodings are provided in encoding_arg, described below.
-        The default is None.
+        for a repetition code, 'hamming' for a Hamming code, 'conv' for a
+        convolutional code, 'rs' for a Reed-Solomon code and 'ldpc' for an
+        LDPC code. The parameters for these encodings are provided in
+        encoding_arg, described below. The default is None.
 
     encoding_arg : int, optional
         The appropriate parameter for the chosen type of encoding, if
         applicable. For a (2**n - 1, 2**n - n -1) Hamming code, this parameter
-        is n, and for a repetition code, this parameter is the number of
-        repetitions. If no encoding is used, this parameter is ignored.
-        The default is 0.
+        is n, for a repetition code, this parameter is the number of
+        repetitions, for a convolutional code, it is the number of code
+        bits per message bit (2 or 3, for rate 1/2 or 1/3), for a
+        Reed-Solomon code, it is the number of parity bytes per 255-byte
+        codeword (the message must then be a whole number of bytes), and for
+        an LDPC code, it is the number of bits per codeword of the (3, 6)
+        regular code from ecc.ldpc_code (the message must then be a whole
+        number of its num_data_bits). If no encoding is used, this parameter
+        is ignored. The default is 0.
+
+    interleaver : ecc.BlockInterleaver or ecc.ConvolutionalInterleaver,
+                  optional
+        Interleaver applied to the encoded bits before modulation, to spread
+        burst errors from the channel over many codewords. Nothing on the
+        receive side undoes it: the caller must pass the demodulated bits
+        (or soft values) through interleaver.deinterleave before decoding.
+        The default is None, which sends the bits in order.
 
     modulation_type : str, {'FSK', 'PSK', 'QPSK'}
         The type of modulation to use to transmit the encoded digital signal.
@@ -85,12 +105,21 @@ def transmit(bitstream, bit_rate, *, encoding=None, encoding_arg=0,
         The total number of evenly-spaced points in the output waveform.
         The default is 1000.
 
+    fs : float, optional
+        If given, sample the output waveform at this fixed rate (in Hz)
+        instead of using num_pts, and return a Signal. The rate must exceed
+        twice the highest carrier frequency. The default is None.
+
+    oscillator : {'sin', 'nco'}, optional
+        How the carrier is evaluated; see wave_gen. The default is 'sin'.
+
     Returns
     -------
     2-tuple
         Representation of the output waveform. Each of the two entries is a
         1D numpy array, the first containing a list of time points and the
-        second containing the corresponding magnitudes.
+        second containing the corresponding magnitudes. If fs is given, a
+        Signal is returned instead (which unpacks the same way).
 
     Examples
     --------
@@ -117,33 +146,345 @@ def transmit(bitstream, bit_rate, *, encoding=None, encoding_arg=0,
 
     """
     # Encode the supplied message using the desired encoding scheme.
+    code = _encode(bitstream, encoding, encoding_arg)
+
+    # Each bit corresponds to a wave segment in the final waveform. The
+    # parameters of every segment are looked up at once from the symbols.
+    symbols = _symbol_array(code)
+    if interleaver is not None:
+        symbols = interleaver.interleave(symbols)
+    wave_segments = _segment_table(
+        symbols, 1 / bit_rate, modulation_type, FSK_freqs=FSK_freqs,
+        PSK_phase=PSK_phase, QPSK_phases=QPSK_phases, frequency=frequency,
+        amplitude=amplitude
+    )
+
+    # When every symbol is a whole number of samples and carrier cycles
+    # long, each symbol's waveform only depends on its frequency and phase,
+    # so it is computed once and copied into place.
+    if fs is not None and oscillator == 'sin':
+        signal = _symbol_lut_waveform(wave_segments, fs)
+        if signal is not None:
+            return signal
+
+    # Generate the waveform from the compiled wave segments.
+    return wave_gen(wave_segments, num_pts=num_pts, fs=fs,
+                    oscillator=oscillator)
+
+
+def transmit_batch(bitstreams, bit_rate, *, encoding=None, encoding_arg=0,
+                   interleaver=None, modulation_type, FSK_freqs=(0, 0),
+                   PSK_phase=180, QPSK_phases=(0, 90, 180, 270), frequency=0,
+                   amplitude=1, num_pts=1000, fs=None, oscillator='sin'):
+    """
+    Encode a batch of equal-length bitstreams into modulated waveforms.
+
+    This is the batched counterpart of transmit, for Monte Carlo runs that
+    send many random messages: row k of the output is exactly what
+    transmit(bitstreams[k], ...) would give, but every message is modulated
+    in one vectorized pass.
+
+    Parameters
+    ----------
+    bitstreams : 2D array_like
+        Array of shape (num_messages, num_bits) of integer symbols (e.g. a
+        uint8 array of 0s and 1s, or 0 to 3 for QPSK), or a list of
+        equal-length strings of '0's and '1's.
+
+    The remaining parameters are the same as for transmit.
+
+    Returns
+    -------
+    times : 1D numpy array
+        List of time points, shared by every message.
+
+    waveforms : 2D numpy array
+        Array of shape (num_messages, len(times)), one waveform per message.
+
+    If fs is given, a single Signal with one waveform per row of its samples
+    is returned instead.
+
+    """
+    if isinstance(bitstreams, np.ndarray) and bitstreams.dtype.kind in 'iub':
+        messages = bitstreams.reshape(len(bitstreams), -1)
+    else:
+        messages = [_symbol_array(message) for message in bitstreams]
+
+    # Encode the messages, all at once if they are already an array of bits
+    # (otherwise the codes work on strings, one message at a time).
+    if encoding is not None and isinstance(messages, np.ndarray):
+        messages = _encode(messages, encoding, encoding_arg)
+    elif encoding is not None:
+        messages = [
+            _symbol_array(_encode(_symbol_string(message), encoding,
+                                  encoding_arg))
+            for message in messages
+        ]
+
+    symbols = np.asarray(messages, dtype=np.uint8)
+    if symbols.ndim != 2:
+        raise ValueError('Every bitstream in the batch must have the same'
+                         ' length.')
+    if interleaver is not None:
+        symbols = interleaver.interleave(symbols)
+
+    # One row of wave segments per message.
+    wave_segments = _segment_table(
+        symbols, 1 / bit_rate, modulation_type, FSK_freqs=FSK_freqs,
+        PSK_phase=PSK_phase, QPSK_phases=QPSK_phases, frequency=frequency,
+        amplitude=amplitude
+    )
+
+    if fs is not None and oscillator == 'sin':
+        signal = _symbol_lut_waveform(wave_segments, fs)
+        if signal is not None:
+            return signal
+
+    return wave_gen_batch(wave_segments, num_pts=num_pts, fs=fs,
+                          oscillator=oscillator)
+
+
+def transmit_blocks(bitstream, bit_rate, *, fs, block_size=4096,
+                    encoding=None, encoding_arg=0, interleaver=None,
+                    modulation_type, FSK_freqs=(0, 0), PSK_phase=180,
+                    QPSK_phases=(0, 90, 180, 270), frequency=0, amplitude=1,
+                    oscillator='sin'):
+    """
+    Encode the given bitstream into a modulated waveform, one block at a time.
+
+    This is the streaming counterpart of transmit (with fs given). The
+    bitstream is consumed lazily, so it may be an unbounded iterator, and
+    only one block of samples is held in memory at a time. Concatenating the
+    yielded blocks gives the samples transmit returns for the same arguments
+    (to within rounding, as transmit may reuse precomputed symbols).
+
+    Parameters
+    ----------
+    bitstream : iterable of '0's and '1's
+        Series of bits (as single-character strings) representing the message
+        to be transmitted. If an encoding or interleaver is used, the message
+        is encoded up front and so must be finite.
+
+    bit_rate : float
+        The number of bits conveyed per second in the output waveform.
+
+    fs : float
+        The sample rate of the output waveform in Hz.
+
+    block_size : positive int, optional
+        Number of samples in each block (the last block may be shorter).
+        The default is 4096.
+
+    The remaining parameters are the same as for transmit.
+
+    Yields
+    ------
+    Signal
+        Consecutive blocks of the output waveform.
+
+    """
+    if modulation_type not in ('FSK', 'PSK', 'QPSK'):
+        raise ValueError("Invalid modulation type. Available options are"
+                         " 'FSK', 'PSK', and 'QPSK'.")
+
+    code = _encode(bitstream, encoding, encoding_arg)
+    if interleaver is not None:
+        code = _symbol_string(interleaver.interleave(_symbol_array(code)))
+
+    wave_segments = _wave_segments(
+        code, 1 / bit_rate, modulation_type, FSK_freqs=FSK_freqs,
+        PSK_phase=PSK_phase, QPSK_phases=QPSK_phases, frequency=frequency,
+        amplitude=amplitude
+    )
+
+    return wave_gen_blocks(wave_segments, fs, block_size=block_size,
+                           oscillator=oscillator)
+
+
+def _encode(bitstream, encoding, encoding_arg):
+    """Encode the bitstream with the chosen error-correcting code, if any."""
+    # Arrays of bits are encoded directly, without going through strings.
     if encoding == 'repetition':
         # The encoding_arg gives the number of repetitions.
-        code = ecc.repetition_encoder(
+        if isinstance(bitstream, np.ndarray):
+            return ecc.RepetitionCode(encoding_arg).encode(bitstream)
+        return ecc.repetition_encoder(
             bitstream, num_repetitions=encoding_arg
         )
     elif encoding == 'hamming':
         # The encoding_arg gives n, corresponding to a
         # (2**n - 1, 2**n - n - 1) Hamming code.
-        code = ecc.hamming_encoder(bitstream, n=encoding_arg)
+        if isinstance(bitstream, np.ndarray):
+            return ecc.hamming_code(encoding_arg).encode(bitstream)
+        return ecc.hamming_encoder(bitstream, n=encoding_arg)
+    elif encoding == 'conv':
+        # The encoding_arg gives the number of code bits per message bit of
+        # the convolutional code.
+        if isinstance(bitstream, np.ndarray):
+            return ecc.convolutional_code(encoding_arg).encode(bitstream)
+        return ecc.convolutional_encoder(bitstream,
+                                         rate_inverse=encoding_arg)
+    elif encoding == 'rs':
+        # The encoding_arg gives the number of parity bytes per codeword of
+        # the Reed-Solomon code.
+        if isinstance(bitstream, np.ndarray):
+            return ecc.reed_solomon_code(encoding_arg).encode_bits(bitstream)
+        return ecc.reed_solomon_encoder(bitstream, num_parity=encoding_arg)
+    elif encoding == 'ldpc':
+        # The encoding_arg gives the number of bits per codeword of the
+        # LDPC code.
+        if isinstance(bitstream, np.ndarray):
+            return ecc.ldpc_code(encoding_arg).encode(bitstream)
+        return ecc.ldpc_encoder(bitstream, num_bits=encoding_arg)
     # If no encoding scheme is selected, use the message itself.
     elif encoding is None:
-        code = bitstream
+        return bitstream
     else:
         raise ValueError("Invalid encoding scheme. Available options are"
-                         " 'repetition', 'hamming', or None.")
+                         " 'repetition', 'hamming', 'conv', 'rs', 'ldpc', or"
+                         " None.")
 
-    # Each bit corresponds to a wave segment in the final waveform. The
-    # parameters of each such segment are stored  in this list and
-    # subsequently used to generate the output waveform.
-    wave_segments = []
 
-    bit_duration = 1 / bit_rate
+def _symbol_array(code):
+    """
+    Convert an encoded message into a 1D uint8 array of symbol values.
+
+    Strings (or sequences of single-character strings) map '0' to 0, '1' to
+    1 and so on; arrays are taken to hold the symbol values already.
+
+    """
+    if isinstance(code, np.ndarray):
+        return code.astype(np.uint8, copy=False).reshape(-1)
+
+    if not isinstance(code, str):
+        code = ''.join(code)
+    # Characters below '0' wrap around to large values, which (like any other
+    # unrecognized character) select no symbol-specific behavior.
+    return np.frombuffer(code.encode('latin-1'), dtype=np.uint8) - ord('0')
+
+
+def _symbol_string(symbols):
+    """Convert an array of symbol values into a string of '0's and '1's."""
+    return (np.asarray(symbols, dtype=np.uint8).reshape(-1)
+            + ord('0')).tobytes().decode('latin-1')
+
+
+def _segment_table(symbols, bit_duration, modulation_type, *, FSK_freqs,
+                   PSK_phase, QPSK_phases, frequency, amplitude):
+    """
+    Look up the wave segment of every symbol at once.
+
+    This gives the same segments as _wave_segments, but as an array with
+    one (duration, frequency, amplitude, relative phase) row per symbol,
+    which wave_gen accepts directly. Symbols are along the last axis of
+    symbols, and any leading axes (e.g. one row per message) are kept. See
+    transmit for a description of the other parameters.
+
+    """
+    wave_segments = np.empty(symbols.shape + (4,))
+    wave_segments[..., 0] = bit_duration
+    wave_segments[..., 2] = amplitude
+
+    # Perform frequency-shift keying (if selected).
+    if modulation_type == 'FSK':
+        # Every symbol other than 0 is sent at the '1' frequency.
+        wave_segments[..., 1] = np.where(
+            symbols == 0, FSK_freqs[0], FSK_freqs[1]
+        )
+        wave_segments[..., 3] = 0
+    # Perform 1-bit differential phase-shift keying (if selected).
+    elif modulation_type == 'PSK':
+        # The phase shifts whenever a bit differs from the one before it.
+        # The first bit is never shifted.
+        wave_segments[..., 1] = frequency
+        wave_segments[..., 3] = 0
+        wave_segments[..., 1:, 3][
+            symbols[..., 1:] != symbols[..., :-1]
+        ] = PSK_phase
+    # Perform 2-bit differential quadrature phase shift keying (if selected).
+    elif modulation_type == 'QPSK':
+        # Table of the phase shift for every possible symbol value. Symbols
+        # other than 0 to 3 get no shift.
+        phase_table = np.zeros(256)
+        phase_table[:4] = QPSK_phases
+        wave_segments[..., 1] = frequency
+        wave_segments[..., 3] = phase_table[symbols]
+    else:
+        raise ValueError("Invalid modulation type. Available options are"
+                         " 'FSK', 'PSK', and 'QPSK'.")
+
+    return wave_segments
 
-    # Convert the encoded message bit by bit into  wave
-    # segments, which together are passed into wave_gen to create the final
-    # waveform.
 
+def _symbol_lut_waveform(wave_segments, fs):
+    """
+    Sample the wave segments at rate fs by copying precomputed symbols.
+
+    This only works when every segment has the same whole number of samples
+    and whole number of carrier cycles, so that the waveform of a segment
+    depends only on its frequency, amplitude and running phase. Each distinct
+    symbol shape is then generated once and gathered into the output.
+
+    Parameters
+    ----------
+    wave_segments : numpy array
+        Wave segments, one (duration, frequency, amplitude, relative phase)
+        row per symbol. Any leading axes index separate waveforms.
+
+    fs : float
+        Sample rate in Hz.
+
+    Returns
+    -------
+    Signal or None
+        The combined waveform(s), equal to wave_gen(wave_segments, fs=fs) to
+        within rounding, or None if the segments are not suitable.
+
+    """
+    durations, frequencies, amplitudes, phase_shifts = \
+        np.moveaxis(wave_segments, -1, 0)
+    if durations.size == 0 or np.any(durations != durations.flat[0]):
+        return None
+
+    # Samples and carrier cycles in one symbol must both be whole numbers.
+    symbol_pts = float(snap_edges(durations.flat[0] * fs))
+    cycles = snap_edges(frequencies * symbol_pts / fs)
+    if symbol_pts != round(symbol_pts) or np.any(cycles != np.round(cycles)):
+        return None
+    symbol_pts = int(symbol_pts)
+
+    check_nyquist(frequencies, fs)
+
+    # Every distinct symbol shape, and which one each segment uses.
+    phases = accumulate_phase(phase_shifts)
+    shapes, shape_index = np.unique(
+        np.stack((frequencies, amplitudes, phases), axis=-1).reshape(-1, 3),
+        axis=0, return_inverse=True
+    )
+
+    # Generate each shape once, over the sample times within a symbol.
+    shape_freqs, shape_amps, shape_phases = shapes.T
+    symbol_times = np.arange(symbol_pts) / fs
+    table = shape_amps[:, np.newaxis] * np.sin(2 * np.pi * (
+        shape_freqs[:, np.newaxis] * symbol_times
+        + (shape_phases / 360)[:, np.newaxis]
+    ))
+
+    samples = table[shape_index.reshape(durations.shape)]
+    return Signal(samples.reshape(durations.shape[:-1] + (-1,)), fs)
+
+
+def _wave_segments(code, bit_duration, modulation_type, *, FSK_freqs,
+                   PSK_phase, QPSK_phases, frequency, amplitude):
+    """
+    Convert the encoded message bit by bit into wave segments.
+
+    The segments, which are (duration, frequency, amplitude, relative phase)
+    tuples, are yielded one at a time so that the code can be consumed
+    lazily. Together they are passed into wave_gen to create the final
+    waveform. See transmit for a description of the parameters.
+
+    """
     # Perform frequency-shift keying (if selected).
     if modulation_type == 'FSK':
         # The frequencies corresponding to '0' and '1' are given by the first
@@ -155,21 +496,18 @@ def transmit(bitstream, bit_rate, *, encoding=None, encoding_arg=0,
         # appropriate frequency, specified amplitude, and zero phase shift,
         # (with the arguments in that order).
         for bit in code:
-            wave_segments.append(
-                (bit_duration, freq0 if bit == '0' else freq1, amplitude, 0)
-            )
+            yield (bit_duration, freq0 if bit == '0' else freq1, amplitude, 0)
     # Perform 1-bit differential phase-shift keying (if selected).
     elif modulation_type == 'PSK':
         # For each bit, construct a new wave segment of the specified duration,
         # frequency, amplitude, and the correct relative phase
-        # (with the arguments in that order).
-        prev_bit = code[0]
+        # (with the arguments in that order). The first bit is never shifted.
+        prev_bit = None
         prev_phase = 0
         for bit in code:
-            wave_segments.append(
-                (bit_duration, frequency, amplitude,
-                 prev_phase + (PSK_phase if bit != prev_bit else 0))
-            )
+            yield (bit_duration, frequency, amplitude,
+                   prev_phase + (PSK_phase if prev_bit is not None
+                                 and bit != prev_bit else 0))
             prev_bit = bit
     # Perform 2-bit differential quadrature phase shift keying (if selected).
     elif modulation_type == 'QPSK':
@@ -188,17 +526,12 @@ def transmit(bitstream, bit_rate, *, encoding=None, encoding_arg=0,
                 relative_phase = QPSK_phases[2]
             elif symb == '3':
                 relative_phase = QPSK_phases[3]
-            wave_segments.append(
-                (bit_duration, frequency, amplitude,
-                 prev_phase + relative_phase)
-            )
+            yield (bit_duration, frequency, amplitude,
+                   prev_phase + relative_phase)
     else:
         raise ValueError("Invalid modulation type. Available options are"
                          " 'FSK', 'PSK', and 'QPSK'.")
 
-    # Generate the waveform from the compiled wave segments.
-    return wave_gen(wave_segments, num_pts=num_pts)
-
 
 # code testing region
 if __name__ == '__main__':
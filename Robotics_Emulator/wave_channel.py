@@ -14,6 +14,7 @@ sub, will add that later.
 import numpy as np
 import matplotlib.pyplot as plt
 from wave_gen import wave_gen
+from wave_signal import unpack_wave
 
 '''
 IMPORTANT NOTE: ALL UNITS ARE IN SI STANDARD UNITS. Thus, speed is in m/s,
@@ -22,57 +23,112 @@ frequency is in Hz, positions in m, etc.
 # Speed of sound in water
 SPEED_OF_SOUND = 1480
 
+# Number of values (samples times receivers) propagated at a time by
+# single_channel. Working through the samples in chunks keeps the temporaries
+# small enough to stay in cache.
+CHUNK_SIZE = 65536
+
 #Calculate the output waveform at a specified location from a given input waveform
 #Code taken from emulate function in main_test
+#input_times may also be a Signal, in which case input_waveform is ignored
+#The positions and velocities are handled one component at a time, so every
+#step is a flat numpy operation over a chunk of samples. The results are
+#written into out (a (times, waveform) pair of arrays) if it is given, and
+#otherwise into new arrays of the given dtype (by default float64, or float32
+#if the inputs are float32).
+#receiver_pos_init may also be an array of receiver positions, one per row
+#(e.g. a whole hydrophone array), in which case every receiver is handled in
+#the same pass and the outputs gain a leading axis with one row per receiver.
 def single_channel(input_times, input_waveform, transmitter_pos_init, 
                    receiver_pos_init, transmitter_velocity, 
-                   receiver_velocity, wave_speed):
-     # Velocity of the transmitter relative to the receiver.
-    relative_velocity = transmitter_velocity - receiver_velocity
+                   receiver_velocity, wave_speed, out=None, dtype=None):
+    input_times, input_waveform = unpack_wave(input_times, input_waveform)
+    
+    #Leading shape of the receiver positions (empty for a single receiver)
+    receiver_shape = np.shape(receiver_pos_init)[:-1]
+    
+    if out is None:
+        if dtype is None:
+            dtype = np.result_type(input_times, input_waveform, 1.0)
+        output_times = np.empty(receiver_shape + input_times.shape,
+                                dtype=dtype)
+        output_waveform = np.empty(receiver_shape + input_waveform.shape,
+                                   dtype=dtype)
+    else:
+        output_times, output_waveform = out
+        dtype = output_times.dtype
+
+    # Velocity of the transmitter relative to the receiver.
+    relative_velocity = np.asarray(transmitter_velocity - receiver_velocity,
+                                   dtype=dtype)
 
     # Initial position of the transmitter relative to the receiver.
-    relative_pos_init = transmitter_pos_init - receiver_pos_init
+    relative_pos_init = np.asarray(transmitter_pos_init - receiver_pos_init,
+                                   dtype=dtype)
+    
+    receiver_velocity = np.asarray(receiver_velocity, dtype=dtype)
+    wave_speed = np.asarray(wave_speed, dtype=dtype)
 
-    # Relative position of the transmitter every time it makes a ping.
-    relative_positions = np.array([
-        relative_pos_init + time * relative_velocity for time in input_times
-    ])
+    #Fewer samples per chunk when there are many receivers
+    chunk_size = max(1, CHUNK_SIZE // int(np.prod(receiver_shape)))
+    
+    for start in range(0, len(input_times), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        times = input_times[chunk].astype(dtype, copy=False)
 
-    # Distance the wave travels for each sample.
-    travel_distances = np.linalg.norm(relative_positions, axis=1)
+        # Relative position of the transmitter every time it makes a ping
+        # (one array per component, with one row per receiver).
+        relative_positions = [
+            relative_pos_init[..., i, np.newaxis] + times * relative_velocity[i]
+            for i in range(relative_pos_init.shape[-1])
+        ]
 
-    # The velocity of the ping obtained by the receiver in the 'rest' frame
-    # of the medium (water in our case) is given by the speed of the wave
-    # in the medium multiplied by the unit vector pointing from the transmitter
-    # to the receiver.
-    wave_velocities = np.array([
-        -wave_speed * relative_position / np.linalg.norm(relative_position)
-        for relative_position in relative_positions
-    ])
+        # Distance the wave travels for each sample.
+        travel_distances = np.sqrt(sum(
+            position * position for position in relative_positions
+        ))
 
-    # The speed of the ping obtained in the receiver's rest frame.
-    relative_wave_speeds = \
-        np.linalg.norm(wave_velocities - receiver_velocity, axis=1)
+        # The velocity of the ping obtained by the receiver in the 'rest'
+        # frame of the medium (water in our case) is given by the speed of
+        # the wave in the medium multiplied by the unit vector pointing from
+        # the transmitter to the receiver. The speed of the ping obtained in
+        # the receiver's rest frame follows by subtracting the receiver's
+        # velocity.
+        relative_wave_speeds = np.sqrt(sum(
+            (-wave_speed * position / travel_distances - velocity)**2
+            for position, velocity in zip(relative_positions,
+                                          receiver_velocity)
+        ))
 
-    # The time at which each point is received is given by the distance
-    # travelled divided by the wave speed relative to the receiver.
-    output_times = input_times + travel_distances / relative_wave_speeds
+        # The time at which each point is received is given by the distance
+        # travelled divided by the wave speed relative to the receiver.
+        np.add(times, travel_distances / relative_wave_speeds,
+               out=output_times[..., chunk])
 
-    # Calculate the magnitude of the pings at the received sub.
-    output_waveform = input_waveform / travel_distances
+        # Calculate the magnitude of the pings at the received sub. The
+        # distances are shared by every row of a 2D (batched) waveform.
+        travel_distances = travel_distances.reshape(
+            receiver_shape + (1,) * (input_waveform.ndim - 1) + (-1,)
+        )
+        np.divide(input_waveform[..., chunk], travel_distances,
+                  out=output_waveform[..., chunk])
 
     return (output_times, output_waveform)
 
 
 
-#Function to calculate recieved waveforms at the hydrophone locations
-def channel(input_times, input_waveform, transmitter_pos_init, receiver_center_pos_init,
-            receiver_orientation, spacing, transmitter_velo, receiver_velo, 
-            noise, wave_speed):
-    
-    #Calculate the initial positions of the 4 reciever (hydrophone) positions.
-    #They are arranged in a d by d square with reciever_center_pos_init at the center,
-    #with d being equal to spacing.
+#Calculate the initial positions of the 4 reciever (hydrophone) positions and
+#the center, as a (5, 2) array.
+#They are arranged in a d by d square with reciever_center_pos_init at the center,
+#with d being equal to spacing.
+#The rows are indexed as:
+#   0: center
+#   1: front left
+#   2: back left
+#   3: back right
+#   4: front right
+def hydrophone_positions(receiver_center_pos_init, receiver_orientation,
+                         spacing):
     
     #ORIENTATION: For now, assume that we orient the sub as if the front is facing towards 
     #the positive x-direction (right). So, looking at the sub, the front left 
@@ -89,47 +145,49 @@ def channel(input_times, input_waveform, transmitter_pos_init, receiver_center_p
     #To find the four hydrophone positions, we will have to add both of the
     #above vectors to the center point and then rotate that 90 degrees to get
     #all 4 points.
-    r_hydrophone_pos_vector = r_orient_d_over_2 + r_perp_orient_d_over_2
+    x, y = r_orient_d_over_2 + r_perp_orient_d_over_2
+    
+    #The 4 successive 90 degree counterclockwise rotations of (x, y), with a
+    #zero offset for the center
+    offsets = np.array([[0, 0], [x, y], [-y, x], [-x, -y], [y, -x]])
+    
+    return receiver_center_pos_init + offsets
+
+#Function to calculate recieved waveforms at the hydrophone locations
+#input_waveform may be 2D (one row per message, e.g. from transmit_batch), in
+#which case each output waveform has the same shape
+#Every receiver is propagated in one pass (see single_channel), so the outputs
+#are stacked arrays with one row per receiver
+def channel(input_times, input_waveform, transmitter_pos_init, receiver_center_pos_init,
+            receiver_orientation, spacing, transmitter_velo, receiver_velo, 
+            noise, wave_speed):
+    
+    #Accept a Signal in place of the (input_times, input_waveform) pair
+    input_times, input_waveform = unpack_wave(input_times, input_waveform)
     
-    #This array will hold the values of the 5 receiver positions with these
-    #indexes:
+    #This array holds the 5 receiver positions with these indexes:
     #   0: center
     #   1: front left
     #   2: back left
     #   3: back right
     #   4: front right
-    receiver_positions = [None] * 5
-    
-    #Setting all the receiver position values
-    receiver_positions[0] = receiver_center_pos_init    
+    receiver_positions = hydrophone_positions(receiver_center_pos_init,
+                                              receiver_orientation, spacing)
     
-    for i in range(4):
-        receiver_positions[i+1] = receiver_center_pos_init + r_hydrophone_pos_vector
-        #Rotate the hydrophone_pos_vector by 90 degrees to get to the next position
-        r_hydrophone_pos_vector = np.array([-r_hydrophone_pos_vector[1], \
-                                            r_hydrophone_pos_vector[0]])
+    #Get the output waveforms at every receiver position at once and then
+    #add noise
+    output_times, output_waveforms = single_channel(
+        input_times, input_waveform, transmitter_pos_init, receiver_positions,
+        transmitter_velo, receiver_velo, wave_speed)
     
-    #Use emulate to get the output waveforms at each receiver position and 
-    #then add noise
-    output_times = [None] * 5
-    output_waveforms = [None] * 5
-    
-    for i in range(5):
-        output_wave = single_channel(input_times, input_waveform, transmitter_pos_init, 
-                                     receiver_positions[i], transmitter_velo, 
-                                     receiver_velo, wave_speed)
-        
-        times, waveform = output_wave
-        waveform = waveform + np.random.normal(0,noise,size=len(waveform))
-        output_times[i] = times
-        output_waveforms[i] = waveform
+    output_waveforms += np.random.normal(0,noise,size=output_waveforms.shape)
     
     #Return the times,waveform received at each of the 5 points (center and 
     #4 hydrophones). The waves received at the 4 hydrophones are listed 
     #counterclockwise, starting with front left.
     #So, the values returned are:
-        #   Output times
-        #   Output waveforms 
+        #   Output times (5 by n_samples array)
+        #   Output waveforms (5 by n_samples array)
         #where the outputs are indexed as:
         #   0: center
         #   1: front left
@@ -139,6 +197,23 @@ def channel(input_times, input_waveform, transmitter_pos_init, receiver_center_p
         
     return output_times, output_waveforms
 
+#Streaming version of channel. Each block (a Signal or a (times, waveform)
+#tuple, e.g. from transmit_blocks or wave_gen_blocks) is propagated on its own,
+#so only one block is ever held in memory. Propagation and noise act on each
+#sample independently, so the blocks come out exactly as channel would give.
+def channel_blocks(input_blocks, transmitter_pos_init, receiver_center_pos_init,
+                   receiver_orientation, spacing, transmitter_velo, 
+                   receiver_velo, noise, wave_speed):
+    
+    for block in input_blocks:
+        #A Signal unpacks into (times, waveform) just like a tuple
+        block_times, block_waveform = block
+        
+        #Yields the same (output_times, output_waveforms) as channel
+        yield channel(block_times, block_waveform, transmitter_pos_init,
+                      receiver_center_pos_init, receiver_orientation, spacing,
+                      transmitter_velo, receiver_velo, noise, wave_speed)
+
 # Code testing region.
 if __name__ == '__main__':
 
@@ -15,10 +15,18 @@ TODO: Fix FM generator to match this one.
 import numpy as np
 import matplotlib.pyplot as plt
 import random
+import itertools
+
+from nco import check_oscillator, nco_sin
+from wave_signal import Signal
 
 case = '5.1'
 
-def wave_gen(wave_segments=[], num_pts=1000, smoothing="None"):
+# Number of wave segments read in at a time when generating blocks.
+SEGMENT_CHUNK = 1024
+
+def wave_gen(wave_segments=[], num_pts=1000, smoothing="None", fs=None,
+             oscillator='sin'):
     """
     Stitch together a series of sinusoids of based on the given parameters.
 
@@ -34,14 +42,28 @@ def wave_gen(wave_segments=[], num_pts=1000, smoothing="None"):
 
     Parameters
     ----------
-    wave_segments : 1D array-like of 5-tuples
+    wave_segments : 1D array-like of 4-tuples
         Each tuple represents a single wave segment, with the duration,
         frequency, amplitude, and phase shift (relative to the previous
-        segment) specified by the entries in that order. The default is [].
+        segment) specified by the entries in that order. A 2D array with one
+        row per segment is also accepted. The default is [].
 
     num_pts : positive int
-        Number of points to generate for each wave segment.
-        The default is 1000.
+        Number of points to generate for each wave segment. Ignored if fs is
+        given. The default is 1000.
+
+    fs : float, optional
+        If given, sample the whole waveform at this fixed rate (in Hz) instead
+        of using num_pts points per segment, and return a Signal. The rate
+        must be above the Nyquist rate of the highest segment frequency.
+        The default is None.
+
+    oscillator : {'sin', 'nco'}, optional
+        How the sinusoids are evaluated. 'sin' calls np.sin on the absolute
+        time of every sample. 'nco' uses the numerically controlled
+        oscillator in nco.py, which is faster and keeps full phase precision
+        at large times, but is not bit-identical to 'sin'.
+        The default is 'sin'.
 
     Returns
     -------
@@ -51,34 +73,475 @@ def wave_gen(wave_segments=[], num_pts=1000, smoothing="None"):
     waveform : 1D numpy array
         List of magnitudes comprising the combined waveform.
 
+    If fs is given, a single Signal starting at t = 0 is returned instead.
+
     """
-    waveform = np.zeros(1)
-    times = np.zeros(1)
-    phase = 0
+    check_oscillator(oscillator)
+
+    # Unpack the segment table into one column per parameter so that every
+    # segment can be synthesized at once.
+    segments = np.asarray(wave_segments, dtype=float).reshape(-1, 4)
+    durations, frequencies, amplitudes, phase_shifts = segments.T
 
-    # Generate each wave and concatenate with existing waveform.
-    for time, frequency, amplitude, phase_shift in wave_segments:
-        # Generate evenly spaced array of points.
-        wave_times = np.linspace(
-            times[len(times)-1], times[len(times)-1] + time, num_pts
+    # Running phase of each segment (relative shifts accumulate, mod 360).
+    phases = accumulate_phase(phase_shifts)
+
+    if fs is not None:
+        return _wave_gen_uniform(
+            durations, frequencies, amplitudes, phases, fs, oscillator
         )
 
-        # Concatenate list of times with existing list.
-        times = np.concatenate((times, wave_times))
+    # Allocate the whole output up front. The leading zero sample is kept for
+    # compatibility with the original concatenation-based implementation.
+    times = np.zeros(1 + len(segments) * num_pts)
+    waveform = np.zeros(1 + len(segments) * num_pts)
 
-        # Update phase.
-        phase = (phase + phase_shift) % 360
+    # Row k of each view is the k-th wave segment, written in place.
+    segment_times = times[1:].reshape(len(segments), num_pts)
+    segment_wave = waveform[1:].reshape(len(segments), num_pts)
 
-        # Generate sinusoidal segment.
-        wave = amplitude * np.sin(
-            2 * np.pi * (frequency * wave_times + phase / 360)
-        )
+    _segment_times(durations, num_pts, out=segment_times)
 
-        # Concatenate generated wave segment with existing waveform.
-        waveform = np.concatenate((waveform, wave))
+    # Generate every sinusoidal segment in a single pass.
+    _fill_segments(segment_times, frequencies, amplitudes, phases, oscillator,
+                   out=segment_wave)
 
     return (times, waveform)
 
+
+def wave_gen_batch(wave_segments, num_pts=1000, fs=None, oscillator='sin'):
+    """
+    Generate a batch of waveforms that share the same segment durations.
+
+    This is the batched counterpart of wave_gen: waveform k is exactly what
+    wave_gen(wave_segments[k]) would give, but the whole batch is generated
+    in one pass, and the (shared) time base is only built once. This suits
+    Monte Carlo runs where many random messages are sent at the same bit
+    rate.
+
+    Parameters
+    ----------
+    wave_segments : 3D array_like
+        Array of shape (num_waves, num_segments, 4). Row [k, i] is the i-th
+        (duration, frequency, amplitude, relative phase) segment of waveform
+        k. The durations must be the same for every waveform.
+
+    num_pts : positive int
+        Number of points to generate for each wave segment. Ignored if fs is
+        given. The default is 1000.
+
+    fs : float, optional
+        If given, sample every waveform at this fixed rate (in Hz) and return
+        a Signal. The default is None.
+
+    oscillator : {'sin', 'nco'}, optional
+        How the sinusoids are evaluated; see wave_gen. The default is 'sin'.
+
+    Returns
+    -------
+    times : 1D numpy array
+        List of times corresponding to each point, shared by every waveform.
+
+    waveforms : 2D numpy array
+        Array of shape (num_waves, len(times)), one waveform per row.
+
+    If fs is given, a single Signal with one waveform per row of its samples
+    is returned instead.
+
+    """
+    check_oscillator(oscillator)
+
+    segments = np.asarray(wave_segments, dtype=float)
+    if segments.ndim != 3 or segments.shape[-1] != 4:
+        raise ValueError('The wave segments must be an array of shape'
+                         ' (num_waves, num_segments, 4).')
+
+    durations = segments[0, :, 0] if len(segments) else np.zeros(0)
+    if np.any(segments[..., 0] != durations):
+        raise ValueError('Every waveform in the batch must have the same'
+                         ' segment durations.')
+    frequencies = segments[..., 1]
+    amplitudes = segments[..., 2]
+
+    # Running phase of each segment of each waveform.
+    phases = accumulate_phase(segments[..., 3])
+
+    if fs is not None:
+        return _wave_gen_uniform(
+            durations, frequencies, amplitudes, phases, fs, oscillator
+        )
+
+    # Same layout as wave_gen, with one row of samples per waveform.
+    num_waves, num_segments = frequencies.shape
+    times = np.zeros(1 + num_segments * num_pts)
+    waveforms = np.zeros((num_waves, 1 + num_segments * num_pts))
+
+    segment_times = times[1:].reshape(num_segments, num_pts)
+    segment_wave = waveforms[:, 1:].reshape(num_waves, num_segments, num_pts)
+
+    _segment_times(durations, num_pts, out=segment_times)
+    _fill_segments(segment_times, frequencies, amplitudes, phases, oscillator,
+                   out=segment_wave)
+
+    return (times, waveforms)
+
+
+def wave_gen_blocks(wave_segments, fs, block_size=4096, oscillator='sin'):
+    """
+    Generate a fixed-rate waveform from wave segments, one block at a time.
+
+    This is the streaming counterpart of wave_gen (with fs given). Segments
+    are pulled from wave_segments only as they are needed, so it may be an
+    unbounded iterator, and the running phase and segment boundaries are
+    carried from one block to the next. Concatenating the yielded blocks gives
+    exactly the samples wave_gen returns for the same segments (to within
+    rounding when using the 'nco' oscillator).
+
+    Parameters
+    ----------
+    wave_segments : iterable of 4-tuples
+        Wave segments in the same (duration, frequency, amplitude, relative
+        phase) format as for wave_gen.
+
+    fs : float
+        Sample rate in Hz.
+
+    block_size : positive int, optional
+        Number of samples in each block (the last block may be shorter).
+        The default is 4096.
+
+    oscillator : {'sin', 'nco'}, optional
+        How the sinusoids are evaluated; see wave_gen. The default is 'sin'.
+
+    Yields
+    ------
+    Signal
+        Consecutive blocks of the combined waveform.
+
+    """
+    check_oscillator(oscillator)
+    wave_segments = iter(wave_segments)
+
+    # Parameters of the segments that have been read in but not yet fully
+    # sampled. Edges are measured in samples from the start of the waveform.
+    edges = np.zeros(0)
+    frequencies = np.zeros(0)
+    amplitudes = np.zeros(0)
+    phases = np.zeros(0)
+
+    # State carried across blocks.
+    total_samples = 0.0
+    phase = 0.0
+    exhausted = False
+    start = 0
+
+    while True:
+        stop = start + block_size
+
+        # Read in segments until the whole block is covered (or none remain).
+        while not exhausted and (len(edges) == 0 or edges[-1] < stop):
+            chunk = list(itertools.islice(wave_segments, SEGMENT_CHUNK))
+            if not chunk:
+                exhausted = True
+                break
+
+            durations, chunk_freqs, chunk_amps, phase_shifts = \
+                np.asarray(chunk, dtype=float).reshape(-1, 4).T
+            check_nyquist(chunk_freqs, fs)
+
+            # Continue the cumulative sums exactly where the last chunk ended.
+            stops = np.cumsum(np.concatenate(
+                ([total_samples], snap_edges(durations * fs))
+            ))
+            chunk_phases = accumulate_phase(
+                np.concatenate(([phase], phase_shifts))
+            )
+            total_samples = stops[-1]
+            phase = chunk_phases[-1]
+
+            edges = np.concatenate((edges, stops[1:]))
+            frequencies = np.concatenate((frequencies, chunk_freqs))
+            amplitudes = np.concatenate((amplitudes, chunk_amps))
+            phases = np.concatenate((phases, chunk_phases[1:]))
+
+        if exhausted:
+            stop = min(stop, int(np.ceil(edges[-1])) if len(edges) else 0)
+        if stop <= start:
+            return
+
+        samples = _sample_segments(
+            start, stop, edges, frequencies, amplitudes, phases, fs,
+            oscillator
+        )
+        yield Signal(samples, fs, start / fs)
+
+        # Drop the segments that end before the next block.
+        done = np.searchsorted(edges, stop, side='right')
+        edges = edges[done:]
+        frequencies = frequencies[done:]
+        amplitudes = amplitudes[done:]
+        phases = phases[done:]
+
+        start = stop
+
+
+def _fill_segments(segment_times, frequencies, amplitudes, phases,
+                   oscillator, out):
+    """
+    Evaluate the sinusoid of every wave segment at its sample times.
+
+    Parameters
+    ----------
+    segment_times : 2D numpy array
+        Array of shape (num_segments, num_pts) holding the times of the
+        samples in each segment.
+
+    frequencies, amplitudes, phases : numpy arrays
+        Parameters of each wave segment (phases in degrees), with segments
+        along the last axis. Any leading axes index separate waveforms that
+        share segment_times.
+
+    oscillator : {'sin', 'nco'}
+        How the sinusoids are evaluated.
+
+    out : numpy array
+        Array of shape frequencies.shape + (num_pts,) to write the samples
+        into.
+
+    """
+    num_pts = segment_times.shape[-1]
+
+    if oscillator == 'nco' and out.size:
+        # Each segment is one oscillator run at its own (constant) step.
+        steps = np.zeros(len(segment_times)) if num_pts < 2 else \
+            (segment_times[:, -1] - segment_times[:, 0]) / (num_pts - 1)
+        out[...] = nco_sin(
+            np.ravel(frequencies * segment_times[:, 0] + phases / 360),
+            np.ravel(frequencies * steps), num_pts
+        ).reshape(out.shape)
+    else:
+        np.multiply(frequencies[..., np.newaxis], segment_times, out=out)
+        out += (phases / 360)[..., np.newaxis]
+        out *= 2 * np.pi
+        np.sin(out, out=out)
+    out *= amplitudes[..., np.newaxis]
+
+    return out
+
+
+def _wave_gen_uniform(durations, frequencies, amplitudes, phases, fs,
+                      oscillator):
+    """
+    Sample a series of wave segments on a fixed-rate time grid.
+
+    Parameters
+    ----------
+    durations : 1D numpy array
+        Duration of each wave segment.
+
+    frequencies, amplitudes, phases : numpy arrays
+        Parameters of each wave segment, with the phases already accumulated
+        (in degrees). Segments are along the last axis; any leading axes
+        index separate waveforms that share the segment durations.
+
+    fs : float
+        Sample rate in Hz.
+
+    oscillator : {'sin', 'nco'}
+        How the sinusoids are evaluated.
+
+    Returns
+    -------
+    Signal
+        The combined waveform(s), sampled at times n / fs for n = 0, 1, ...
+
+    """
+    check_nyquist(frequencies, fs)
+
+    edges = _segment_edges(durations, fs)
+    num_samples = int(np.ceil(edges[-1])) if len(edges) else 0
+
+    samples = _sample_segments(
+        0, num_samples, edges, frequencies, amplitudes, phases, fs, oscillator
+    )
+
+    return Signal(samples, fs)
+
+
+def _sample_segments(start, stop, edges, frequencies, amplitudes, phases,
+                     fs, oscillator):
+    """
+    Evaluate the wave segments over a contiguous range of samples.
+
+    Parameters
+    ----------
+    start, stop : int
+        Range of sample indices to evaluate, counted from the start of the
+        waveform (so sample n is at time n / fs).
+
+    edges : 1D numpy array
+        End of each wave segment, measured in samples. The first segment must
+        contain sample start.
+
+    frequencies, amplitudes, phases : numpy arrays
+        Parameters of each wave segment (phases in degrees), with segments
+        along the last axis. Any leading axes index separate waveforms.
+
+    fs : float
+        Sample rate in Hz.
+
+    oscillator : {'sin', 'nco'}
+        How the sinusoids are evaluated.
+
+    Returns
+    -------
+    samples : numpy array
+        Value of the waveform(s) at each sample from start up to stop, along
+        the last axis.
+
+    """
+    if oscillator == 'nco':
+        # Range of samples covered by each segment, clipped to this range.
+        firsts = np.clip(
+            np.ceil(np.concatenate(([start], edges[:-1]))), start, stop
+        ).astype(np.int64)
+        lasts = np.clip(np.ceil(edges), start, stop).astype(np.int64)
+        lengths = np.maximum(lasts - firsts, 0)
+
+        # Every waveform covers the same runs, one after another.
+        shape = np.shape(frequencies)
+        samples = nco_sin(
+            np.ravel(phases / 360), np.ravel(frequencies / fs),
+            np.broadcast_to(lengths, shape).ravel(),
+            np.broadcast_to(firsts, shape).ravel()
+        ).reshape(shape[:-1] + (stop - start,))
+        samples *= np.repeat(amplitudes, lengths, axis=-1)
+        return samples
+
+    # Index of the segment each sample falls in. A sample exactly on a
+    # boundary belongs to the segment that starts there.
+    sample_index = np.arange(start, stop)
+    segment = np.searchsorted(edges, sample_index, side='right')
+
+    # Same expression as the per-segment generator, evaluated per sample.
+    samples = np.take(frequencies, segment, axis=-1) * (sample_index / fs)
+    samples += np.take(phases, segment, axis=-1) / 360
+    samples *= 2 * np.pi
+    np.sin(samples, out=samples)
+    samples *= np.take(amplitudes, segment, axis=-1)
+
+    return samples
+
+
+def check_nyquist(frequencies, fs):
+    """Raise a ValueError if fs is too low for any of the frequencies."""
+    if np.size(frequencies) and fs <= 2 * np.max(np.abs(frequencies)):
+        raise ValueError('The sample rate must be more than twice the highest'
+                         ' segment frequency (the Nyquist rate).')
+
+
+def _segment_edges(durations, fs):
+    """
+    Return the end of each wave segment, measured in samples.
+
+    The length of each segment is snapped before the lengths are summed, so
+    that segments with a whole number of samples end exactly on a sample
+    however many of them there are (summing the durations first lets
+    rounding error creep in over long messages).
+
+    """
+    return np.cumsum(snap_edges(durations * fs))
+
+
+def snap_edges(edges):
+    """
+    Snap segment edges (or lengths) within rounding error of a whole sample.
+
+    This makes segments with an integer number of samples (e.g. one bit at a
+    bit rate that divides fs) get exactly that many samples.
+
+    """
+    whole = np.round(edges)
+    return np.where(np.abs(edges - whole) < 1e-6, whole, edges)
+
+
+def accumulate_phase(phase_shifts):
+    """
+    Return the running phase of each wave segment in degrees, modulo 360.
+
+    Parameters
+    ----------
+    phase_shifts : numpy array
+        Phase shift of each segment relative to the previous one, in degrees,
+        along the last axis.
+
+    Returns
+    -------
+    phases : numpy array
+        Phase of each segment, identical to updating
+        ``phase = (phase + phase_shift) % 360`` one segment at a time.
+
+    """
+    # Whole-degree shifts (everything transmit produces) sum exactly, so one
+    # cumulative sum reproduces the running modulo bit for bit.
+    if (np.all(phase_shifts == np.round(phase_shifts))
+            and np.max(np.sum(np.abs(phase_shifts), axis=-1), initial=0)
+            < 2**53):
+        return np.cumsum(phase_shifts, axis=-1) % 360
+
+    # Fractional shifts round differently when summed first, so fall back to
+    # the scalar recurrence. This only touches one number per segment.
+    accumulate = np.frompyfunc(lambda phase, shift: (phase + shift) % 360, 2, 1)
+    start = np.zeros(np.shape(phase_shifts)[:-1] + (1,))
+    return accumulate.accumulate(
+        np.concatenate((start, phase_shifts), axis=-1).astype(object),
+        axis=-1
+    )[..., 1:].astype(float)
+
+
+def _segment_times(durations, num_pts, out):
+    """
+    Fill in the evenly spaced sample times of every wave segment.
+
+    Each segment starts at the final time of the previous one, exactly as if
+    the segments were generated one at a time with np.linspace.
+
+    Parameters
+    ----------
+    durations : 1D numpy array
+        Duration of each wave segment.
+
+    num_pts : positive int
+        Number of points in each wave segment.
+
+    out : 2D numpy array
+        Array of shape (len(durations), num_pts) to write the times into.
+
+    Returns
+    -------
+    out : 2D numpy array
+        The filled-in array of times.
+
+    """
+    # With fewer than two points per segment np.linspace never reaches the
+    # end of a segment, so every segment starts (and stays) at zero.
+    if num_pts < 2:
+        out[...] = 0
+        return out
+
+    # Segment boundaries, accumulated in the same order as the original loop.
+    stops = np.cumsum(durations)
+    starts = np.concatenate(([0.0], stops[:-1]))
+
+    # Replicate np.linspace: start + i * step, with the endpoint pinned.
+    steps = (stops - starts) / (num_pts - 1)
+    np.multiply(np.arange(num_pts, dtype=float), steps[:, np.newaxis], out=out)
+    out += starts[:, np.newaxis]
+    out[:, -1] = stops
+
+    return out
+
+
 def wave_write(times, waveform):
     '''
     Creates a new text (PWL) file with the associated values of the generated waveform. (This WILL append to existing files named waveform_pwl. You've been warned.)
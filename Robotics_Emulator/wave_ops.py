@@ -6,8 +6,8 @@ Created on Sat Sep 19 17:26:18 2020
 
 This file operates on waves, which are time list and amplitude list tuples.
 
-combine_wave combines two waves using a linear interpolation for estimating the
-value of waves between points
+combine_wave combines any number of waves using a linear interpolation for
+estimating the value of waves between points
 
 delay_wave delays the time value of a wave.
 """
@@ -15,91 +15,143 @@ import numpy as np
 from math import floor
 from wave_gen import wave_gen
 import matplotlib.pyplot as plt
+from wave_signal import Signal, unpack_wave
 
-def combine_wave(packet1, packet2):
+def combine_wave(*packets, fs=None):
     '''
-    A function that combines two waves together to superpose them, even if
-    their times list do not line up properly. It adds the two waves, but
+    A function that combines waves together to superpose them, even if
+    their times list do not line up properly. It adds the waves, but
     linearly interpolates between points in the time lists. Can also handle
-    time lists with different sampling rates (but this hasn't been tested
-    properly).
+    time lists with different sampling rates.
+
+    Any number of waves can be combined at once. The combined time list is
+    the sorted union of the input time lists (a time that appears several
+    times in one wave, like a segment boundary in wave_gen output, appears
+    that many times in the output too). At each output time, every wave
+    contributes its own sample if it has one there, a linear interpolation
+    between its neighbouring samples if not, and nothing outside its time
+    span. For two waves this gives exactly the same result as the original
+    point-by-point merge.
 
     Parameters
     ----------
-    packet1 : 2-tuple of 1d array-like
+    *packets : 2-tuples of 1d array-like
         The first array corresponds to the list of times, and the second to the
         amplitudes of the waves at those points. The output of wave_gen can
-        directly feed into this argument. This is one of the waves being 
-        combined.
-    packet2 : 2-tuple of 1d array-like
-        Same as above.
+        directly feed into this argument. These are the waves being 
+        combined. Signals are also accepted.
+    fs : float, optional
+        If given, the combined wave is instead evaluated on a uniform grid of
+        times n / fs spanning all of the waves, and returned as a Signal.
+        The default is None.
 
     Returns
     -------
     2-tuple of 1d array-like. This corresponds to the combined wave and has
-    the same format as a wave_gen output.
+    the same format as a wave_gen output. If fs is given, a Signal is
+    returned instead.
 
     '''
-    # Figure out which wave packet goes first. Order of inputs doesn't matter
-    # because of this.
-    times1 = packet1[0]
-    waves1 = packet1[1]
-    times2 = packet2[0]
-    waves2 = packet2[1]
-    firstt, firstw = (times1, waves1) if times1[0] < times2[0] else (times2, waves2)
-    lastt, lastw = (times2, waves2) if times1[0] < times2[0] else (times1, waves1)
-    firsti = 0
-    lasti = 0
-    final_times = []
-    final_waves = []
-    # Add points of the first (chronological) wave until the second wave starts
-    # to matter.
-    while firsti != len(firstt) and firstt[firsti] < lastt[lasti]:
-        final_times.append(firstt[firsti])
-        final_waves.append(firstw[firsti])
-        firsti += 1
-        
-    # Loop until both lists are empty.
-    while True:
-        # Edge case firstt runs out. Add the rest of the points and break.
-        if firsti == len(firstt):
-            while lasti < len(lastt):
-                final_times.append(lastt[lasti])
-                final_waves.append(lastw[lasti])
-                lasti += 1
-            break
-        # Edge case lastt runs out. Add the rest of the points and break.
-        elif lasti == len(lastt):
-            while firsti < len(firstt):
-                final_times.append(firstt[firsti])
-                final_waves.append(firstw[firsti])
-                firsti += 1
-            break
-        # Case last time is less. Interpolate the value of the first wave and
-        # add it to the value of the last wave.
-        elif lastt[lasti] < firstt[firsti]:
-            final_times.append(lastt[lasti])
-            final_waves.append(lastw[lasti] + \
-        (firstw[firsti] - firstw[firsti - 1]) /\
-        (firstt[firsti] - firstt[firsti - 1]) * (lastt[lasti] - firstt[firsti - 1])\
-            + firstw[firsti - 1])
-            lasti += 1
-        # Case first time is less. Interpolate the value of the last wave and
-        # add it to the value of the first wave.
-        elif lastt[lasti] > firstt[firsti]:
-            final_times.append(firstt[firsti])
-            final_waves.append(firstw[firsti] +\
-        (lastw[lasti] - lastw[lasti - 1]) /\
-        (lastt[lasti] - lastt[lasti - 1]) * (firstt[firsti] - lastt[lasti - 1])\
-            + lastw[lasti - 1])
-            firsti += 1
-        # If they are equal, simply add the two waves together.
-        else:
-            final_times.append(firstt[firsti])
-            final_waves.append(firstw[firsti] + lastw[lasti])
-            firsti += 1
-            lasti += 1
-    return (np.array(final_times), np.array(final_waves))
+    if not packets:
+        raise ValueError('At least one wave must be given to combine.')
+    packets = [unpack_wave(*packet) for packet in packets]
+
+    if fs is not None:
+        # Every grid time is treated as an interpolation point. Each wave
+        # contributes over its whole span, including a grid time exactly on
+        # its first or last sample, and nothing outside it.
+        first = int(np.ceil(min(times[0] for times, _ in packets) * fs))
+        last = int(np.floor(max(times[-1] for times, _ in packets) * fs))
+        final_times = np.arange(first, last + 1) / fs
+        final_waves = np.zeros(len(final_times))
+        for times, waves in packets:
+            final_waves += np.interp(final_times, times, waves, left=0,
+                                     right=0)
+        return Signal(final_waves, fs, first / fs)
+
+    # Merge the (already sorted) time lists. A stable sort runs in close to
+    # linear time on a few sorted runs, and keeps samples at the same time
+    # in wave order.
+    all_times = np.concatenate([times for times, _ in packets])
+    sources = np.repeat(np.arange(len(packets)),
+                        [len(times) for times, _ in packets])
+    order = np.argsort(all_times, kind='stable')
+    all_times = all_times[order]
+    sources = sources[order]
+
+    # Group equal times, and rank the samples each wave has at each time.
+    new_time = np.concatenate(([True], all_times[1:] != all_times[:-1]))
+    new_run = new_time.copy()
+    new_run[1:] |= sources[1:] != sources[:-1]
+    positions = np.arange(len(all_times))
+    ranks = positions - np.maximum.accumulate(np.where(new_run, positions, 0))
+    group_starts = np.flatnonzero(new_time)
+    group_ends = np.append(group_starts[1:], len(all_times))
+
+    # A time that one wave has n times appears n times in the output, so
+    # each group is as long as the most copies any wave has.
+    group_sizes = np.maximum.reduceat(ranks + 1, group_starts) \
+        if len(group_starts) else np.zeros(0, dtype=np.int64)
+    group_offsets = np.cumsum(group_sizes) - group_sizes
+    final_groups = np.repeat(np.arange(len(group_starts)), group_sizes)
+    final_ranks = np.arange(len(final_groups)) - group_offsets[final_groups]
+    final_times = all_times[group_starts][final_groups]
+
+    # Add the samples each wave has at the combined times (in wave order).
+    final_index = group_offsets[np.cumsum(new_time) - 1] + ranks
+    final_waves = np.bincount(
+        final_index, weights=np.concatenate(
+            [waves for _, waves in packets]
+        )[order].astype(float), minlength=len(final_times)
+    )
+
+    # Then add the interpolated values each wave has between its samples
+    # (only the combined times within its time span can get any).
+    for i, (times, waves) in enumerate(packets):
+        span = slice(np.searchsorted(final_times, times[0], 'left'),
+                     np.searchsorted(final_times, times[-1], 'right'))
+        groups = final_groups[span]
+
+        # Number of samples of this wave up to the end of each group, and
+        # how many of them are in the group.
+        counts = np.concatenate(([0], np.cumsum(sources == i)))
+        right = counts[group_ends]
+        copies = right - counts[group_starts]
+        _add_interpolation(final_waves[span], final_times[span], times,
+                           waves, right[groups],
+                           final_ranks[span] >= copies[groups])
+
+    return (final_times, final_waves)
+
+def _add_interpolation(final_waves, final_times, times, waves, right,
+                       where=None):
+    '''
+    Add a linear interpolation of a wave to final_waves, in place.
+
+    right is np.searchsorted(times, final_times, 'right'), i.e. the index of
+    the sample after each final time. Final times outside the span of the
+    wave get nothing added, as do those where the optional boolean mask
+    where is False.
+
+    '''
+    if len(times) < 2:
+        return
+    skip = (right == 0) | (right == len(times))
+    if where is not None:
+        skip |= ~where
+    lower = np.clip(right, 1, len(times) - 1) - 1
+
+    # Same expression (and order of operations) as the original merge. A
+    # repeated time gives an infinite or nan slope, which is only ever used
+    # where skip zeroes it out.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.diff(waves) / np.diff(times)
+        offsets = slopes[lower] * (final_times - times[lower])
+    values = waves[lower]
+    offsets[skip] = 0
+    values[skip] = 0
+    final_waves += offsets
+    final_waves += values
 
 def sample_wave(packet, sample_rate):
     start_time = sample_rate * floor(packet[0][0] / sample_rate)
@@ -114,7 +166,8 @@ def delay_wave(packet, delay):
     packet : 2-tuple of 1d array-like
         The first array corresponds to the list of times, and the second to the
         amplitudes of the waves at those points. The output of wave_gen can
-        directly feed into this argument. This is the wave being delayed
+        directly feed into this argument. This is the wave being delayed.
+        A Signal is also accepted.
     delay : float
         Time delay to delay the wave by.
 
@@ -122,13 +175,29 @@ def delay_wave(packet, delay):
     -------
     
     2-tuple of 1d array-like. This corresponds to the delayed wave and has
-    the same format as a wave_gen output.
+    the same format as a wave_gen output. If packet is a Signal, the delayed
+    Signal is returned instead.
 
     '''
+    if isinstance(packet, Signal):
+        return Signal(packet.samples, packet.sample_rate,
+                      packet.start_time + delay)
     return (packet[0] + delay, packet[1])
 
 if __name__ == "__main__":
     # Code testing region
+    # On a sample grid, a grid time exactly on the last sample of a wave
+    # still gets that sample.
+    packet = wave_gen([(0.001, 20000, 1, 30)], num_pts=101)
+    combined = combine_wave(packet, fs=1e5)
+    assert np.allclose(combined.samples, np.interp(combined.times, *packet)), \
+        'The last grid sample of the wave was dropped.'
+    try:
+        combine_wave()
+        raise AssertionError('Combining no waves should raise a ValueError.')
+    except ValueError:
+        pass
+
     # Combine a wave with itself
     packet = wave_gen([(0.001, 20000, 1, 0)])
     # Results in a wave of amplitude 2
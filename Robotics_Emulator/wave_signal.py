@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a lightweight container for uniformly sampled waveforms.
+
+Most of the emulator passes waves around as (times, waveform) tuples, which
+store an explicit time for every sample. A Signal only stores its start time
+and sample rate, so the time base costs no memory until it is asked for. It
+unpacks and indexes like a (times, waveform) tuple, so existing code that
+expects a tuple keeps working.
+
+"""
+
+import numpy as np
+
+
+class Signal:
+    """
+    A waveform sampled at a fixed rate, starting at a given time.
+
+    Parameters
+    ----------
+    samples : array_like
+        Sample values. The last axis is time; any leading axes (for example
+        one row per hydrophone) share the same time base.
+
+    sample_rate : float
+        Number of samples per second.
+
+    start_time : float, optional
+        Time of the first sample in seconds. The default is 0.
+
+    """
+
+    __slots__ = ('samples', 'sample_rate', 'start_time')
+
+    def __init__(self, samples, sample_rate, start_time=0.0):
+        if sample_rate <= 0:
+            raise ValueError('The sample rate must be positive.')
+
+        self.samples = np.asarray(samples)
+        self.sample_rate = float(sample_rate)
+        self.start_time = float(start_time)
+
+    @property
+    def times(self):
+        """1D numpy array of the time of each sample, built on demand."""
+        return self.start_time + np.arange(len(self)) / self.sample_rate
+
+    @property
+    def sample_period(self):
+        """Time between consecutive samples in seconds."""
+        return 1 / self.sample_rate
+
+    @property
+    def duration(self):
+        """Time spanned by the samples in seconds."""
+        return len(self) / self.sample_rate
+
+    def __len__(self):
+        return self.samples.shape[-1]
+
+    def __iter__(self):
+        # Allows unpacking in the style of a (times, waveform) tuple.
+        yield self.times
+        yield self.samples
+
+    def __getitem__(self, index):
+        # Allows indexing in the style of a (times, waveform) tuple.
+        return (self.times, self.samples)[index]
+
+    def __repr__(self):
+        return (f'Signal(samples={self.samples.shape}, '
+                f'sample_rate={self.sample_rate}, '
+                f'start_time={self.start_time})')
+
+
+def unpack_wave(times, waveform=None):
+    """
+    Return a wave as a (times, waveform) tuple of numpy arrays.
+
+    Parameters
+    ----------
+    times : 1D array_like or Signal
+        Either the times of each sample, or a Signal holding the whole wave
+        (in which case waveform is ignored).
+
+    waveform : array_like, optional
+        The sample values corresponding to times. Ignored if times is a
+        Signal. The default is None.
+
+    Returns
+    -------
+    times : numpy array
+        List of times corresponding to each point in the waveform.
+
+    waveform : numpy array
+        List of magnitudes comprising the waveform.
+
+    """
+    if isinstance(times, Signal):
+        return (times.times, times.samples)
+
+    return (np.asarray(times), np.asarray(waveform))
@@ -15,8 +15,11 @@ waveform over a fixed time period.
 import numpy as np
 import matplotlib.pyplot as plt
 
+from nco import check_oscillator, nco_sin, segment_step
 
-def wave_gen_AM(wave_list=[], num_pts=1000, frequency=2400, smoothing="None"):
+
+def wave_gen_AM(wave_list=[], num_pts=1000, frequency=2400, smoothing="None",
+                oscillator='sin'):
     """
     Stitch together a series of sinusoids of given amplitude and length.
 
@@ -33,6 +36,11 @@ def wave_gen_AM(wave_list=[], num_pts=1000, frequency=2400, smoothing="None"):
     frequency : float
         Frequency of the waveform in Hertz.
 
+    oscillator : {'sin', 'nco'}, optional
+        How the sinusoids are evaluated: with np.sin on absolute times, or
+        with the numerically controlled oscillator in nco.py (faster, and
+        keeps full phase precision at large times). The default is 'sin'.
+
     Returns
     -------
     times : 1D numpy array
@@ -42,26 +50,33 @@ def wave_gen_AM(wave_list=[], num_pts=1000, frequency=2400, smoothing="None"):
         List of amplitudes comprising the combined waveform.
 
     """
-    waveform = np.zeros(1)
-    times = np.zeros(1)
+    check_oscillator(oscillator)
 
-    # Generate each wave and concatenate with existing waveform.
+    # The segments are collected and concatenated once at the end.
+    waveform = [np.zeros(1)]
+    times = [np.zeros(1)]
+    end_time = 0.0
+
+    # Generate each wave and add it to the existing waveform.
     for time, amplitude in wave_list:
         # Generate evenly spaced array of points.
-        wave_times = np.linspace(
-            times[len(times)-1], times[len(times)-1] + time, num_pts
-        )
-
-        # Concatenate list of times with existing list.
-        times = np.concatenate((times, wave_times))
+        wave_times = np.linspace(end_time, end_time + time, num_pts)
+        times.append(wave_times)
+        if len(wave_times):
+            end_time = wave_times[-1]
 
         # Generate sinusoidal segment.
-        wave = amplitude * np.sin(2 * np.pi * frequency * wave_times)
+        if oscillator == 'nco':
+            wave = amplitude * nco_sin(
+                frequency * wave_times[:1],
+                frequency * segment_step(wave_times), len(wave_times)
+            )
+        else:
+            wave = amplitude * np.sin(2 * np.pi * frequency * wave_times)
 
-        # Concatenate generated wave with existing waveform.
-        waveform = np.concatenate((waveform, wave))
+        waveform.append(wave)
 
-    return (times, waveform)
+    return (np.concatenate(times), np.concatenate(waveform))
 
 
 # Code testing region.
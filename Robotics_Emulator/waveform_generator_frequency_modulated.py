@@ -14,12 +14,15 @@ smoothing implemented via phase shifts.
 import numpy as np
 import matplotlib.pyplot as plt
 
+from nco import check_oscillator, nco_sin, segment_step
+
 # Constant for the minimum amplitude gap left between waves at a
 # frequency transition when phase smoothin is enabled.
 SMOOTHING_GAP = 10e-5
 
 
-def wave_gen_FM(wave_list=[], num_pts=1000, smoothing="None", amplitude=1):
+def wave_gen_FM(wave_list=[], num_pts=1000, smoothing="None", amplitude=1,
+                oscillator='sin'):
     """Stitch together a series of waveforms of given frequency and length.
 
     Parameters
@@ -39,6 +42,11 @@ def wave_gen_FM(wave_list=[], num_pts=1000, smoothing="None", amplitude=1):
     amplitude : float
         Amplitude of the generated waveform. The default is 1.
 
+    oscillator : {'sin', 'nco'}, optional
+        How the sinusoids are evaluated: with np.sin on absolute times, or
+        with the numerically controlled oscillator in nco.py (faster, and
+        keeps full phase precision at large times). The default is 'sin'.
+
     Returns
     -------
     times : 1D numpy array
@@ -48,35 +56,45 @@ def wave_gen_FM(wave_list=[], num_pts=1000, smoothing="None", amplitude=1):
         List of amplitudes comprising the combined waveform.
 
     """
-    waveform = np.zeros(1)
-    times = np.zeros(1)
+    check_oscillator(oscillator)
+
+    # The segments are collected and concatenated once at the end.
+    waveform = [np.zeros(1)]
+    times = [np.zeros(1)]
+    end_time = 0.0
+    end_value = 0.0
     phase_shift = 0
 
-    # Generate each wave and concatenate with existing waveform.
+    # Generate each wave and add it to the existing waveform.
     for time, frequency in wave_list:
         # Generate evenly spaced array of points.
-        wave_times = np.linspace(times[len(times)-1],
-                                 times[len(times)-1] + time,
-                                 num_pts)
-
-        # Concatenate list of times with existing list.
-        times = np.concatenate((times, wave_times))
+        wave_times = np.linspace(end_time, end_time + time, num_pts)
+        times.append(wave_times)
+        if len(wave_times):
+            end_time = wave_times[-1]
 
         # If set to perform phase smoothing, add a phase shift to bring
         # starting value of new wave within the preset threshold of the ending
         # value of the previous wave, preventing sudden jumps in the waveform.
         if smoothing == 'phase':
-            phase_shift = (np.arcsin(waveform[-1] - SMOOTHING_GAP)
+            phase_shift = (np.arcsin(end_value - SMOOTHING_GAP)
                            - 2 * np.pi * frequency * wave_times[0])
 
-        # Generate sinusoid.
-        wave = amplitude * np.sin(2 * np.pi * frequency
-                                  * wave_times + phase_shift)
-
-        # Concatenate generated wave with existing waveform.
-        waveform = np.concatenate((waveform, wave))
-
-    return (times, waveform)
+        # Generate sinusoid (the phase shift is in radians).
+        if oscillator == 'nco':
+            wave = amplitude * nco_sin(
+                frequency * wave_times[:1] + phase_shift / (2 * np.pi),
+                frequency * segment_step(wave_times), len(wave_times)
+            )
+        else:
+            wave = amplitude * np.sin(2 * np.pi * frequency
+                                      * wave_times + phase_shift)
+
+        waveform.append(wave)
+        if len(wave):
+            end_value = wave[-1]
+
+    return (np.concatenate(times), np.concatenate(waveform))
 
 
 # Code testing region.
@@ -14,9 +14,12 @@ optional phase shifting.
 import numpy as np
 import matplotlib.pyplot as plt
 
+from nco import check_oscillator, nco_sin, segment_step
+
 
 def wave_gen_phase_modulated(
-        wave_list=[], freq=2400, num_pts=1000, amplitude=1):
+        wave_list=[], freq=2400, num_pts=1000, amplitude=1,
+        oscillator='sin'):
     """
     Stitch together a phase-modulated waveform.
 
@@ -37,6 +40,11 @@ def wave_gen_phase_modulated(
     amplitude : float
         Amplitude of the output waveform. The default is 1.
 
+    oscillator : {'sin', 'nco'}, optional
+        How the sinusoids are evaluated: with np.sin on absolute times, or
+        with the numerically controlled oscillator in nco.py (faster, and
+        keeps full phase precision at large times). The default is 'sin'.
+
     Returns
     -------
     times : 1D numpy array
@@ -46,29 +54,37 @@ def wave_gen_phase_modulated(
         List of amplitudes comprising the final waveform.
 
     """
-    waveform = np.zeros(1)
-    times = np.zeros(1)
+    check_oscillator(oscillator)
+
+    # The segments are collected and concatenated once at the end.
+    waveform = [np.zeros(1)]
+    times = [np.zeros(1)]
+    end_time = 0.0
 
     # If optional phase shift is not provided, add shift of zero.
     for time, phase_shift in wave_list:
 
         # Generate evenly spaced array of points.
-        wave_times = np.linspace(times[len(times)-1],
-                                 times[len(times)-1] + time,
+        wave_times = np.linspace(end_time, end_time + time,
                                  int(num_pts * time))
-
-        # Concatenate list of times with existing list.
-        times = np.concatenate((times, wave_times))
+        times.append(wave_times)
+        if len(wave_times):
+            end_time = wave_times[-1]
 
         # Generate sinusoid.
-        wave = amplitude * np.sin(
-            2 * np.pi * (freq * wave_times + phase_shift / 360)
-        )
-
-        # Concatenate generated wave with existing waveform.
-        waveform = np.concatenate((waveform, wave))
-
-    return (times, waveform)
+        if oscillator == 'nco':
+            wave = amplitude * nco_sin(
+                freq * wave_times[:1] + phase_shift / 360,
+                freq * segment_step(wave_times), len(wave_times)
+            )
+        else:
+            wave = amplitude * np.sin(
+                2 * np.pi * (freq * wave_times + phase_shift / 360)
+            )
+
+        waveform.append(wave)
+
+    return (np.concatenate(times), np.concatenate(waveform))
 
 
 # Code testing region.